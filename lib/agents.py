@@ -1,5 +1,15 @@
+from lib.bitboard import SQUARE_INDEX
+from lib.evaluation import evaluate, PIECE_VALUES
+from lib.pieces import Piece
+from lib import moves
+from lib import tablebase
+from typing import List, Optional, Tuple
+import time
+
 
 class Player:
+    __slots__ = ('_name', '_color', '_move_list')
+
     def __init__(self, name: str, color: str) -> None:
         self._name = name
         self._move_list = []
@@ -9,7 +19,403 @@ class Player:
         else:    
             self._color = color
 
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def color(self) -> str:
+        return self._color
+
+    @property
+    def move_list(self) -> List[str]:
+        return self._move_list
+
+    @property
+    def is_human(self) -> bool:
+        """Whether specify_move() reads the move from a person at the
+        terminal. Computer players return False."""
+        return True
+
+    def attach(self, engine) -> None:
+        """Called by ChessGame with the engine holding the game's rules 
+        and state. Human players don't need it."""
+        pass
+
     def specify_move(self):
         move = input("{}, it's your turn!\n".format(self.name))
         self.move_list.append(move)
-        return move 
\ No newline at end of file
+        return move 
+
+    def specify_promotion(self, is_white_turn: bool) -> Optional[Piece]:
+        """Chooses the piece for a promotion. Returning None leaves the 
+        choice to the frontend's promotion prompt."""
+        return None
+
+    def close(self) -> None:
+        """Releases anything the player holds on to between moves, such as
+        background threads or worker processes. Does nothing by default."""
+        pass
+
+
+class TranspositionTable:
+    """Stores search results by position key in a fixed number of slots.
+
+    Each key maps to one slot (the key modulo the table size), and a new 
+    entry replaces whatever that slot held. A long search, such as a 
+    pondering one, therefore keeps the table full of its most recent 
+    results instead of emptying it whenever it fills up.
+
+    Args:
+        max_entries (int): Number of slots
+    """
+    __slots__ = ('_slots', '_max_entries')
+
+    def __init__(self, max_entries: int = 1 << 20) -> None:
+        # Slots are filled on first use, so a small game stays small
+        self._slots = {}
+        self._max_entries = max_entries
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def get(self, key: int) -> Optional[tuple]:
+        """Looks up a position.
+
+        Returns:
+            tuple: (depth, score, flag, move, promotion), or None if the 
+                position is not stored
+        """
+        slot = self._slots.get(key % self._max_entries)
+        if slot is None or slot[0] != key:
+            return None
+        return slot[1]
+
+    def store(self, key: int, depth: int, score: int, flag: int, move: Tuple[str, str], promotion: Optional[Piece]) -> None:
+        self._slots[key % self._max_entries] = (key, (depth, score, flag, move, promotion))
+
+    def clear(self) -> None:
+        self._slots.clear()
+
+
+class _SearchTimeout(Exception):
+    """Raised inside the search once the move's time budget is spent."""
+
+
+class AlphaBetaAgent(Player):
+    """A computer player that searches the game tree with negamax 
+    alpha-beta pruning and a transposition table.
+
+    Iterative deepening is used so that the best move of the deepest 
+    completed search can be played once the time budget runs out.
+
+    Args:
+        name (str): Player name
+        color (str): 'white' or 'black'
+        time_limit (float): Seconds to spend searching each move
+        max_depth (int): Maximum search depth in plies
+        table_size (int): Maximum number of transposition table entries
+        table: Transposition table to use instead of a private one of 
+            table_size entries. Anything with TranspositionTable's get()
+            and store() works.
+    """
+    __slots__ = ('_engine', '_time_limit', '_max_depth', '_table',
+                 '_deadline', '_nodes', '_promotion', '_completed_depth',
+                 '_score')
+
+    MATE_SCORE = 100000
+
+    # Transposition table bound types
+    EXACT, LOWER, UPPER = 0, 1, 2
+
+    def __init__(self, 
+                 name: str, 
+                 color: str, 
+                 time_limit: float = 5.0, 
+                 max_depth: int = 64, 
+                 table_size: int = 1 << 20,
+                 table=None) -> None:
+        super().__init__(name, color)
+        self._engine = None
+        self._time_limit = time_limit
+        self._max_depth = max_depth
+        self._table = table if table is not None else TranspositionTable(table_size)
+        self._deadline = None
+        self._nodes = 0
+        self._promotion = None
+        self._completed_depth = 0
+        self._score = 0
+
+    @property
+    def is_human(self) -> bool:
+        return False
+
+    @property
+    def nodes(self) -> int:
+        """Number of nodes visited by the last search."""
+        return self._nodes
+
+    @property
+    def completed_depth(self) -> int:
+        """Deepest iteration the last search finished."""
+        return self._completed_depth
+
+    @property
+    def score(self) -> int:
+        """Score of the last search's move, from the mover's point of view."""
+        return self._score
+
+    def attach(self, engine) -> None:
+        self._engine = engine
+
+    def specify_move(self) -> str:
+        if self._engine is None:
+            raise RuntimeError("AlphaBetaAgent needs an engine, see attach()")
+
+        (p1, p2), self._promotion = self.search()
+        move = f"{p1},{p2}"
+        self.move_list.append(move)
+        return move
+
+    def specify_promotion(self, is_white_turn: bool) -> Optional[Piece]:
+        return self._promotion
+
+    def search(self, start_depth: int = 1) -> Tuple[Tuple[str, str], Optional[Piece]]:
+        """Finds the best move for the side to move within the time budget.
+
+        Args:
+            start_depth (int): Depth of the first iteration
+
+        Returns:
+            ((str, str), Piece): The chosen move and its promotion piece
+                (None unless the move promotes)
+        """
+        self._deadline = time.perf_counter() + self._time_limit
+        self._nodes = 0
+        self._completed_depth = 0
+
+        # A stored best move for the root (from an earlier search of the
+        # same position, or from pondering) is tried first
+        entry = self._table.get(self._engine.position_key)
+        root_moves = self._ordered_moves(entry[3] if entry is not None else None)
+        if len(root_moves) == 0:
+            raise ValueError("No legal moves to search")
+
+        best = self._tablebase_move(root_moves)
+        if best is not None:
+            return self._decode(best)
+
+        best = root_moves[0]
+        for depth in range(start_depth, self._max_depth + 1):
+            try:
+                best, self._score = self._search_root(root_moves, depth)
+            except _SearchTimeout:
+                break
+            self._completed_depth = depth
+
+            # Search the previous best move first at the next depth
+            root_moves.remove(best)
+            root_moves.insert(0, best)
+
+        return self._decode(best)
+
+    def stop(self) -> None:
+        """Makes a search running in another thread give up at its next
+        time check, returning the best move found so far."""
+        self._deadline = 0.0
+
+    def _tablebase_move(self, root_moves: list) -> Optional[tuple]:
+        """Picks the best move by tablebase when the position is in one:
+        the fastest win, else a draw, else the slowest loss.
+
+        Returns:
+            int: The chosen move code, or None
+        """
+        engine = self._engine
+        if engine.probe_tablebase() is None:
+            return None
+
+        best, best_rank = None, None
+        for code in root_moves:
+            engine.push_move(code)
+            try:
+                # Positions without a table (bare kings, a lone minor piece)
+                # are draws
+                result, plies = engine.probe_tablebase() or (tablebase.DRAW, 0)
+            finally:
+                engine.pop()
+
+            if result == tablebase.LOSS:
+                rank, score = (2, -plies), self.MATE_SCORE - plies - 1
+            elif result == tablebase.WIN:
+                rank, score = (0, plies), -self.MATE_SCORE + plies + 1
+            else:
+                rank, score = (1, 0), 0
+            if best_rank is None or rank > best_rank:
+                best, best_rank, self._score = code, rank, score
+        return best
+
+    def _search_root(self, root_moves: List[int], depth: int) -> Tuple[int, int]:
+        alpha, beta = -self.MATE_SCORE - 1, self.MATE_SCORE + 1
+        best = root_moves[0]
+        for code in root_moves:
+            self._engine.push_move(code)
+            try:
+                score = -self._negamax(depth - 1, -beta, -alpha, 1)
+            finally:
+                self._engine.pop()
+
+            if score > alpha:
+                alpha = score
+                best = code
+
+        self._store(depth, alpha, self.EXACT, best)
+        return best, alpha
+
+    def _negamax(self, depth: int, alpha: int, beta: int, ply: int) -> int:
+        self._nodes += 1
+        if self._nodes & 0xFF == 0 and time.perf_counter() > self._deadline:
+            raise _SearchTimeout()
+
+        engine = self._engine
+        key = engine.position_key
+        alpha_orig = alpha
+
+        entry = self._table.get(key)
+        best_move = None
+        if entry is not None:
+            entry_depth, entry_score, entry_flag, best_move, _ = entry
+            entry_score = self._score_from_table(entry_score, ply)
+            if entry_depth >= depth:
+                if entry_flag == self.EXACT:
+                    return entry_score
+                elif entry_flag == self.LOWER:
+                    alpha = max(alpha, entry_score)
+                elif entry_flag == self.UPPER:
+                    beta = min(beta, entry_score)
+                if alpha >= beta:
+                    return entry_score
+
+        if depth <= 0:
+            return self._quiescence(alpha, beta, ply)
+
+        ordered = self._ordered_moves(best_move)
+        if len(ordered) == 0:
+            if engine.in_check(engine.white_to_move):
+                return -self.MATE_SCORE + ply
+            return 0
+
+        best_score = -self.MATE_SCORE - 1
+        best_code = ordered[0]
+        for code in ordered:
+            engine.push_move(code)
+            try:
+                score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                engine.pop()
+
+            if score > best_score:
+                best_score = score
+                best_code = code
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+
+        if best_score <= alpha_orig:
+            flag = self.UPPER
+        elif best_score >= beta:
+            flag = self.LOWER
+        else:
+            flag = self.EXACT
+        self._store(depth, self._score_to_table(best_score, ply), flag, best_code)
+
+        return best_score
+
+    def _quiescence(self, alpha: int, beta: int, ply: int) -> int:
+        # Only captures are searched past the horizon so that the static
+        # evaluation is never taken in the middle of an exchange
+        self._nodes += 1
+        if self._nodes & 0xFF == 0 and time.perf_counter() > self._deadline:
+            raise _SearchTimeout()
+
+        stand_pat = evaluate(self._engine)
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        engine = self._engine
+        for code in self._ordered_moves(None, captures_only=True):
+            engine.push_move(code)
+            try:
+                score = -self._quiescence(-beta, -alpha, ply + 1)
+            finally:
+                engine.pop()
+
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+
+        return alpha
+
+    def _ordered_moves(self, hash_move, captures_only: bool = False) -> List[int]:
+        """Legal moves of the side to move as lib.moves codes: the hash 
+        move first, then captures by most valuable victim / least valuable
+        attacker, then quiet moves. Pawns only promote to queens."""
+        engine = self._engine
+        piece_at = engine.game_state.piece_at_index
+        white = engine.white_to_move
+        queen_value = PIECE_VALUES[Piece.WQUEEN if white else Piece.BQUEEN]
+
+        # The hash move is stored by square names, see _store()
+        hash_squares = None
+        if hash_move is not None:
+            hash_squares = SQUARE_INDEX[hash_move[0]] | SQUARE_INDEX[hash_move[1]] << 6
+
+        scored = []
+        for code in engine.legal_moves(white):
+            if moves.underpromotes(code):
+                continue
+            promotes = moves.promotes(code)
+            if captures_only and not code & moves.CAPTURE and not promotes:
+                continue
+
+            score = 0
+            if code & moves.CAPTURE:
+                src, dest = code & 0x3F, (code >> 6) & 0x3F
+                if code & moves.EN_PASSANT:
+                    dest = (src & 0x38) | (dest & 7)
+                score = 10 * PIECE_VALUES[piece_at(dest)] - PIECE_VALUES[piece_at(src)] + 10000
+            if promotes:
+                score += queen_value
+            if code & 0xFFF == hash_squares:
+                score += 1000000
+            scored.append((score, code))
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [code for _, code in scored]
+
+    def _score_to_table(self, score: int, ply: int) -> int:
+        # Mate scores are stored relative to the node, not the root, so 
+        # they stay correct when the position is reached at another ply
+        if score > self.MATE_SCORE - 1000:
+            return score + ply
+        if score < -self.MATE_SCORE + 1000:
+            return score - ply
+        return score
+
+    def _score_from_table(self, score: int, ply: int) -> int:
+        if score > self.MATE_SCORE - 1000:
+            return score - ply
+        if score < -self.MATE_SCORE + 1000:
+            return score + ply
+        return score
+
+    def _decode(self, code: int) -> Tuple[Tuple[str, str], Optional[Piece]]:
+        # A move code as search() returns it, for the side to move
+        return moves.square_names(code), moves.promotion_piece(code, self._engine.white_to_move)
+
+    def _store(self, depth: int, score: int, flag: int, code: int) -> None:
+        # Tables hold moves by square names, which every table type 
+        # (including the shared one of lib.parallel) can pack
+        move, promotion = self._decode(code)
+        self._table.store(self._engine.position_key, depth, score, flag, move, promotion)
@@ -0,0 +1,245 @@
+from lib.chess import ChessEngine
+from lib.moves import from_squares, promotion_piece, square_names
+from lib.pgn import read_games, san_to_move
+from lib.pieces import Piece
+from array import array
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+import mmap
+import struct
+import sys
+
+# File layout:
+#   file header    magic, version, game count, index offset
+#   games          per game: a game header, the start FEN (if any), then
+#                  one 16-bit word per move
+#   index          one 64-bit offset per game, pointing at its header
+_MAGIC = b'CHGA'
+_VERSION = 1
+_FILE_HEADER = struct.Struct('<4sHxxQQ')
+_GAME_HEADER = struct.Struct('<HBxH')
+
+
+RESULTS = ('*', '1-0', '0-1', '1/2-1/2')
+
+
+def pack_move(move: Tuple[str, str], promotion: Piece = None) -> int:
+    """Packs a move into 16 bits, the word of a lib.moves code.
+
+    Args:
+        move (Tuple[str, str]): Source and destination squares
+        promotion (Piece): The promotion piece, if the move promotes
+
+    Returns:
+        int: The packed move
+    """
+    return from_squares(move, promotion)
+
+
+def unpack_move(code: int, white: bool) -> Tuple[Tuple[str, str], Optional[Piece]]:
+    """Inverse of pack_move().
+
+    Args:
+        code (int): The packed move
+        white (bool): True if white plays the move, which decides the
+            color of the promotion piece
+
+    Returns:
+        ((str, str), Piece): The move and its promotion piece (or None)
+    """
+    return square_names(code), promotion_piece(code, white)
+
+
+class GameHeader(NamedTuple):
+    """Per-game data stored ahead of the moves.
+
+    Attributes:
+        plies (int): Number of moves
+        result (str): One of RESULTS
+        fen (str): Start position, or None for the standard one
+    """
+    plies: int
+    result: str
+    fen: Optional[str]
+
+
+class ArchiveWriter:
+    """Writes games to a new archive file. Use as a context manager, or
+    call close() to write the index.
+
+    Args:
+        path (str): The archive file to create
+    """
+    __slots__ = ('_file', '_offsets', '_position')
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, 'wb')
+        self._offsets = array('Q')
+        self._file.write(_FILE_HEADER.pack(_MAGIC, _VERSION, 0, 0))
+        self._position = _FILE_HEADER.size
+
+    def __enter__(self) -> 'ArchiveWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def add_game(self,
+                 moves: Iterable[Tuple[Tuple[str, str], Optional[Piece]]],
+                 result: str = '*',
+                 fen: str = None) -> None:
+        """Appends a game. Moves are not checked for legality.
+
+        Args:
+            moves: The game's (move, promotion) pairs, in order
+            result (str): One of RESULTS
+            fen (str): Start position, None for the standard one
+        """
+        words = array('H', (pack_move(move, promotion) for move, promotion in moves))
+        if sys.byteorder != 'little':
+            words.byteswap()
+        fen_bytes = fen.encode('ascii') if fen is not None else b''
+
+        self._offsets.append(self._position)
+        data = _GAME_HEADER.pack(len(words), RESULTS.index(result), len(fen_bytes)) + fen_bytes + words.tobytes()
+        self._file.write(data)
+        self._position += len(data)
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        offsets = self._offsets
+        if sys.byteorder != 'little':
+            offsets = array('Q', offsets)
+            offsets.byteswap()
+        self._file.write(offsets.tobytes())
+        self._file.seek(0)
+        self._file.write(_FILE_HEADER.pack(_MAGIC, _VERSION, len(self._offsets), self._position))
+        self._file.close()
+
+
+class GameArchive:
+    """Random access to the games of an archive file through mmap.
+
+    Nothing is read up front, so opening an archive of any size is
+    instant, and only the pages of the games actually used are loaded.
+
+    Args:
+        path (str): The archive file
+
+    Raises:
+        ValueError: If the file is not an archive
+    """
+    __slots__ = ('_file', '_map', '_count', '_index_offset')
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count, self._index_offset = _FILE_HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self.close()
+            raise ValueError(f"Not a game archive: {path}")
+
+    def __enter__(self) -> 'GameArchive':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _game_offset(self, game_idx: int) -> int:
+        if not 0 <= game_idx < self._count:
+            raise IndexError(f"Game {game_idx} out of range")
+        return struct.unpack_from('<Q', self._map, self._index_offset + 8 * game_idx)[0]
+
+    def header(self, game_idx: int) -> GameHeader:
+        offset = self._game_offset(game_idx)
+        plies, result, fen_length = _GAME_HEADER.unpack_from(self._map, offset)
+        fen = None
+        if fen_length:
+            start = offset + _GAME_HEADER.size
+            fen = self._map[start:start + fen_length].decode('ascii')
+        return GameHeader(plies, RESULTS[result], fen)
+
+    def packed_moves(self, game_idx: int) -> array:
+        """Returns the game's moves as packed 16-bit words (see pack_move)."""
+        offset = self._game_offset(game_idx)
+        plies, _, fen_length = _GAME_HEADER.unpack_from(self._map, offset)
+        start = offset + _GAME_HEADER.size + fen_length
+        words = array('H', self._map[start:start + 2 * plies])
+        if sys.byteorder != 'little':
+            words.byteswap()
+        return words
+
+    def moves(self, game_idx: int) -> List[Tuple[Tuple[str, str], Optional[Piece]]]:
+        """Returns the game's (move, promotion) pairs."""
+        header = self.header(game_idx)
+        white = header.fen is None or header.fen.split()[1] == 'w'
+        moves = []
+        for code in self.packed_moves(game_idx):
+            moves.append(unpack_move(code, white))
+            white = not white
+        return moves
+
+    def replay(self, game_idx: int, plies: int = None, board=None) -> ChessEngine:
+        """Plays a game into a new engine.
+
+        Args:
+            game_idx (int): The game to replay
+            plies (int): Stop after this many moves. Plays them all when
+                omitted.
+            board: Optional board backend for the engine
+
+        Returns:
+            ChessEngine: The engine after the moves
+
+        Raises:
+            ValueError: If the archive holds an illegal move
+        """
+        header = self.header(game_idx)
+        engine = ChessEngine.from_fen(header.fen, board) if header.fen else ChessEngine(board)
+        codes = self.packed_moves(game_idx)
+        for code in codes[:plies] if plies is not None else codes:
+            move, promotion = unpack_move(code, engine.white_to_move)
+            engine.push(move, promotion)
+        return engine
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+
+def convert_pgn(pgn_path: str, archive_path: str) -> Tuple[int, int]:
+    """Converts the valid games of a PGN file into an archive.
+
+    Args:
+        pgn_path (str): The PGN file to read
+        archive_path (str): The archive file to create
+
+    Returns:
+        (int, int): Number of games written, and number skipped because
+            of illegal, ambiguous or unreadable moves
+    """
+    written = skipped = 0
+    with ArchiveWriter(archive_path) as writer:
+        for game in read_games(pgn_path):
+            fen = game.headers.get('FEN')
+            try:
+                engine = ChessEngine.from_fen(fen) if fen else ChessEngine()
+                moves = []
+                for san in game.moves:
+                    move, promotion = san_to_move(engine, san)
+                    engine.push(move, promotion)
+                    moves.append((move, promotion))
+            except ValueError:
+                skipped += 1
+                continue
+
+            result = game.result if game.result in RESULTS else '*'
+            writer.add_game(moves, result, fen)
+            written += 1
+    return written, skipped
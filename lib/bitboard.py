@@ -0,0 +1,291 @@
+from lib.pieces import Piece, WHITE_PIECES, ALL_PIECES
+from lib.zobrist import PIECE_SQUARE_KEYS
+from typing import Dict, Iterator, Tuple
+
+# Square i is file (i % 8) and rank (i // 8), so a1 = 0, h1 = 7, h8 = 63.
+SQUARES = [f + r for r in '12345678' for f in 'abcdefgh']
+SQUARE_INDEX = {name: idx for idx, name in enumerate(SQUARES)}
+
+
+def square_index(pos: str) -> int:
+    """Converts a position string (e.g. 'e2') to a 0-63 square index."""
+    return SQUARE_INDEX[pos]
+
+
+def square_name(idx: int) -> str:
+    """Converts a 0-63 square index to a position string."""
+    return SQUARES[idx]
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """Yields the index of every set bit in mask, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class BoardRank:
+    """A single rank of a BoardView, indexed by file letter."""
+    __slots__ = ('_owner', '_row')
+
+    def __init__(self, owner, row: str) -> None:
+        self._owner = owner
+        self._row = row
+
+    def __getitem__(self, col: str) -> Piece:
+        return self._owner.piece_at(col + self._row)
+
+    def __setitem__(self, col: str, piece: Piece) -> None:
+        self._owner.set_piece(col + self._row, piece)
+
+    def __iter__(self):
+        return iter(self._owner.cols)
+
+    def keys(self):
+        return list(self._owner.cols)
+
+
+class BoardView:
+    """Compatibility view so that every board backend can be read and
+    written as ``board[row][col]``. Writes go through the board's
+    set_piece(), which keeps its zobrist key in step."""
+    __slots__ = ('_owner',)
+
+    def __init__(self, owner) -> None:
+        self._owner = owner
+
+    def __getitem__(self, row: str) -> BoardRank:
+        if row not in self._owner.rows:
+            raise KeyError(row)
+        return BoardRank(self._owner, row)
+
+    def __iter__(self):
+        return iter(self._owner.rows)
+
+    def keys(self):
+        return list(self._owner.rows)
+
+    def __deepcopy__(self, memo) -> Dict[str, Dict[str, Piece]]:
+        # A deep copy detaches from the board as a plain dict of dicts
+        return {row: {col: self._owner.piece_at(col + row)
+                      for col in self._owner.cols}
+                for row in self._owner.rows}
+
+
+class BitBoard:
+    """Holds game state as one 64-bit integer per piece type and color.
+
+    A 64-entry list mirrors the bitboards square by square, so that
+    looking up the piece on a square is a single index.
+
+    Exposes the same interface as ChessBoard so that ChessEngine can run
+    on either backend, e.g. ``ChessEngine(BitBoard())``.
+    """
+    __slots__ = ('_rows', '_cols', '_bitboards', '_white_occupancy',
+                 '_black_occupancy', '_unmoved', '_zobrist', '_mailbox')
+
+    def __init__(self):
+        self._rows = ['1', '2', '3', '4', '5', '6', '7', '8']
+        self._cols = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
+        self._bitboards = [0] * len(ALL_PIECES)
+        self._white_occupancy = 0
+        self._black_occupancy = 0
+        # Bit set while the piece that started on a square has not left it
+        self._unmoved = 0
+        self._zobrist = 0
+        # The piece on each square, Piece.EMPTY if none
+        self._mailbox = [Piece.EMPTY] * 64
+        self.initialize_board()
+
+    @property
+    def board(self) -> BoardView:
+        return BoardView(self)
+
+    @board.setter
+    def board(self, new_board) -> None:
+        # Has-moved flags are left as they are, as for ChessBoard
+        self._bitboards = [0] * len(ALL_PIECES)
+        self._white_occupancy = 0
+        self._black_occupancy = 0
+        self._zobrist = 0
+        self._mailbox = [Piece.EMPTY] * 64
+        for row in self._rows:
+            for col in self._cols:
+                piece = new_board[row][col]
+                if piece != Piece.EMPTY:
+                    self._add(SQUARE_INDEX[col + row], piece)
+
+    @property
+    def rows(self):
+        return self._rows
+
+    @property
+    def cols(self):
+        return self._cols
+
+    @property
+    def white_occupancy(self) -> int:
+        return self._white_occupancy
+
+    @property
+    def black_occupancy(self) -> int:
+        return self._black_occupancy
+
+    @property
+    def occupancy(self) -> int:
+        return self._white_occupancy | self._black_occupancy
+
+    @property
+    def zobrist_key(self) -> int:
+        """Zobrist hash of the piece placement, kept up to date on every change."""
+        return self._zobrist
+
+    def bitboard(self, piece: Piece) -> int:
+        """Returns the bitboard of every square holding piece."""
+        return self._bitboards[piece.value]
+
+    def initialize_board(self) -> None:
+        """Initializes the bitboards to the standard starting position."""
+        self._bitboards = [0] * len(ALL_PIECES)
+        self._white_occupancy = 0
+        self._black_occupancy = 0
+        self._zobrist = 0
+        self._mailbox = [Piece.EMPTY] * 64
+        back_rank = [Piece.WROOK, Piece.WKNIGHT, Piece.WBISHOP, Piece.WQUEEN,
+                     Piece.WKING, Piece.WBISHOP, Piece.WKNIGHT, Piece.WROOK]
+        for file_idx, piece in enumerate(back_rank):
+            self._add(file_idx, piece)
+            self._add(8 + file_idx, Piece.WPAWN)
+            self._add(48 + file_idx, Piece.BPAWN)
+            self._add(56 + file_idx, Piece(piece.value + 6))
+        self._unmoved = self.occupancy
+
+    def _add(self, idx: int, piece: Piece) -> None:
+        bit = 1 << idx
+        self._mailbox[idx] = piece
+        self._bitboards[piece.value] |= bit
+        self._zobrist ^= PIECE_SQUARE_KEYS[piece.value][idx]
+        if piece in WHITE_PIECES:
+            self._white_occupancy |= bit
+        else:
+            self._black_occupancy |= bit
+
+    def _clear(self, idx: int) -> Piece:
+        """Empties a square and returns the piece that was on it."""
+        piece = self._mailbox[idx]
+        if piece != Piece.EMPTY:
+            self._mailbox[idx] = Piece.EMPTY
+            mask = ~(1 << idx)
+            self._bitboards[piece.value] &= mask
+            self._zobrist ^= PIECE_SQUARE_KEYS[piece.value][idx]
+            self._white_occupancy &= mask
+            self._black_occupancy &= mask
+        return piece
+
+    def move_piece(self, pos1: str, pos2: str) -> None:
+        """Change the board's state as specified.
+
+        Args:
+            pos1 (str): Position of piece to be moved
+            pos2 (str): Destination of piece to be moved
+        """
+        self.hypothetical_move_piece(pos1, pos2)
+        self._unmoved &= ~(1 << SQUARE_INDEX[pos1])
+
+    def hypothetical_move_piece(self, pos1: str, pos2: str) -> None:
+        """Change the board's state without touching has-moved flags.
+
+        Args:
+            pos1 (str): Position of piece to be moved
+            pos2 (str): Destination of piece to be moved
+        """
+        idx2 = SQUARE_INDEX[pos2]
+        piece = self._clear(SQUARE_INDEX[pos1])
+        self._clear(idx2)
+        if piece != Piece.EMPTY:
+            self._add(idx2, piece)
+
+    def remove_piece(self, pos: str) -> None:
+        """Removes a piece from the game board.
+
+        Args:
+            pos (str): The position of the piece to be removed
+        """
+        idx = SQUARE_INDEX[pos]
+        self._clear(idx)
+        self._unmoved &= ~(1 << idx)
+
+    def promote_piece(self, pos: str, piece: Piece) -> None:
+        """Promotes a piece to a new piece. Classically, for pawns.
+
+        Args:
+            pos (str): The position of the piece to be promoted
+            piece (Piece): The piece that will replace the old piece
+        """
+        self.set_piece(pos, piece)
+
+    def set_piece(self, pos: str, piece: Piece) -> None:
+        """Places piece on pos, replacing whatever was there."""
+        idx = SQUARE_INDEX[pos]
+        self._clear(idx)
+        if piece != Piece.EMPTY:
+            self._add(idx, piece)
+
+    def restore_square(self, pos: str, piece: Piece, has_moved: bool) -> None:
+        """Sets both the piece and the has-moved flag of a square. Meant 
+        for undoing moves exactly.
+        """
+        self.restore_index(SQUARE_INDEX[pos], piece, has_moved)
+
+    def restore_index(self, idx: int, piece: Piece, has_moved: bool) -> None:
+        """Like restore_square, for a 0-63 square index."""
+        self._clear(idx)
+        if piece != Piece.EMPTY:
+            self._add(idx, piece)
+        if has_moved:
+            self._unmoved &= ~(1 << idx)
+        else:
+            self._unmoved |= 1 << idx
+
+    def has_moved(self, pos: str) -> bool:
+        """Checks if the piece at some position is in its initial state.
+
+        Args:
+            pos (str): The position of the piece
+
+        Returns:
+            True if the piece has moved from it's initial position
+        """
+        return not (self._unmoved >> SQUARE_INDEX[pos]) & 1
+
+    def has_moved_index(self, idx: int) -> bool:
+        """Like has_moved, for a 0-63 square index."""
+        return not (self._unmoved >> idx) & 1
+
+    def piece_at(self, pos: str) -> Piece:
+        return self._mailbox[SQUARE_INDEX[pos]]
+
+    def piece_at_index(self, idx: int) -> Piece:
+        """Like piece_at, for a 0-63 square index."""
+        return self._mailbox[idx]
+
+    def pieces(self, white: bool) -> Iterator[Tuple[str, Piece]]:
+        """Yields (position, piece) for every piece of one color."""
+        mask = self._white_occupancy if white else self._black_occupancy
+        mailbox = self._mailbox
+        for idx in iter_bits(mask):
+            yield SQUARES[idx], mailbox[idx]
+
+    def indexed_pieces(self, white: bool) -> Iterator[Tuple[int, Piece]]:
+        """Like pieces, with 0-63 square indices instead of positions."""
+        mask = self._white_occupancy if white else self._black_occupancy
+        mailbox = self._mailbox
+        for idx in iter_bits(mask):
+            yield idx, mailbox[idx]
+
+    def unpack_move_string(self, pos: str) -> Tuple[str, str]:
+        return pos[1], pos[0]
+
+    def pack_move_string(self, r_idx: str, c_idx: str) -> str:
+        return ''.join((c_idx, r_idx))
@@ -0,0 +1,231 @@
+from lib.agents import Player, AlphaBetaAgent
+from lib.archive import GameArchive, unpack_move
+from lib.chess import ChessEngine
+from lib.pieces import Piece
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+import mmap
+import random
+import struct
+
+# File layout: a header (magic, version, entry count) followed by entries
+# sorted by position key, each holding the key, a move packed as in
+# lib.archive, and a weight. A position's moves are stored heaviest first.
+_MAGIC = b'CHBK'
+_VERSION = 1
+_HEADER = struct.Struct('<4sHxxQ')
+_ENTRY = struct.Struct('<QHH')
+_MAX_WEIGHT = 0xFFFF
+
+
+def write_book(path: str, entries: Iterable[Tuple[int, int, int]]) -> int:
+    """Writes an opening book.
+
+    Args:
+        path (str): The book file to create
+        entries: (position key, packed move, weight) triples. Weights of
+            repeated (key, move) pairs are added up.
+
+    Returns:
+        int: Number of entries written
+    """
+    weights = Counter()
+    for key, code, weight in entries:
+        weights[key, code] += weight
+
+    rows = sorted(((key, -weight, code) for (key, code), weight in weights.items() if weight > 0))
+    with open(path, 'wb') as stream:
+        stream.write(_HEADER.pack(_MAGIC, _VERSION, len(rows)))
+        for key, negative_weight, code in rows:
+            stream.write(_ENTRY.pack(key, code, min(-negative_weight, _MAX_WEIGHT)))
+    return len(rows)
+
+
+def book_from_archive(archive_path: str, book_path: str, max_plies: int = 20) -> int:
+    """Builds an opening book from the games of an archive.
+
+    Every move played in the first max_plies half moves of a game becomes
+    an entry, weighted 2 for each game the mover won and 1 for each draw,
+    so moves that only ever lost are left out.
+
+    Args:
+        archive_path (str): Games to learn from (see lib.archive)
+        book_path (str): The book file to create
+        max_plies (int): Depth of the book in half moves
+
+    Returns:
+        int: Number of entries written
+    """
+    def entries():
+        with GameArchive(archive_path) as archive:
+            for game_idx in range(len(archive)):
+                header = archive.header(game_idx)
+                if header.result == '*':
+                    continue
+                engine = ChessEngine.from_fen(header.fen) if header.fen else ChessEngine()
+                for code in archive.packed_moves(game_idx)[:max_plies]:
+                    white = engine.white_to_move
+                    if header.result == '1/2-1/2':
+                        weight = 1
+                    else:
+                        weight = 2 if (header.result == '1-0') == white else 0
+                    yield engine.position_key, code, weight
+                    engine.push(*unpack_move(code, white))
+
+    return write_book(book_path, entries())
+
+
+class OpeningBook:
+    """Looks up book moves by position key, with a binary search over the
+    memory-mapped book file.
+
+    Args:
+        path (str): The book file
+
+    Raises:
+        ValueError: If the file is not an opening book
+    """
+    __slots__ = ('_file', '_map', '_count')
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self.close()
+            raise ValueError(f"Not an opening book: {path}")
+
+    def __enter__(self) -> 'OpeningBook':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def lookup(self, key: int) -> List[Tuple[int, int]]:
+        """Finds the book moves of a position.
+
+        Args:
+            key (int): The position key (ChessEngine.position_key)
+
+        Returns:
+            List[Tuple[int, int]]: (packed move, weight) pairs, heaviest
+                first. Empty if the position is not in the book.
+        """
+        data, base, size = self._map, _HEADER.size, _ENTRY.size
+
+        # Leftmost entry with this key
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            if struct.unpack_from('<Q', data, base + mid * size)[0] < key:
+                low = mid + 1
+            else:
+                high = mid
+
+        moves = []
+        while low < self._count:
+            entry_key, code, weight = _ENTRY.unpack_from(data, base + low * size)
+            if entry_key != key:
+                break
+            moves.append((code, weight))
+            low += 1
+        return moves
+
+    def moves(self, engine: ChessEngine) -> List[Tuple[Tuple[str, str], Optional[Piece], int]]:
+        """Returns the book moves for the engine's position that are legal
+        there, which rules out the rare key collision.
+
+        Returns:
+            List: (move, promotion, weight) entries, heaviest first
+        """
+        white = engine.white_to_move
+        moves = []
+        for code, weight in self.lookup(engine.position_key):
+            move, promotion = unpack_move(code, white)
+            if len(engine.move_implications(move[0], move[1], white)) > 0:
+                moves.append((move, promotion, weight))
+        return moves
+
+    def choose(self, engine: ChessEngine, rng: random.Random = None) -> Optional[Tuple[Tuple[str, str], Optional[Piece]]]:
+        """Picks a book move at random, in proportion to the weights.
+
+        Returns:
+            ((str, str), Piece): The move and its promotion piece, or None
+                if the position is not in the book
+        """
+        moves = self.moves(engine)
+        if len(moves) == 0:
+            return None
+        move, promotion, _ = (rng or random).choices(moves, weights=[entry[2] for entry in moves])[0]
+        return move, promotion
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+
+class BookAgent(Player):
+    """A computer player that plays from an opening book while it can, and
+    hands the position to another agent once out of book.
+
+    Args:
+        name (str): Player name
+        color (str): 'white' or 'black'
+        book (OpeningBook): The opening book
+        fallback (Player): Agent used out of book. Defaults to an
+            AlphaBetaAgent with default settings.
+        seed (int): Seed for choosing between book moves
+    """
+    __slots__ = ('_engine', '_book', '_fallback', '_rng', '_promotion', '_in_book')
+
+    def __init__(self,
+                 name: str,
+                 color: str,
+                 book: OpeningBook,
+                 fallback: Player = None,
+                 seed: int = None) -> None:
+        super().__init__(name, color)
+        self._engine = None
+        self._book = book
+        self._fallback = fallback if fallback is not None else AlphaBetaAgent(name, color)
+        self._rng = random.Random(seed)
+        self._promotion = None
+        self._in_book = False
+
+    @property
+    def is_human(self) -> bool:
+        return False
+
+    @property
+    def in_book(self) -> bool:
+        """True if the last move came from the book."""
+        return self._in_book
+
+    def attach(self, engine) -> None:
+        self._engine = engine
+        self._fallback.attach(engine)
+
+    def specify_move(self) -> str:
+        if self._engine is None:
+            raise RuntimeError("BookAgent needs an engine, see attach()")
+
+        choice = self._book.choose(self._engine, self._rng)
+        self._in_book = choice is not None
+        if self._in_book:
+            (p1, p2), self._promotion = choice
+            move = f"{p1},{p2}"
+        else:
+            move = self._fallback.specify_move()
+            self._promotion = self._fallback.specify_promotion(self._engine.white_to_move)
+
+        self.move_list.append(move)
+        return move
+
+    def specify_promotion(self, is_white_turn: bool) -> Optional[Piece]:
+        return self._promotion
+
+    def close(self) -> None:
+        self._fallback.close()
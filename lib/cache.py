@@ -0,0 +1,74 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    """A size-capped mapping that evicts the least recently used entry,
+    and counts its hits and misses.
+
+    Pickling or copying a cache gives an empty one with the same size
+    cap, so it never bloats what it is attached to.
+
+    Args:
+        max_entries (int): Maximum number of entries held at once
+    """
+    __slots__ = ('_entries', '_max_entries', '_hits', '_misses')
+
+    def __init__(self, max_entries: int = 1 << 14) -> None:
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+        self._hits = 0
+        self._misses = 0
+
+    def __getstate__(self) -> int:
+        return self._max_entries
+
+    def __setstate__(self, max_entries: int) -> None:
+        self.__init__(max_entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def max_entries(self) -> int:
+        return self._max_entries
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups that were hits, 0 before any lookup."""
+        lookups = self._hits + self._misses
+        return self._hits / lookups if lookups else 0.0
+
+    def get(self, key, default=None):
+        entries = self._entries
+        value = entries.get(key, self)
+        if value is self:
+            self._misses += 1
+            return default
+        entries.move_to_end(key)
+        self._hits += 1
+        return value
+
+    def put(self, key, value) -> None:
+        entries = self._entries
+        entries[key] = value
+        entries.move_to_end(key)
+        if len(entries) > self._max_entries:
+            entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drops every entry. The statistics are kept."""
+        self._entries.clear()
+
+    def reset_stats(self) -> None:
+        self._hits = 0
+        self._misses = 0
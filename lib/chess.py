@@ -1,36 +1,141 @@
+from array import array
 from math import hypot
-from lib.frontend import ChessBoard, ChessFEUnicode
-from lib.pieces import Piece
+from lib.bitboard import SQUARES, SQUARE_INDEX, iter_bits
+from lib.geometry import (STRAIGHT_RAYS, DIAGONAL_RAYS, QUEEN_RAYS, STRAIGHT_BETWEEN,
+                          DIAGONAL_BETWEEN, BETWEEN_MASKS, KNIGHT_TARGETS,
+                          KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, between)
+from lib.frontend import ChessBoard, ChessFE, ChessFEUnicode
+from lib.pieces import Piece, FEN_SYMBOLS, FEN_PIECES, WHITE_PIECES
 from lib.agents import Player
-from typing import Type, List, Tuple
-import copy
+from lib.cache import LRUCache
+from lib import moves
+from lib import tablebase
+from lib import zobrist
+from typing import Iterator, NamedTuple, Optional, Type, List, Tuple
+
+# King and rook squares of each castling right
+_CASTLING_PATHS = ((4, 7, zobrist.WHITE_KINGSIDE),
+                   (4, 0, zobrist.WHITE_QUEENSIDE),
+                   (60, 63, zobrist.BLACK_KINGSIDE),
+                   (60, 56, zobrist.BLACK_QUEENSIDE))
+_CASTLING_SQUARES = frozenset({4, 7, 0, 60, 63, 56})
+# Rook square and destination of a castling move, by king destination
+_CASTLING_ROOKS = {6: (7, 5), 2: (0, 3), 62: (63, 61), 58: (56, 59)}
+_CASTLING_SYMBOLS = {'K': zobrist.WHITE_KINGSIDE, 'Q': zobrist.WHITE_QUEENSIDE,
+                     'k': zobrist.BLACK_KINGSIDE, 'q': zobrist.BLACK_QUEENSIDE}
+# Promotion field of a move code (see lib.moves) for a queen, rook,
+# bishop and knight
+_PROMOTION_FIELDS = (1 << 12, 2 << 12, 3 << 12, 4 << 12)
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+# ChessGame asks about every move up to three times (is_legal, promotes,
+# apply), so its engine remembers the last few answers
+_GAME_CACHE_SIZE = 16
+# Per-square rays of each sliding piece, see lib.geometry
+_SLIDER_RAYS = {Piece.WROOK:   STRAIGHT_RAYS,
+                Piece.BROOK:   STRAIGHT_RAYS,
+                Piece.WBISHOP: DIAGONAL_RAYS,
+                Piece.BBISHOP: DIAGONAL_RAYS,
+                Piece.WQUEEN:  QUEEN_RAYS,
+                Piece.BQUEEN:  QUEEN_RAYS}
+# Pieces that attack along straight lines and along diagonals, by color
+_STRAIGHT_SLIDERS = (frozenset({Piece.WROOK, Piece.WQUEEN}), frozenset({Piece.BROOK, Piece.BQUEEN}))
+_DIAGONAL_SLIDERS = (frozenset({Piece.WBISHOP, Piece.WQUEEN}), frozenset({Piece.BBISHOP, Piece.BQUEEN}))
 
 class ChessEngine:
-    """The backend of the chess game. Encodes all of the chess rules."""
-    def __init__(self):
-        self._chess_board  = ChessBoard()
-        self._piece_fn_map = {Piece.BPAWN:   self.pawn_move_implications,
-                              Piece.BROOK:   self.rook_move_implications, 
-                              Piece.BKNIGHT: self.knight_move_implications, 
-                              Piece.BBISHOP: self.bishop_move_implications, 
-                              Piece.BQUEEN:  self.queen_move_implications, 
-                              Piece.BKING:   self.king_move_implications, 
-                              Piece.WPAWN:   self.pawn_move_implications,
-                              Piece.WROOK:   self.rook_move_implications, 
-                              Piece.WKNIGHT: self.knight_move_implications, 
-                              Piece.WBISHOP: self.bishop_move_implications, 
-                              Piece.WQUEEN:  self.queen_move_implications, 
-                              Piece.WKING:   self.king_move_implications}
-        self._white = {Piece.WROOK, Piece.WKNIGHT, Piece.WBISHOP, 
-                       Piece.WQUEEN, Piece.WKING, Piece.WPAWN}
-        self._last_white_move = []
-        self._last_black_move = []
+    """The backend of the chess game. Encodes all of the chess rules.
+
+    Args:
+        board: The board backend holding game state. Anything exposing the
+            ChessBoard interface works (e.g. lib.bitboard.BitBoard); 
+            defaults to a fresh ChessBoard.
+        cache_size (int): Number of move_implications results remembered
+            by position key and squares (see move_cache). Worth it only for
+            callers that ask about the same move more than once, such as
+            ChessGame; 0 (the default) disables the cache.
+    """
+    __slots__ = ('_chess_board', '_last_white_move', '_last_black_move',
+                 '_white_turn', '_white_king', '_black_king',
+                 '_white_in_check', '_black_in_check',
+                 '_attacks', '_attacks_key', '_attack_counts', '_attack_maps',
+                 '_undo_stack',
+                 '_white_to_move', '_castling_rights', '_state_key',
+                 '_halfmove_clock', '_fullmove_number', '_move_cache',
+                 '_lines_key', '_lines')
+
+    # Shared by every engine so that a game only carries its own state
+    _white = frozenset({Piece.WROOK, Piece.WKNIGHT, Piece.WBISHOP, 
+                        Piece.WQUEEN, Piece.WKING, Piece.WPAWN})
+
+    def __init__(self, board=None, cache_size: int = 0):
+        self._chess_board  = board if board is not None else ChessBoard()
+        # Each side's last move as a lib.moves code, for en passant
+        self._last_white_move = None
+        self._last_black_move = None
         self._white_turn = None
-        self._white_king_pos = 'e1'
-        self._black_king_pos = 'e8'
+        # Square index (0-63) of each king
+        self._white_king = 4
+        self._black_king = 60
         self._white_in_check = False
         self._black_in_check = False
 
+        # Squares attacked from each square (0 if empty) for the piece
+        # placement with zobrist key _attacks_key, built when first asked
+        # for and then updated by every move (see _update_attacks). With
+        # it, how many pieces of each color attack each square (white's
+        # at 0-63, black's at 64-127) and the squares attacked by each
+        # color (0 is white, 1 is black), which the counts keep up to
+        # date. release() drops all three between searches
+        self._attacks = None
+        self._attacks_key = None
+        self._attack_counts = None
+        self._attack_maps = None
+
+        # One entry per pushed move, holding what pop() needs to undo it.
+        # Created when first needed and dropped by commit(), so that a game
+        # between moves doesn't carry it
+        self._undo_stack = None
+
+        # Side to move, castling rights and en passant, which together with
+        # the board's placement key make up the position key
+        self._white_to_move = True
+        self._castling_rights = self.castling_rights()
+        self._state_key = zobrist.state_key(True, self._castling_rights)
+
+        # Half moves since the last capture or pawn move (fifty move rule),
+        # and the move number as written in FEN
+        self._halfmove_clock = 0
+        self._fullmove_number = 1
+
+        # Results of move_implications, which only depend on the position
+        # and squares
+        self._move_cache = LRUCache(cache_size) if cache_size > 0 else None
+
+        # Checkers and pins of each king (see king_lines), for the piece
+        # placement with zobrist key _lines_key, also created when first
+        # needed and dropped by commit()
+        self._lines_key = None
+        self._lines = None
+
+    @classmethod
+    def from_fen(cls, fen: str, board=None, cache_size: int = 0) -> 'ChessEngine':
+        """Creates an engine set up at the position described by a FEN string.
+
+        Args:
+            fen (str): The position in Forsyth-Edwards Notation
+            board: Optional board backend to load the position into,
+                as for the constructor
+            cache_size (int): As for the constructor
+
+        Returns:
+            ChessEngine: An engine holding the position
+
+        Raises:
+            ValueError: If the FEN string is malformed
+        """
+        engine = cls(board, cache_size)
+        engine.set_fen(fen)
+        return engine
+
     def move_implications(self, 
                           p1: str, 
                           p2: str, 
@@ -49,15 +154,24 @@ class ChessEngine:
                 Another type is a movement which is encoded as a 
                 (str, str) tuple. A promotion is encoded as 
                 a (None, str) tuple. Finally, a check is encoded as a 
-                (None, None) tuple. If the consequences list is empty, this 
-                implies that the move is not valid. 
+                (None, None) tuple, except for promotions, whose check 
+                depends on the piece chosen. If the consequences list is 
+                empty, this implies that the move is not valid.
         """
-        consequences = []
         self._white_turn = white_turn
+        cache = self._move_cache
+        if cache is not None:
+            key = (self._chess_board.zobrist_key ^ self._state_key, p1, p2, white_turn)
+            cached = cache.get(key)
+            if cached is not None:
+                # Stored as a tuple, so callers always get their own list
+                return list(cached)
+
+        consequences = []
 
         p1num, p1letter = self._chess_board.unpack_move_string(p1)
         p2num, p2letter = self._chess_board.unpack_move_string(p2)
-        src_piece  = self._chess_board.board[p1num][p1letter]
+        src_piece  = self._chess_board.piece_at(p1)
 
         # Checking bounds of move indices
         bounds_correct  = ord(p1num)    <= ord('8') and ord(p1num)    >= ord('1')
@@ -78,56 +192,18 @@ class ChessEngine:
         valid = bounds_correct and non_empty and color_correct and not_same
 
         if valid:
-            consequences = self._piece_fn_map[src_piece](p1, p2)
-            check = False
-
-            if self._white_turn:
-                if src_piece == Piece.WKING:
-                    self._white_king_pos = p2
-            else:
-                if src_piece == Piece.BKING:
-                    self._black_king_pos = p2
-
-            # Important to store last move info for en passant
-            if self._white_turn:
-                # Check for check
-                movements = filter(lambda item: item[0] is not None and item[1] is not None, consequences)
-                for movement in movements:
-                    in_check_cons = self._piece_fn_map[src_piece](movement[1], self._black_king_pos)
-                    captures = filter(lambda item: item[0] is not None and item[1] is None, in_check_cons)
-                    captures = list(captures)
-                    if len(captures) > 0:
-                        check = True
-                
-                self._last_white_move = consequences
-            else:
-                # Check for check
-                movements = filter(lambda item: item[0] is not None and item[1] is not None, consequences)
-                for movement in movements:
-                    in_check_cons = self._piece_fn_map[src_piece](movement[1], self._white_king_pos)
-                    captures = filter(lambda item: item[0] is not None and item[1] is None, in_check_cons)
-                    captures = list(captures)
-                    if len(captures) > 0:
-                        check = True
-
-                self._last_black_move = consequences
-
-            if check:
-                consequences.append((None,None))
-                if self._white_turn:
-                    self._black_in_check = True
-                else:
-                    self._white_in_check = True
-            else:
-                if self._white_turn:
-                    self._black_in_check = False
-                else:
-                    self._white_in_check = False
+            consequences = self._piece_fn_map[src_piece](self, p1, p2)
 
         # Checks to see if our move jeopardizes OUR king
-        if self.jeopardizes_our_king(consequences):
+        if len(consequences) > 0 and not self._keeps_king_safe(p1, p2, consequences, white_turn):
             consequences = []
 
+        # Check for check, direct or discovered
+        if len(consequences) > 0 and self._gives_check(p1, p2, src_piece, consequences, white_turn):
+            consequences.append((None,None))
+
+        if cache is not None:
+            cache.put(key, tuple(consequences))
         return consequences
 
     def pawn_move_implications(self, p1: str, p2: str) -> List[Tuple[str,str]]:
@@ -148,19 +224,12 @@ class ChessEngine:
         # Only continue if attempted move is in correct direction
         if dir_correct:
             in_initial = not self._chess_board.has_moved(p1)
-            dest_piece = self._chess_board.board[p2num][p2letter]
+            dest_piece = self._chess_board.piece_at(p2)
             dest_piece_empty = dest_piece == Piece.EMPTY
 
             # Checking if movement is diagonal
-            if self._white_turn:
-                diag_row = ord(p1num) == ord(p2num) - 1
-            else:
-                diag_row = ord(p1num) == ord(p2num) + 1
-
-            diag_col = (ord(p1letter) == ord(p2letter) + 1)
-            diag_col |= (ord(p1letter) == ord(p2letter) - 1)
-
-            is_diag = diag_col and diag_row
+            attacks = PAWN_ATTACKS[0 if self._white_turn else 1][SQUARE_INDEX[p1]]
+            is_diag = (attacks >> SQUARE_INDEX[p2]) & 1 == 1
 
             if dest_piece_empty:
                 same_col = p1letter == p2letter
@@ -173,7 +242,10 @@ class ChessEngine:
                         if num_fwd == 1:
                             consequences.append((p1,p2))
                         elif in_initial and num_fwd == 2:
-                            consequences.append((p1,p2))
+                            # A double step can't jump over a piece
+                            skipped = p1letter + chr((ord(p1num) + ord(p2num)) // 2)
+                            if self._chess_board.piece_at(skipped) == Piece.EMPTY:
+                                consequences.append((p1,p2))
 
                 # Check for en passant
                 if is_diag:
@@ -201,180 +273,97 @@ class ChessEngine:
         return consequences
 
     def rook_move_implications(self, p1: str, p2: str) -> List[Tuple[str,str]]:
-        p1num, p1letter = self._chess_board.unpack_move_string(p1)
-        p2num, p2letter = self._chess_board.unpack_move_string(p2)
+        # Squares in between, None unless p1 and p2 share a row or column
+        between = STRAIGHT_BETWEEN[SQUARE_INDEX[p1] << 6 | SQUARE_INDEX[p2]]
+        if between is None:
+            return []
+        return self._straight_implications(p1, p2, between)
 
+    def _straight_implications(self, p1: str, p2: str, between: Tuple[int, ...]) -> List[Tuple[str,str]]:
         consequences = []
 
-        same_row = p1num == p2num
-        same_col = p1letter == p2letter
-
-        # Check if positions are in same row or column
-        if same_row or same_col:
-            obstructed = self.straight_is_obstructed(p1num, p1letter, p2num, p2letter)
+        if not self._path_is_obstructed(between):
+            # Dealing with source piece and destination piece validation
+            source_piece = self._chess_board.piece_at(p1)
+            dest_piece = self._chess_board.piece_at(p2)
 
-            if not obstructed:
-                # Dealing with source piece and destination piece validation
-                source_piece = self._chess_board.board[p1num][p1letter]
-                dest_piece = self._chess_board.board[p2num][p2letter]
-                
-                source_color = "white" if source_piece in self._white else "black"
+            # If there is a piece in the destination position
+            if dest_piece != Piece.EMPTY:
+                if (dest_piece in self._white) != (source_piece in self._white):
+                    # Eliminate piece
+                    consequences.append((p2,None))
+                    consequences.append((p1,p2))
 
-                # If there is a piece in the destination position
-                if dest_piece != Piece.EMPTY:
-                    dest_color = "white" if dest_piece in self._white else "black"
+            else:
+                consequences.append((p1,p2))
 
-                    if dest_color != source_color:
-                        # Eliminate piece
-                        consequences.append((p2,None))
-                        consequences.append((p1,p2))
-                
-                else:
-                    consequences.append((p1,p2))
-                        
         return consequences
 
     def knight_move_implications(self, p1: str, p2: str) -> List[Tuple[str,str]]:
-        p1num, p1letter = self._chess_board.unpack_move_string(p1)
-        p2num, p2letter = self._chess_board.unpack_move_string(p2)
-
         consequences = []
 
-        row_diff = abs(ord(p1num) - ord(p2num))
-        col_diff = abs(ord(p1letter) - ord(p2letter))
-
-        dest_piece = self._chess_board.board[p2num][p2letter]
-        dest_piece_empty = dest_piece == Piece.EMPTY
-
-        source_color = "white" if self._white_turn else "black"
-        dest_color = "white" if dest_piece in self._white else "black"
-
-        valid_move = row_diff == 1 and col_diff == 2
-        valid_move |= row_diff == 2 and col_diff == 1
+        if (KNIGHT_ATTACKS[SQUARE_INDEX[p1]] >> SQUARE_INDEX[p2]) & 1:
+            dest_piece = self._chess_board.piece_at(p2)
 
-        if not dest_piece_empty:
-            valid_move &= dest_color != source_color
-
-        capture = not dest_piece_empty
-        capture &= dest_piece not in self._white if self._white_turn else dest_piece in self._white
-
-        if valid_move:
-            consequences.append((p1,p2))
-            if capture:
+            if dest_piece == Piece.EMPTY:
+                consequences.append((p1,p2))
+            elif (dest_piece in self._white) != self._white_turn:
+                consequences.append((p1,p2))
                 consequences.append((p2,None))
 
         return consequences
 
     def bishop_move_implications(self, p1: str, p2: str) -> List[Tuple[str,str]]:
-        p1num, p1letter = self._chess_board.unpack_move_string(p1)
-        p2num, p2letter = self._chess_board.unpack_move_string(p2)
+        # Squares in between, None unless p1 and p2 share a diagonal
+        between = DIAGONAL_BETWEEN[SQUARE_INDEX[p1] << 6 | SQUARE_INDEX[p2]]
+        if between is None:
+            return []
+        return self._diagonal_implications(p1, p2, between)
 
+    def _diagonal_implications(self, p1: str, p2: str, between: Tuple[int, ...]) -> List[Tuple[str,str]]:
         consequences = []
 
-        row_diff = ord(p2num) - ord(p1num)
-        col_diff = ord(p2letter) - ord(p1letter)
-
-        diagonal = abs(row_diff) == abs(col_diff)
-        is_obstructed = self.diag_is_obstructed(p1num, p1letter, p2num, p2letter)
-
-        if diagonal and not is_obstructed:
-            dest_piece = self._chess_board.board[p2num][p2letter]
-            dest_piece_empty = dest_piece == Piece.EMPTY
+        if not self._path_is_obstructed(between):
+            dest_piece = self._chess_board.piece_at(p2)
 
-            if dest_piece_empty:
+            if dest_piece == Piece.EMPTY:
                 consequences.append((p1,p2))
-            else:
-                capture = self._white_turn and dest_piece not in self._white
-                capture |= not self._white_turn and dest_piece in self._white
-
-                if capture:
-                    consequences.append((p1,p2))
-                    consequences.append((p2,None))
+            elif (dest_piece in self._white) != self._white_turn:
+                consequences.append((p1,p2))
+                consequences.append((p2,None))
 
         return consequences
 
     def queen_move_implications(self, p1: str, p2: str) -> List[Tuple[str,str]]:
-        p1num, p1letter = self._chess_board.unpack_move_string(p1)
-        p2num, p2letter = self._chess_board.unpack_move_string(p2)
-
-        consequences = []
+        key = SQUARE_INDEX[p1] << 6 | SQUARE_INDEX[p2]
 
-        row_diff = ord(p2num) - ord(p1num)
-        col_diff = ord(p2letter) - ord(p1letter)
+        between = DIAGONAL_BETWEEN[key]
+        if between is not None:
+            return self._diagonal_implications(p1, p2, between)
 
-        diagonal = abs(row_diff) == abs(col_diff)
-        same_row = p1num == p2num
-        same_col = p1letter == p2letter
+        between = STRAIGHT_BETWEEN[key]
+        if between is not None:
+            return self._straight_implications(p1, p2, between)
 
-        if diagonal:
-            is_obstructed = self.diag_is_obstructed(p1num, p1letter, p2num, p2letter)
-            if not is_obstructed:
-                dest_piece = self._chess_board.board[p2num][p2letter]
-                dest_piece_empty = dest_piece == Piece.EMPTY
-
-                if dest_piece_empty:
-                    consequences.append((p1,p2))
-                else:
-                    capture = self._white_turn and dest_piece not in self._white
-                    capture |= not self._white_turn and dest_piece in self._white
-
-                    if capture:
-                        consequences.append((p1,p2))
-                        consequences.append((p2,None))
-
-        elif same_row or same_col:
-            is_obstructed = self.straight_is_obstructed(p1num, p1letter, p2num, p2letter)
-            if not is_obstructed:
-                # Dealing with source piece and destination piece validation
-                source_piece = self._chess_board.board[p1num][p1letter]
-                dest_piece = self._chess_board.board[p2num][p2letter]
-                
-                source_color = "white" if source_piece in self._white else "black"
-
-                # If there is a piece in the destination position
-                if dest_piece != Piece.EMPTY:
-                    dest_color = "white" if dest_piece in self._white else "black"
-
-                    if dest_color != source_color:
-                        # Eliminate piece
-                        consequences.append((p2,None))
-                        consequences.append((p1,p2))
-                
-                else:
-                    consequences.append((p1,p2))
-
-        return consequences
+        return []
 
     def king_move_implications(self, p1: str, p2: str) -> List[Tuple[str,str]]:
         # Need to handle castling and normal king translations
-        p1num, p1letter = self._chess_board.unpack_move_string(p1)
-        p2num, p2letter = self._chess_board.unpack_move_string(p2)
+        idx1, idx2 = SQUARE_INDEX[p1], SQUARE_INDEX[p2]
 
         consequences = []
 
-        row_diff = abs(ord(p1num) - ord(p2num))
-        col_diff = abs(ord(p1letter) - ord(p2letter))
-
-        if col_diff == 2:
-            castling_conseq = self.castling_consequences(p1, p2)
-            consequences = castling_conseq
-        else:
-            dest_piece = self._chess_board.board[p2num][p2letter]
-        
-            if self._white_turn:
-                dest_is_enemy = dest_piece not in self._white and dest_piece != Piece.EMPTY
-            else:
-                dest_is_enemy = dest_piece in self._white
+        if abs(idx1 - idx2) == 2 and idx1 >> 3 == idx2 >> 3:
+            consequences = self.castling_consequences(p1, p2)
 
-            move_valid  = row_diff in {0,1} and col_diff in {0,1}
-            move_valid &= row_diff + col_diff in {1,2}
+        elif (KING_ATTACKS[idx1] >> idx2) & 1:
+            dest_piece = self._chess_board.piece_at(p2)
 
-            if move_valid:
-                if dest_piece == Piece.EMPTY:
-                    consequences.append((p1, p2))
-                elif dest_is_enemy:
-                    consequences.append((p1,p2))
-                    consequences.append((p2, None))
+            if dest_piece == Piece.EMPTY:
+                consequences.append((p1, p2))
+            elif (dest_piece in self._white) != self._white_turn:
+                consequences.append((p1,p2))
+                consequences.append((p2, None))
 
         return consequences
 
@@ -392,7 +381,7 @@ class ChessEngine:
                     rook_pos = 'h1'
                     rook_in_initial = not self._chess_board.has_moved(rook_pos)
                     path_obstructed = self.straight_is_obstructed(p1num, p1letter, '1', 'h')
-                    path_threatened = self.straight_is_threatened(p1num, p1letter, '1', 'h')
+                    path_threatened = self.straight_is_threatened(p1num, p1letter, p2num, p2letter)
                     if rook_in_initial and not path_obstructed and not path_threatened:
                         consequences.append((p1, p2))
                         consequences.append(('h1', 'f1'))
@@ -400,7 +389,7 @@ class ChessEngine:
                     rook_pos = 'h8'
                     rook_in_initial = not self._chess_board.has_moved(rook_pos)
                     path_obstructed = self.straight_is_obstructed(p1num, p1letter, '8', 'h')
-                    path_threatened = self.straight_is_threatened(p1num, p1letter, '8', 'h')
+                    path_threatened = self.straight_is_threatened(p1num, p1letter, p2num, p2letter)
                     if rook_in_initial and not path_obstructed and not path_threatened:
                         consequences.append((p1, p2))
                         consequences.append(('h8', 'f8'))
@@ -409,7 +398,7 @@ class ChessEngine:
                     rook_pos = 'a1'
                     rook_in_initial = not self._chess_board.has_moved(rook_pos)
                     path_obstructed = self.straight_is_obstructed(p1num, p1letter, '1', 'a')
-                    path_threatened = self.straight_is_threatened(p1num, p1letter, '1', 'a')
+                    path_threatened = self.straight_is_threatened(p1num, p1letter, p2num, p2letter)
                     if rook_in_initial and not path_obstructed and not path_threatened:
                         consequences.append((p1, p2))
                         consequences.append(('a1', 'd1'))
@@ -417,7 +406,7 @@ class ChessEngine:
                     rook_pos = 'a8'
                     rook_in_initial = not self._chess_board.has_moved(rook_pos)
                     path_obstructed = self.straight_is_obstructed(p1num, p1letter, '8', 'a')
-                    path_threatened = self.straight_is_threatened(p1num, p1letter, '8', 'a')
+                    path_threatened = self.straight_is_threatened(p1num, p1letter, p2num, p2letter)
                     if rook_in_initial and not path_obstructed and not path_threatened:
                         consequences.append((p1, p2))
                         consequences.append(('a8', 'd8'))
@@ -425,31 +414,15 @@ class ChessEngine:
         return consequences
 
     def straight_is_obstructed(self, p1n: str, p1l: str, p2n: str, p2l: str) -> bool:
-        p1num, p2num, = ord(p1n), ord(p2n)
-        p1char, p2char = ord(p1l), ord(p2l)
-
-        obstructed = False
-
-        same_row = p1num == p2num
-        same_col = p1char == p2char
-
-        if same_row:
-            start = p1char if p1char < p2char else p2char
-            stop = p2char if start == p1char else p1char
-            for ckey in range(start+1, stop):
-                col_key = chr(ckey)
-                if self._chess_board.board[chr(p1num)][col_key] != Piece.EMPTY:
-                    obstructed = True
+        between = STRAIGHT_BETWEEN[SQUARE_INDEX[p1l + p1n] << 6 | SQUARE_INDEX[p2l + p2n]]
+        return between is not None and self._path_is_obstructed(between)
 
-        elif same_col:
-            start = p1num if p1num < p2num else p2num
-            stop = p2num if start == p1num else p1num
-            for rkey in range(start+1, stop):
-                row_key = chr(rkey)
-                if self._chess_board.board[row_key][chr(p1char)] != Piece.EMPTY:
-                    obstructed = True
-
-        return obstructed
+    def _path_is_obstructed(self, squares: Tuple[int, ...]) -> bool:
+        piece_at = self._chess_board.piece_at_index
+        for idx in squares:
+            if piece_at(idx) != Piece.EMPTY:
+                return True
+        return False
 
     def straight_is_threatened(self, p1n: str, p1l: str, p2n: str, p2l: str) -> bool:
         ''' 
@@ -459,405 +432,846 @@ class ChessEngine:
         p1 and p2 need not be valid moves, just 2 positions that share a row
         or a column
         '''
-        p1num, p2num, = ord(p1n), ord(p2n)
-        p1char, p2char = ord(p1l), ord(p2l)
-
-        threatened = False
-
-        same_row = p1num == p2num
-        same_col = p1char == p2char 
-
-        # Grab all tiles in straight, occupied or not
-        tiles = []
-        if same_row or same_col:
-            if same_row:
-                for char_code in range(min(p1char, p2char), max(p1char, p2char)+1): 
-                    tiles.append(f'{chr(char_code)}{chr(p1num)}')
-            else:
-                for num_code in range(min(p1num, p2num), max(p1num, p2num)+1):
-                    tiles.append(f'{chr(p1char)}{char_code}')
+        idx1, idx2 = SQUARE_INDEX[p1l + p1n], SQUARE_INDEX[p2l + p2n]
+        if idx1 != idx2 and STRAIGHT_BETWEEN[idx1 << 6 | idx2] is None:
+            return False
 
-        for tile in tiles:
-            threatened |= self.tile_is_threatened(tile)
+        # Mask of all tiles in straight, occupied or not
+        tiles = BETWEEN_MASKS[idx1 << 6 | idx2] | 1 << idx1 | 1 << idx2
 
-        return threatened
+        enemy = 1 if self._white_turn else 0
+        return self._attack_map(enemy) & tiles != 0
 
-     
     def tile_is_threatened(self, tile: str) -> bool:
         '''
         Determines if a tile is currently threatened. Note that this is
         different from checking if a piece is threatened... looking at
         you, en passant.
         ''' 
-        tile_num, tile_letter = self._chess_board.unpack_move_string(tile)
-        num_ord = ord(tile_num)
-        letter_ord = ord(tile_letter)
+        enemy = 1 if self._white_turn else 0
+        return (self._attack_map(enemy) >> SQUARE_INDEX[tile]) & 1 == 1
 
-        threatened = False
-        
-        if self._white_turn:
-            
-            if self._white_in_check:
-                if self._chess_board.board[tile_num][tile_letter] == Piece.WKING:
-                    threatened = True
-
-            # Iterate over each tile on board and check if the piece is 
-            # threatening the tile in question
-            for n in self._chess_board.rows:
-                if threatened:
-                    break
-
-                for l in self._chess_board.cols:
-                    if threatened:
-                        break
+    def square_is_attacked(self, pos: str, by_white: bool) -> bool:
+        """Checks whether a side attacks a square, using the attack map of
+        the current placement (computed on first use, see _attack_map).
 
-                    piece = self._chess_board.board[n][l]
-
-                    # If enemy piece, then see if it's threatening
-                    if piece not in self._white and piece != Piece.EMPTY:
-                        piece_pos = self._chess_board.pack_move_string(n, l)
-                        
-                        # Check if valid move
-                        move_cons = self._piece_fn_map[piece](piece_pos, tile)
-                        
-                        if len(move_cons) != 0:
-                            captures  = list(filter(lambda item: item[0] is not None 
-                                                            and item[1] is None, move_cons))
-
-                            movements = list(filter(lambda item: item[0] is not None 
-                                                            and item[1] is not None, move_cons))
-
-                            promotions = list(filter(lambda item: item[0] is None 
-                                                            and item[1] is not None, move_cons))
-
-                            check = list(filter(lambda item: item[0] is None 
-                                                            and item[1] is None, move_cons))
-                           
-                            if len(captures) == 0 and len(movements) == 1:
-                                mv_n, mv_l = self._chess_board.unpack_move_string(movements[0][0])
-                                
-                                # Check for special case of pawn moving forward 
-                                # without capturing 
-                                if self._chess_board.board[mv_n][mv_l] != Piece.BPAWN:
-                                    threatened = True
-
-                            elif len(movements) == 1:
-                                threatened = True
-        
-        if not self._white_turn:
-            
-            if self._black_in_check:
-                if self._chess_board.board[tile_num][tile_letter] == Piece.BKING:
-                    threatened = True
-
-            # Iterate over each tile on board and check if the piece is 
-            # threatening the tile in question
-            for n in self._chess_board.rows:
-                if threatened:
-                    break
-
-                for l in self._chess_board.cols:
-                    if threatened:
+        Args:
+            pos (str): The square in question
+            by_white (bool): True to test white's attacks
+        """
+        return (self._attack_map(0 if by_white else 1) >> SQUARE_INDEX[pos]) & 1 == 1
+
+    def piece_attacks(self, idx: int, piece: Piece) -> int:
+        """Computes the squares attacked by a piece.
+
+        Args:
+            idx (int): Square index (0-63) of the piece
+            piece (Piece): The attacking piece
+
+        Returns:
+            int: Bitmask of attacked squares, including squares held by
+                pieces of the same color (i.e. defended squares)
+        """
+        if piece in (Piece.WPAWN, Piece.BPAWN):
+            return PAWN_ATTACKS[0 if piece == Piece.WPAWN else 1][idx]
+
+        if piece in _SLIDER_RAYS:
+            piece_at = self._chess_board.piece_at_index
+            attacks = 0
+            for ray in _SLIDER_RAYS[piece][idx]:
+                for target in ray:
+                    attacks |= 1 << target
+                    if piece_at(target) != Piece.EMPTY:
+                        break
+            return attacks
+
+        if piece in (Piece.WKNIGHT, Piece.BKNIGHT):
+            return KNIGHT_ATTACKS[idx]
+        return KING_ATTACKS[idx]
+
+    def _attack_map(self, color: int) -> int:
+        """Returns the squares attacked by one color (0 is white, 1 is
+        black). Moves keep it up to date along with the attack table, which
+        is only built from every piece when there is none for the current
+        placement, e.g. after set_fen() or release()."""
+        if self._attacks is None or self._attacks_key != self._chess_board.zobrist_key:
+            self._attack_table()
+        return self._attack_maps[color]
+
+    def _attack_table(self) -> array:
+        # The squares attacked from each square, rebuilt with the attacker
+        # counts and attack maps unless it is for the current placement
+        board = self._chess_board
+        if self._attacks is None or self._attacks_key != board.zobrist_key:
+            attacks = array('Q', bytes(8 * 64))
+            counts = bytearray(128)
+            attack_maps = [0, 0]
+            for color in (0, 1):
+                base = color << 6
+                for idx, piece in board.indexed_pieces(color == 0):
+                    mask = attacks[idx] = self.piece_attacks(idx, piece)
+                    attack_maps[color] |= mask
+                    for target in iter_bits(mask):
+                        counts[base + target] += 1
+            self._attacks = attacks
+            self._attack_counts = counts
+            self._attack_maps = attack_maps
+            self._attacks_key = board.zobrist_key
+        return self._attacks
+
+    def _set_attacks(self, idx: int, mask: int, color: int, old_color: int) -> None:
+        # Replaces the attack table entry of a square, whose piece is of
+        # color and was of old_color (either is moot for an empty square),
+        # and updates the attacker counts and the attack maps from the
+        # squares that left and joined the entry
+        attacks = self._attacks
+        old_mask = attacks[idx]
+        attacks[idx] = mask
+        if color == old_color:
+            old_mask, mask = old_mask & ~mask, mask & ~old_mask
+        counts = self._attack_counts
+        attack_maps = self._attack_maps
+        if old_mask:
+            base = old_color << 6
+            attack_map = attack_maps[old_color]
+            for target in iter_bits(old_mask):
+                counts[base + target] -= 1
+                if not counts[base + target]:
+                    attack_map ^= 1 << target
+            attack_maps[old_color] = attack_map
+        if mask:
+            base = color << 6
+            for target in iter_bits(mask):
+                counts[base + target] += 1
+            attack_maps[color] |= mask
+
+    def _update_attacks(self, old_key: int, before: list, saved: list = None) -> None:
+        """Brings the attack table up to date after some squares got new
+        pieces (or none), the placement having had zobrist key old_key
+        before. before lists each such square with the piece it held, as
+        (square, piece) pairs. Only those squares and the sliders that
+        attacked one of them are looked at again: a slider only sees
+        further or less far when a square it reached changes. Walking out
+        from each changed square to the first piece in every direction
+        finds those sliders. A table that was not for old_key is dropped
+        instead.
+
+        The entries replaced are appended to saved, if given, as (square,
+        attacks, color) triples for pop() to put back."""
+        attacks = self._attacks
+        if attacks is None:
+            return
+        if self._attacks_key != old_key:
+            self._attacks = self._attack_counts = self._attack_maps = None
+            return
+
+        piece_at = self._chess_board.piece_at_index
+        changed = 0
+        for idx, _ in before:
+            changed |= 1 << idx
+        sliders = 0
+        for idx, _ in before:
+            for ray in QUEEN_RAYS[idx]:
+                for target in ray:
+                    if piece_at(target) != Piece.EMPTY:
+                        # A changed square is looked at again anyway, and
+                        # so is what it now hides (see its own walk)
+                        if (attacks[target] >> idx) & 1 and not (changed >> target) & 1:
+                            sliders |= 1 << target
                         break
 
-                    piece = self._chess_board.board[n][l]
-
-                    # If enemy piece, then see if it's threatening
-                    if piece in self._white and piece != Piece.EMPTY:
-                        piece_pos = self._chess_board.pack_move_string(n, l)
-                        
-                        # Check if valid move
-                        move_cons = self._piece_fn_map[piece](piece_pos, tile)
-                        
-                        if len(move_cons) != 0:
-                            captures  = list(filter(lambda item: item[0] is not None 
-                                                            and item[1] is None, move_cons))
-
-                            movements = list(filter(lambda item: item[0] is not None 
-                                                            and item[1] is not None, move_cons))
-
-                            promotions = list(filter(lambda item: item[0] is None 
-                                                            and item[1] is not None, move_cons))
-
-                            check = list(filter(lambda item: item[0] is None 
-                                                            and item[1] is None, move_cons))
-                           
-                            if len(captures) == 0 and len(movements) == 1:
-                                mv_n, mv_l = self._chess_board.unpack_move_string(movements[0][0])
-                                
-                                # Check for special case of pawn moving forward 
-                                # without capturing 
-                                if self._chess_board.board[mv_n][mv_l] != Piece.WPAWN:
-                                    threatened = True
-
-                            elif len(movements) == 1:
-                                threatened = True
-
-        # Now we know!
-        return threatened
+        for idx, old_piece in before:
+            old_color = 0 if old_piece in WHITE_PIECES else 1
+            if saved is not None:
+                saved.append((idx, attacks[idx], old_color))
+            piece = piece_at(idx)
+            mask = 0 if piece == Piece.EMPTY else self.piece_attacks(idx, piece)
+            self._set_attacks(idx, mask, 0 if piece in WHITE_PIECES else 1, old_color)
+        for idx in iter_bits(sliders):
+            piece = piece_at(idx)
+            mask = self.piece_attacks(idx, piece)
+            if mask != attacks[idx]:
+                color = 0 if piece in WHITE_PIECES else 1
+                if saved is not None:
+                    saved.append((idx, attacks[idx], color))
+                self._set_attacks(idx, mask, color, color)
+
+        self._attacks_key = self._chess_board.zobrist_key
 
     def diag_is_obstructed(self, p1n: str, p1l: str, p2n: str, p2l: str) -> bool:
-        p1num, p2num, = ord(p1n), ord(p2n)
-        p1char, p2char = ord(p1l), ord(p2l)
-
-        row_diff = p2num - p1num
-
-        obstructed = False
-
-        start_col = min(p1char, p2char)
-        start_row = p1num if start_col == p1char else p2num
-        stop_row = p2num if start_row == p1num else p1num
-
-        row_pos = stop_row - start_row > 0
-        for i in range(1,abs(row_diff)):
-            if row_pos:
-                row_key = chr(start_row + i)
-                col_key = chr(start_col + i)
-                in_bounds  = row_key in self._chess_board.rows
-                in_bounds &= col_key in self._chess_board.cols
-                if in_bounds and self._chess_board.board[row_key][col_key] != Piece.EMPTY:
-                    obstructed = True
-            else:
-                row_key = chr(start_row - i)
-                col_key = chr(start_col + i)
-                in_bounds  = row_key in self._chess_board.rows
-                in_bounds &= col_key in self._chess_board.cols
-                if in_bounds and self._chess_board.board[row_key][col_key] != Piece.EMPTY:
-                    obstructed = True
+        between = DIAGONAL_BETWEEN[SQUARE_INDEX[p1l + p1n] << 6 | SQUARE_INDEX[p2l + p2n]]
+        return between is not None and self._path_is_obstructed(between)
 
-        return obstructed
-
-    def en_passant(self, dest_pos: str) -> bool:
+    def en_passant(self, dest_pos: str) -> str:
         """Checks for en passant.
 
         Args:
             dest_pos (str): The destination position of the capturing piece
 
         Returns:
-            bool: True if en passant is valid and piece can be captured
+            str: Position of the pawn captured en passant, or None if the
+                move can't capture en passant
         """
-        en_passant_valid = False
-        captured_piece = None
-        p2num, p2letter = self._chess_board.unpack_move_string(dest_pos)
-        move_detector = lambda item: item[0] is not None and item[1] is not None
-
-        if self._white_turn:
-            last_black_moves = list(filter(move_detector, self._last_black_move))
-            if len(last_black_moves) == 1:
-                last_black_move = last_black_moves[0]
-                lb1num, lb1letter = self._chess_board.unpack_move_string(last_black_move[0])
-                lb2num, lb2letter = self._chess_board.unpack_move_string(last_black_move[1])
-                lb_piece = self._chess_board.board[lb2num][lb2letter]
-                lb_same_col = lb1letter == lb2letter
-                num_fwd = abs(ord(lb2num) - ord(lb1num))
-                
-                # Based on last move, could be eligible for en passant
-                if num_fwd == 2 and lb_same_col and lb_piece == Piece.BPAWN:
-                    en_passant_valid = ord(lb2num) == ord(p2num) - 1
-                    en_passant_valid &= ord(lb2letter) == ord(p2letter)
-                    if en_passant_valid:
-                        captured_piece = self._chess_board.pack_move_string(lb2num, lb2letter)
-        else:
-            last_white_moves = list(filter(move_detector, self._last_white_move))
-            if len(last_white_moves) == 1:
-                last_white_move = last_white_moves[0]
-                lw1num, lw1letter = self._chess_board.unpack_move_string(last_white_move[0])
-                lw2num, lw2letter = self._chess_board.unpack_move_string(last_white_move[1])
-                lw_piece = self._chess_board.board[lw2num][lw2letter]
-                lw_same_col = lw1letter == lw2letter
-                num_fwd = abs(ord(lw2num) - ord(lw1num))
-
-                # Based on last move, could be eligible for en passant
-                if num_fwd == 2 and lw_same_col and lw_piece == Piece.WPAWN:
-                    en_passant_valid = ord(lw2num) == ord(p2num) + 1
-                    en_passant_valid &= ord(lw2letter) == ord(p2letter)
-                    if en_passant_valid:
-                        captured_piece = self._chess_board.pack_move_string(lw2num, lw2letter)
-
-        return captured_piece
+        target = self._en_passant_target(self._white_turn)
+        if target is None or SQUARE_INDEX[dest_pos] != target:
+            return None
+        return SQUARES[target - 8 if self._white_turn else target + 8]
+
+    def _en_passant_target(self, white_turn: bool) -> Optional[int]:
+        # The square the other side's pawn just skipped with a double
+        # step, which is where a capturing pawn lands
+        last_move = self._last_black_move if white_turn else self._last_white_move
+        if last_move is None or not last_move & moves.DOUBLE_STEP:
+            return None
+
+        src, dest = moves.source(last_move), moves.destination(last_move)
+        pawn = Piece.BPAWN if white_turn else Piece.WPAWN
+        if self._chess_board.piece_at_index(dest) != pawn:
+            return None
+        return (src + dest) >> 1
+
+    def king_lines(self, white: bool) -> Tuple[int, int, dict, dict]:
+        """Finds the pieces checking one side's king and the pieces standing
+        on lines to it. Computed once per piece placement.
 
-    def jeopardizes_other_king(self, consequences: List[Tuple[str, str]]) -> bool:
-        initial_consequences = copy.deepcopy(consequences)
-        jeopardizes_king = False
-        movements = filter(lambda item: item[0] is not None and item[1] is not None, consequences)
-        movements = list(movements)
-
-        # Execute moves (Note, these should be validated first)
-        for movement in movements:
-            self.make_move(movement[0], movement[1])
-
-        # Make checks
-        rows = self._chess_board.rows
-        cols = self._chess_board.cols
-        for num in rows:
-            for letter in cols:
-                piece = self._chess_board.board[num][letter]
-                if piece != Piece.EMPTY:
-                    black_turn = not self._white_turn
-                    if black_turn:
-                        if piece not in self._white:
-                            aggressor_pos = self._chess_board.pack_move_string(num, letter)
-                            conseqs = self._piece_fn_map[piece](aggressor_pos, self._white_king_pos)
-                            
-                            captures = filter(lambda item: item[0] is not None and item[1] is None, conseqs)
-                            captures = list(captures)
-                            if len(captures) > 0:
-                                jeopardizes_king = True
+        Args:
+            white (bool): True for the white king
+
+        Returns:
+            (int, int, dict, dict): A bitmask of the checking pieces; a
+                bitmask of the squares a move other than the king's can go
+                to in order to answer a single check (the checker, and the
+                squares between it and the king); the king's pinned pieces,
+                mapping each square index to a bitmask of the squares it
+                may move to; and the opponent's pieces that shield the king
+                from the opponent's own sliders, mapping each square index
+                to the squares it may move to without discovering check
+        """
+        board_key = self._chess_board.zobrist_key
+        if self._lines is None or self._lines_key != board_key:
+            self._lines_key = board_key
+            self._lines = [None, None]
+
+        color = 0 if white else 1
+        lines = self._lines[color]
+        if lines is None:
+            lines = self._lines[color] = self._find_king_lines(white)
+        return lines
+
+    def _find_king_lines(self, white: bool) -> Tuple[int, int, dict, dict]:
+        piece_at = self._chess_board.piece_at_index
+        king = self._white_king if white else self._black_king
+        enemy = 1 if white else 0
+
+        checkers = evasions = 0
+        pinned, shields = {}, {}
+
+        # Walk out from the king: a first piece that is an enemy slider of
+        # the ray's kind gives check, otherwise it is pinned (ours) or a
+        # shield (theirs) if the second piece is one
+        for direction, ray in enumerate(QUEEN_RAYS[king]):
+            sliders = _STRAIGHT_SLIDERS[enemy] if direction < 4 else _DIAGONAL_SLIDERS[enemy]
+            path = 0
+            blocker = None
+            for idx in ray:
+                path |= 1 << idx
+                piece = piece_at(idx)
+                if piece == Piece.EMPTY:
+                    continue
+                if blocker is None:
+                    if piece in sliders:
+                        checkers |= 1 << idx
+                        evasions |= path
+                        break
+                    blocker = (idx, piece)
+                    continue
+                if piece in sliders:
+                    blocker_idx, blocker_piece = blocker
+                    if (blocker_piece in self._white) == white:
+                        pinned[blocker_idx] = path
                     else:
-                        if piece in self._white:
-                            aggressor_pos = self._chess_board.pack_move_string(num, letter)
-                            conseqs = self._piece_fn_map[piece](aggressor_pos, self._black_king_pos)
-
-                            captures = filter(lambda item: item[0] is not None and item[1] is None, conseqs)
-                            captures = list(captures)
-                            if len(captures) > 0:
-                                jeopardizes_king = True
-
-        # Undo moves
-        for movement in movements:
-            self.make_move(movement[1], movement[0])
-        assert consequences == initial_consequences
+                        shields[blocker_idx] = path
+                break
+
+        knight = Piece.BKNIGHT if white else Piece.WKNIGHT
+        for idx in KNIGHT_TARGETS[king]:
+            if piece_at(idx) == knight:
+                checkers |= 1 << idx
+                evasions |= 1 << idx
+
+        # A pawn checks from the squares our own pawn would attack
+        pawn = Piece.BPAWN if white else Piece.WPAWN
+        for idx in iter_bits(PAWN_ATTACKS[0 if white else 1][king]):
+            if piece_at(idx) == pawn:
+                checkers |= 1 << idx
+                evasions |= 1 << idx
+
+        return checkers, evasions, pinned, shields
+
+    def _keeps_king_safe(self, p1: str, p2: str, consequences: List[Tuple[str, str]], white_turn: bool) -> bool:
+        """Checks that a move the piece handlers accept doesn't leave our
+        king attacked, from the attack maps and king_lines() rather than
+        by playing it."""
+        movements = 0
+        for item in consequences:
+            if item[0] is not None:
+                if item[1] is not None:
+                    movements += 1
+                elif item[0] != p2:
+                    # En passant can also uncover a check along the rank of
+                    # both pawns, so it is played out
+                    return not self.jeopardizes_our_king(consequences)
+
+        # castling_consequences() already made sure that no square the king
+        # crosses is attacked
+        if movements > 1:
+            return True
+
+        src, dest = SQUARE_INDEX[p1], SQUARE_INDEX[p2]
+        checkers, evasions, pinned, _ = self.king_lines(white_turn)
+
+        if src == (self._white_king if white_turn else self._black_king):
+            enemy = 1 if white_turn else 0
+            if (self._attack_map(enemy) >> dest) & 1:
+                return False
+            return not self._behind_king(src, dest, checkers)
+
+        if checkers:
+            # Only the king can answer a double check
+            if checkers & (checkers - 1) or not (evasions >> dest) & 1:
+                return False
+
+        pin = pinned.get(src)
+        return pin is None or (pin >> dest) & 1 == 1
+
+    def _behind_king(self, king: int, dest: int, checkers: int) -> bool:
+        # The attack maps stop at the king, so a slider checking it also
+        # covers the squares behind it
+        piece_at = self._chess_board.piece_at_index
+        for checker in iter_bits(checkers):
+            if piece_at(checker) not in _SLIDER_RAYS:
+                continue
+            line = between(checker, dest)
+            if line is not None and king in line:
+                return True
+        return False
+
+    def _gives_check(self, p1: str, p2: str, src_piece: Piece, consequences: List[Tuple[str, str]], white_turn: bool) -> bool:
+        """Checks whether a legal move checks the other king, directly or
+        by uncovering one of our sliders. Promotions are never flagged:
+        whether they check depends on the piece, which is chosen later."""
+        for item in consequences:
+            if item[0] is None:
+                if item[1] is not None:
+                    return False
+            elif item[1] is None and item[0] != p2 or item[1] is not None and item[0] != p1:
+                # Castling and en passant are rare enough to be played out
+                return self.jeopardizes_other_king(consequences)
+
+        src, dest = SQUARE_INDEX[p1], SQUARE_INDEX[p2]
+        other_king = self._black_king if white_turn else self._white_king
+
+        # Discovered check
+        _, _, _, shields = self.king_lines(not white_turn)
+        shield = shields.get(src)
+        if shield is not None and not (shield >> dest) & 1:
+            return True
+
+        # Direct check from the destination, p1 being empty by then
+        if src_piece in (Piece.WKNIGHT, Piece.BKNIGHT):
+            return (KNIGHT_ATTACKS[dest] >> other_king) & 1 == 1
+        if src_piece in (Piece.WPAWN, Piece.BPAWN):
+            return (PAWN_ATTACKS[0 if white_turn else 1][dest] >> other_king) & 1 == 1
+
+        color = 0 if white_turn else 1
+        key = dest << 6 | other_king
+        line = None
+        if src_piece in _STRAIGHT_SLIDERS[color]:
+            line = STRAIGHT_BETWEEN[key]
+        if line is None and src_piece in _DIAGONAL_SLIDERS[color]:
+            line = DIAGONAL_BETWEEN[key]
+        if line is None:
+            return False
+
+        piece_at = self._chess_board.piece_at_index
+        for idx in line:
+            if idx != src and piece_at(idx) != Piece.EMPTY:
+                return False
+        return True
+
+    def jeopardizes_other_king(self, consequences: List[Tuple[str, str]]) -> bool:
+        # Play the move for the side in self._white_turn (Note, it should be 
+        # validated first), then see whether it attacks the other king
+        white_turn = self._white_turn
+        self.push_consequences(consequences)
+        other_king = self._black_king if white_turn else self._white_king
+        jeopardizes_king = self.square_is_attacked(SQUARES[other_king], white_turn)
+        self.pop()
         return jeopardizes_king
 
     def jeopardizes_our_king(self, consequences: List[Tuple[str, str]]) -> bool:
-        initial_consequences = copy.deepcopy(consequences)
-        jeopardizes_king = False
-        movements = filter(lambda item: item[0] is not None and item[1] is not None, consequences)
-        movements = list(movements)
-
-        # Execute moves (Note, these should be validated first)
-        king_pos = None
-        for movement in movements:
-            src_piece = self._chess_board.piece_at(movement[0])
-            if self._white_turn:
-                if src_piece == Piece.WKING:
-                    king_pos = movement[1]
-            else:
-                if src_piece == Piece.BKING:
-                    king_pos = movement[1]
-            
-            self.make_move(movement[0], movement[1])
-
-        if king_pos is None:
-            if self._white_turn:
-                king_pos = self._white_king_pos
-            else:
-                king_pos = self._black_king_pos
-
-        # Make checks
-        rows = self._chess_board.rows
-        cols = self._chess_board.cols
-        for num in rows:
-            for letter in cols:
-                piece = self._chess_board.board[num][letter]
-                if piece != Piece.EMPTY:
-                    enemy_piece  = self._white_turn and piece not in self._white
-                    enemy_piece |= not self._white_turn and piece in self._white
-
-                    if enemy_piece:
-                        threat_pos = self._chess_board.pack_move_string(num, letter)
-
-                        # Since making enemy move, need to toggle turn
-                        self._white_turn = not self._white_turn
-                        conseqs = self._piece_fn_map[piece](threat_pos, king_pos)
-                        self._white_turn = not self._white_turn
-
-                        captures = filter(lambda item: item[0] is not None and item[1] is None, conseqs)
-                        captures = list(captures)
-                        if len(captures) > 0:
-                            jeopardizes_king = True
-
-        # Undo moves
-        for movement in movements:
-            self.make_move(movement[1], movement[0])
-        assert consequences == initial_consequences
+        # Play the move for the side in self._white_turn (Note, it should be 
+        # validated first), then see whether our king is left attacked
+        white_turn = self._white_turn
+        self.push_consequences(consequences)
+        king = self._white_king if white_turn else self._black_king
+        jeopardizes_king = self.square_is_attacked(SQUARES[king], not white_turn)
+        self.pop()
         return jeopardizes_king
 
-    def move_jeopardizes_our_king(self, move: str, white_turn: bool) -> bool:
-        jeopardizes_king = False
-        orig_board_state = copy.deepcopy(self._chess_board.board)
+    def move_jeopardizes_our_king(self, move: Tuple[str, str], white_turn: bool) -> bool:
+        src_piece = self._chess_board.piece_at(move[0])
+
+        wt_before = self._white_turn
+        self._white_turn = white_turn
+        consequences = self._piece_fn_map[src_piece](self, move[0], move[1])
+        jeopardizes_king = self.jeopardizes_our_king(consequences)
+        self._white_turn = wt_before
 
-        # Have to be a bit clever to keep track of king
+        return jeopardizes_king
+
+    def push(self, move: Tuple[str, str], promotion: Piece = None) -> List[Tuple[str, str]]:
+        """Plays a move, remembering everything needed to take it back.
+
+        Args:
+            move (Tuple[str, str]): Source and destination of the move
+            promotion (Piece): The piece a promoting pawn becomes. Defaults
+                to a queen.
+
+        Returns:
+            List[Tuple[str, str]]: The consequences that were applied
+
+        Raises:
+            ValueError: If the move is not legal
+        """
         src_piece = self._chess_board.piece_at(move[0])
-        if src_piece == Piece.BKING or src_piece == Piece.WKING:
-            king_pos = move[1]
+        white_turn = src_piece in self._white
+        consequences = self.move_implications(move[0], move[1], white_turn)
+        if len(consequences) == 0:
+            raise ValueError(f"Illegal move: {move[0]},{move[1]}")
+
+        self.push_consequences(consequences, promotion)
+        return consequences
+
+    def push_move(self, code: int) -> None:
+        """Plays a move packed as a lib.moves code, remembering everything
+        needed to take it back with pop().
+
+        The code is trusted: it must be one of legal_moves() (or come from
+        move_code()), flags included, since they say how the move is
+        played. Use push() to play a move that still has to be checked.
+
+        Args:
+            code (int): The move to play
+        """
+        board = self._chess_board
+        piece_at = board.piece_at_index
+        has_moved = board.has_moved_index
+        src, dest = code & 0x3F, (code >> 6) & 0x3F
+        piece = piece_at(src)
+        white_turn = piece in WHITE_PIECES
+
+        # Every square the move changes, with what it holds afterwards
+        promotion = moves.promotion_piece(code, white_turn)
+        changes = [(src, Piece.EMPTY), (dest, piece if promotion is None else promotion)]
+        if code & moves.EN_PASSANT:
+            # The captured pawn stands beside the capturing one
+            changes.append(((src & 0x38) | (dest & 7), Piece.EMPTY))
+        elif code & moves.CASTLE:
+            rook_src, rook_dest = _CASTLING_ROOKS[dest]
+            changes.append((rook_src, Piece.EMPTY))
+            changes.append((rook_dest, piece_at(rook_src)))
+
+        # Save every touched square, with its has-moved flag (which also 
+        # encodes castling rights), before anything changes
+        saved_squares = [(idx, piece_at(idx), has_moved(idx)) for idx, _ in changes]
+        # The attack table entries the move replaces, unless there is no
+        # table to update
+        old_key = board.zobrist_key
+        saved_attacks = [] if self._attacks is not None and self._attacks_key == old_key else None
+
+        if self._undo_stack is None:
+            self._undo_stack = []
+        self._undo_stack.append((saved_squares,
+                                 saved_attacks,
+                                 self._last_white_move,
+                                 self._last_black_move,
+                                 self._white_king,
+                                 self._black_king,
+                                 self._white_in_check,
+                                 self._black_in_check,
+                                 self._white_to_move,
+                                 self._castling_rights,
+                                 self._state_key,
+                                 self._halfmove_clock,
+                                 self._fullmove_number))
+
+        # Squares a move leaves or lands on count as moved
+        restore = board.restore_index
+        for idx, new_piece in changes:
+            restore(idx, new_piece, True)
+        self._update_attacks(old_key, [(idx, piece) for idx, piece, _ in saved_squares], saved_attacks)
+
+        if code & moves.CAPTURE or piece in (Piece.WPAWN, Piece.BPAWN):
+            self._halfmove_clock = 0
         else:
-            if white_turn:
-                king_pos = self._white_king_pos
-            else:
-                king_pos = self._black_king_pos
-
-        self.make_hypothetical_move(move[0], move[1])
-
-        # Make checks
-        rows = self._chess_board.rows
-        cols = self._chess_board.cols
-        for num in rows:
-            for letter in cols:
-                piece = self._chess_board.board[num][letter]
-                if piece != Piece.EMPTY:
-                    enemy_piece  = white_turn and piece not in self._white
-                    enemy_piece |= not white_turn and piece in self._white
-
-                    if enemy_piece:
-                        threat_pos = self._chess_board.pack_move_string(num, letter)
-                        wt_before = self._white_turn
-                        self._white_turn = not white_turn
-                        conseqs = self._piece_fn_map[piece](threat_pos, king_pos)
-                        self._white_turn = wt_before
-
-                        captures = filter(lambda item: item[0] is not None and item[1] is None, conseqs)
-                        captures = list(captures)
-                        if len(captures) > 0:
-                            jeopardizes_king = True
-
-        # Undo move
-        self._chess_board.board = orig_board_state
+            self._halfmove_clock += 1
+        if not white_turn:
+            self._fullmove_number += 1
+
+        if piece == Piece.WKING:
+            self._white_king = dest
+        elif piece == Piece.BKING:
+            self._black_king = dest
+
+        # Important to store last move info for en passant. The check
+        # flag comes from king_lines, which generating the reply reuses
+        if white_turn:
+            self._last_white_move = code
+            self._black_in_check = self.king_lines(False)[0] != 0
+        else:
+            self._last_black_move = code
+            self._white_in_check = self.king_lines(True)[0] != 0
 
-        return jeopardizes_king
+        # Castling rights can only change when a king or rook square is touched
+        for idx, _ in changes:
+            if idx in _CASTLING_SQUARES:
+                self._castling_rights = self.castling_rights()
+                break
+
+        en_passant_file = None
+        if code & moves.DOUBLE_STEP:
+            en_passant_file = src & 7
+
+        self._white_to_move = not white_turn
+        self._state_key = zobrist.state_key(self._white_to_move, 
+                                            self._castling_rights, 
+                                            en_passant_file)
+
+    def move_code(self, 
+                  p1: str, 
+                  p2: str, 
+                  consequences: List[Tuple[str, str]], 
+                  promotion: Piece = None) -> int:
+        """Packs a move into a lib.moves code, flagging captures, en 
+        passant, castling and pawn double steps from its consequences.
+        The move must not have been played yet.
+
+        Args:
+            p1 (str): Source position
+            p2 (str): Destination position
+            consequences (List[Tuple[str, str]]): As from move_implications()
+            promotion (Piece): The piece a promoting pawn becomes. Defaults
+                to a queen.
+
+        Returns:
+            int: The move code
+        """
+        src, dest = SQUARE_INDEX[p1], SQUARE_INDEX[p2]
+        src_piece = self._chess_board.piece_at(p1)
+        flags = 0
+        promotes = False
+        for pos1, pos2 in consequences:
+            if pos1 is None:
+                promotes |= pos2 is not None
+            elif pos2 is None:
+                flags |= moves.CAPTURE if pos1 == p2 else moves.CAPTURE | moves.EN_PASSANT
+            elif pos1 != p1:
+                flags |= moves.CASTLE
+
+        if abs(dest - src) == 16 and src_piece in (Piece.WPAWN, Piece.BPAWN):
+            flags |= moves.DOUBLE_STEP
+        if not promotes:
+            promotion = None
+        elif promotion is None:
+            promotion = Piece.WQUEEN if src_piece in self._white else Piece.BQUEEN
+        return moves.encode(src, dest, promotion, flags)
+
+    def push_consequences(self, 
+                          consequences: List[Tuple[str, str]], 
+                          promotion: Piece = None) -> None:
+        """Applies already validated consequences (see move_implications) 
+        and records an undo entry for pop().
+
+        Args:
+            consequences (List[Tuple[str, str]]): The move to apply
+            promotion (Piece): The piece a promoting pawn becomes. Defaults
+                to a queen.
+        """
+        # The first movement is the piece that moves (the king, when 
+        # castling)
+        p1, p2 = next(item for item in consequences if None not in item)
+        self.push_move(self.move_code(p1, p2, consequences, promotion))
+
+    def pop(self) -> None:
+        """Takes back the most recently pushed move, exactly.
+
+        Raises:
+            IndexError: If there is no move to take back
+        """
+        if not self._undo_stack:
+            raise IndexError("No move to take back")
+        (saved_squares,
+         saved_attacks,
+         self._last_white_move,
+         self._last_black_move,
+         self._white_king,
+         self._black_king,
+         self._white_in_check,
+         self._black_in_check,
+         self._white_to_move,
+         self._castling_rights,
+         self._state_key,
+         self._halfmove_clock,
+         self._fullmove_number) = self._undo_stack.pop()
+
+        board = self._chess_board
+        old_key = board.zobrist_key
+        piece_at = board.piece_at_index
+        if saved_attacks is not None and self._attacks is not None and self._attacks_key == old_key:
+            # The move updated the table, so its old entries fit again.
+            # They are put back while the squares still hold what the
+            # move left, whose colors the current entries are of
+            for idx, mask, color in saved_attacks:
+                self._set_attacks(idx, mask, color, 0 if piece_at(idx) in WHITE_PIECES else 1)
+            before = None
+        else:
+            before = [(idx, piece_at(idx)) for idx, _, _ in saved_squares]
+
+        restore = board.restore_index
+        for idx, piece, has_moved in saved_squares:
+            restore(idx, piece, has_moved)
+        if before is None:
+            self._attacks_key = board.zobrist_key
+        else:
+            self._update_attacks(old_key, before)
+
+    def commit(self) -> None:
+        """Makes every move pushed so far permanent: their undo entries are
+        dropped and pop() can no longer take them back.
+
+        A game calls this for each move it applies, so that the undo stack
+        only holds the moves of a search in progress instead of growing
+        with the game. The king lines go too, and are found again once
+        for the next position asked about. The attack table stays, since
+        every move keeps it up to date; see release().
+        """
+        self._undo_stack = None
+        self._lines = self._lines_key = None
+
+    def release(self) -> None:
+        """Drops the attack table, attacker counts and attack maps, about
+        900 bytes that the next threat query builds again from every piece.
+
+        Meant for between searches rather than between moves, e.g. for a
+        game that waits on a person to move: ChessGame calls it before
+        such a turn.
+        """
+        self._attacks = self._attacks_key = None
+        self._attack_counts = self._attack_maps = None
+
+    def iter_legal_moves(self, white_turn: bool) -> Iterator[Tuple[str, str]]:
+        """Generates every legal move for one side by square names, once
+        per move (a promotion is not repeated for every piece). As for
+        iter_move_codes(), the position must be unchanged whenever the
+        generator is resumed.
+
+        Args:
+            white_turn (bool): True to generate white's moves
+
+        Yields:
+            (str, str): The source and destination of a legal move
+        """
+        for code in self.iter_move_codes(white_turn):
+            if not moves.underpromotes(code):
+                yield moves.square_names(code)
+
+    def legal_moves(self, white_turn: bool) -> List[int]:
+        """Lists every legal move for one side as lib.moves codes, one per
+        piece a promoting pawn can become.
+
+        Args:
+            white_turn (bool): True to generate white's moves
+
+        Returns:
+            List[int]: The move codes, flags included, ready for push_move()
+        """
+        return list(self.iter_move_codes(white_turn))
+
+    def iter_move_codes(self, white_turn: bool) -> Iterator[int]:
+        """Generates every legal move for one side as lib.moves codes, one
+        per piece a promoting pawn can become.
+
+        Moves are generated from square indices and bitmasks, and checked
+        against king_lines() and the attack maps rather than played, so
+        this is what search and perft build on. The position must be
+        unchanged whenever the generator is resumed.
+
+        Args:
+            white_turn (bool): True to generate white's moves
+
+        Yields:
+            int: The move codes, flags included, ready for push_move()
+        """
+        board = self._chess_board
+        color = 0 if white_turn else 1
+        ours = theirs = 0
+        own_pieces = []
+        for idx, piece in board.indexed_pieces(white_turn):
+            ours |= 1 << idx
+            own_pieces.append((idx, piece))
+        for idx, _ in board.indexed_pieces(not white_turn):
+            theirs |= 1 << idx
+        occupied = ours | theirs
+
+        checkers, evasions, pinned, _ = self.king_lines(white_turn)
+        king = self._white_king if white_turn else self._black_king
+
+        # Only the king can answer a double check
+        if not checkers & (checkers - 1):
+            allowed = (evasions if checkers else -1) & ~ours
+            pawn = Piece.WPAWN if white_turn else Piece.BPAWN
+            knight = Piece.WKNIGHT if white_turn else Piece.BKNIGHT
+            step = 8 if white_turn else -8
+            start_rank, promotion_rank = (1, 6) if white_turn else (6, 1)
+            pawn_attacks = PAWN_ATTACKS[color]
+            en_passant = self._en_passant_target(white_turn)
+
+            for src, piece in own_pieces:
+                if src == king:
+                    continue
+                mask = allowed
+                pin = pinned.get(src)
+                if pin is not None:
+                    mask &= pin
+
+                if piece == pawn:
+                    codes = []
+                    dest = src + step
+                    if not (occupied >> dest) & 1:
+                        if (mask >> dest) & 1:
+                            codes.append(src | dest << 6)
+                        dest += step
+                        if (src >> 3 == start_rank and not (occupied >> dest) & 1 
+                                and (mask >> dest) & 1 and not board.has_moved_index(src)):
+                            codes.append(src | dest << 6 | moves.DOUBLE_STEP)
+                    for dest in iter_bits(pawn_attacks[src] & theirs & mask):
+                        codes.append(src | dest << 6 | moves.CAPTURE)
+                    if src >> 3 == promotion_rank:
+                        # Every move from the seventh rank promotes
+                        codes = [code | field for code in codes for field in _PROMOTION_FIELDS]
+                    elif en_passant is not None and (pawn_attacks[src] >> en_passant) & 1:
+                        code = src | en_passant << 6 | moves.CAPTURE | moves.EN_PASSANT
+                        if self._en_passant_is_safe(code, white_turn):
+                            codes.append(code)
+                    yield from codes
+
+                elif piece == knight:
+                    for dest in iter_bits(KNIGHT_ATTACKS[src] & mask):
+                        yield src | dest << 6 | (moves.CAPTURE if (theirs >> dest) & 1 else 0)
+
+                else:
+                    for ray in _SLIDER_RAYS[piece][src]:
+                        for dest in ray:
+                            if (mask >> dest) & 1:
+                                yield src | dest << 6 | (moves.CAPTURE if (theirs >> dest) & 1 else 0)
+                            if (occupied >> dest) & 1:
+                                break
+
+        enemy_attacks = self._attack_map(1 - color)
+        for dest in iter_bits(KING_ATTACKS[king] & ~ours & ~enemy_attacks):
+            if not checkers or not self._behind_king(king, dest, checkers):
+                yield king | dest << 6 | (moves.CAPTURE if (theirs >> dest) & 1 else 0)
+
+        # Castling needs the king and rook unmoved, nothing between them,
+        # and no attacked square from the king's to its destination
+        if not checkers and not board.has_moved_index(king):
+            for king_square, rook_square, _ in _CASTLING_PATHS:
+                if king_square != king or board.has_moved_index(rook_square):
+                    continue
+                dest = king + 2 if rook_square > king else king - 2
+                if BETWEEN_MASKS[king << 6 | rook_square] & occupied:
+                    continue
+                if (BETWEEN_MASKS[king << 6 | dest] | 1 << dest) & enemy_attacks:
+                    continue
+                yield king | dest << 6 | moves.CASTLE
+
+    def _en_passant_is_safe(self, code: int, white_turn: bool) -> bool:
+        # En passant removes two pieces from one rank, which can uncover
+        # a check that king_lines() doesn't see, so it is played out
+        self.push_move(code)
+        safe = self.king_lines(white_turn)[0] == 0
+        self.pop()
+        return safe
+
+    def perft(self, depth: int) -> int:
+        """Counts the leaf nodes of the legal move tree (performance test).
+
+        Each promotion counts once per piece the pawn can become, so the
+        results can be compared with published perft numbers.
+
+        Args:
+            depth (int): Number of plies to search from the current position
+
+        Returns:
+            int: The number of positions reached after exactly depth plies
+        """
+        if depth == 0:
+            return 1
+
+        codes = self.legal_moves(self._white_to_move)
+        if depth == 1:
+            return len(codes)
+
+        nodes = 0
+        for code in codes:
+            self.push_move(code)
+            nodes += self.perft(depth - 1)
+            self.pop()
+        return nodes
+
+    def divide(self, depth: int) -> dict:
+        """Runs perft below each legal root move, for tracking down move 
+        generation bugs.
+
+        Args:
+            depth (int): Total depth, including the root move
+
+        Returns:
+            dict: Leaf node count keyed by move string (e.g. 'e2,e4', or 
+                'e7,e8q' for promotions)
+        """
+        counts = {}
+        for code in self.legal_moves(self._white_to_move):
+            self.push_move(code)
+            counts[moves.to_string(code)] = self.perft(depth - 1)
+            self.pop()
+        return counts
+
+    def has_legal_move(self, white_turn: bool) -> bool:
+        """Checks whether a side has at least one legal move, stopping at
+        the first one found."""
+        return next(self.iter_move_codes(white_turn), None) is not None
+
+    def in_check(self, white_turn: bool) -> bool:
+        """Checks whether a side's king is currently attacked, from the
+        checkers king_lines() finds (which push_move() already has) and
+        the other king.
+
+        Args:
+            white_turn (bool): True to test the white king
+        """
+        if self.king_lines(white_turn)[0]:
+            return True
+        return (KING_ATTACKS[self._white_king] >> self._black_king) & 1 == 1
 
     def checkmate(self, white_turn: bool) -> bool:
         # This should be checked at the beginning of a turn for a player's own king
-        checkmate = True
-        
-        # Iterate over every position to find pieces on our team
-        our_pieces = []
-        for row in self._chess_board.rows:
-            for col in self._chess_board.cols:
-                if white_turn:
-                    if self._chess_board.board[row][col] in self._white:
-                        our_pieces.append((row,col))
-                else:
-                    not_empty = self._chess_board.board[row][col] != Piece.EMPTY
-                    if not_empty and self._chess_board.board[row][col] not in self._white:
-                        our_pieces.append((row,col))  
-
-        # For every piece in our_pieces, build a list of all possible moves
-        possible_moves = []
-        for piece_row, piece_col in our_pieces:
-            for row in self._chess_board.rows:
-                for col in self._chess_board.cols:
-                    piece = self._chess_board.board[piece_row][piece_col]
-                    piece_pos = self._chess_board.pack_move_string(piece_row, piece_col)
-                    hypothetical_move = self._chess_board.pack_move_string(row, col)
-                    
-                    # Check if valid move
-                    wt_before = self._white_turn
-                    self._white_turn = white_turn
-                    move_cons = self._piece_fn_map[piece](piece_pos, hypothetical_move)
-                    self._white_turn = wt_before
-                    move_valid = len(move_cons) > 0
-                    if move_valid:
-                        possible_moves.append((piece_pos, hypothetical_move))
-
-        # For each possible move, check to see if it leaves our king vulnerable
-        for move in possible_moves:
-            # If king is jeopardized in every possible move, then checkmate
-            king_jeopardized  = self.move_jeopardizes_our_king(move, white_turn)
-            if not king_jeopardized:
-                checkmate = False
-
-        return checkmate
+        return not self.has_legal_move(white_turn) and self.in_check(white_turn)
+
+    def stalemate(self, white_turn: bool) -> bool:
+        # A side that is not in check but has no legal move is stalemated
+        return not self.has_legal_move(white_turn) and not self.in_check(white_turn)
 
     def remove_piece(self, pos: str) -> None:
         """Remove piece at specified position from game board.
@@ -865,7 +1279,11 @@ class ChessEngine:
         Args:
             pos (str): Position of piece to be removed
         """
+        old_key = self._chess_board.zobrist_key
+        before = self._squares_before(pos)
         self._chess_board.remove_piece(pos)
+        self._update_attacks(old_key, before)
+        self._clear_move_cache()
 
     def make_move(self, p1: str, p2: str) -> None:
         """Moves a piece in the backend.
@@ -874,7 +1292,11 @@ class ChessEngine:
             p1 (str): Source position
             p2 (str): Destination position
         """
+        old_key = self._chess_board.zobrist_key
+        before = self._squares_before(p1, p2)
         self._chess_board.move_piece(p1, p2)
+        self._update_attacks(old_key, before)
+        self._clear_move_cache()
 
     def make_hypothetical_move(self, p1: str, p2: str) -> None:
         """Makes a hypothetical piece move in the backend.
@@ -883,7 +1305,10 @@ class ChessEngine:
             p1 (str): Source position
             p2 (str): Destination position
         """
+        old_key = self._chess_board.zobrist_key
+        before = self._squares_before(p1, p2)
         self._chess_board.hypothetical_move_piece(p1, p2)
+        self._update_attacks(old_key, before)
 
     def promote(self, position: str, piece: Piece) -> None:
         """Promotes a piece to a new piece. Classically, for pawns.
@@ -892,90 +1317,429 @@ class ChessEngine:
             position (str): The position of the piece to be promoted
             piece (Piece): The piece that will replace the old piece
         """
+        old_key = self._chess_board.zobrist_key
+        before = self._squares_before(position)
         self._chess_board.promote_piece(position, piece)
+        self._update_attacks(old_key, before)
+
+    def _squares_before(self, *positions: str) -> List[Tuple[int, Piece]]:
+        # The squares a direct change is about to make, with their pieces,
+        # as _update_attacks() takes them
+        piece_at = self._chess_board.piece_at_index
+        return [(SQUARE_INDEX[pos], piece_at(SQUARE_INDEX[pos])) for pos in positions]
+
+    def _clear_move_cache(self) -> None:
+        # The direct mutators above change has-moved flags without going
+        # through push(), so the position key may not reflect the new
+        # castling rights
+        if self._move_cache is not None:
+            self._move_cache.clear()
+
+    def castling_rights(self) -> int:
+        """Computes the remaining castling rights from the has-moved flags.
+
+        Returns:
+            int: Bitmask of zobrist.WHITE_KINGSIDE, zobrist.WHITE_QUEENSIDE,
+                zobrist.BLACK_KINGSIDE and zobrist.BLACK_QUEENSIDE
+        """
+        rights = 0
+        has_moved = self._chess_board.has_moved_index
+        for king_square, rook_square, right in _CASTLING_PATHS:
+            if not has_moved(king_square) and not has_moved(rook_square):
+                rights |= right
+        return rights
+
+    def set_fen(self, fen: str) -> None:
+        """Replaces the current position with one given in FEN. The undo
+        stack is cleared.
+
+        Castling rights are stored as the has-moved flags of the kings and
+        rooks, and the en passant square as the last move of the side that
+        just moved, as if the game had reached the position by play. A
+        castling right is dropped unless its king and rook are on their
+        starting squares.
+
+        Args:
+            fen (str): The position in Forsyth-Edwards Notation
+
+        Raises:
+            ValueError: If the FEN string is malformed
+        """
+        fields = fen.split()
+        if len(fields) == 4:
+            fields += ['0', '1']
+        if len(fields) != 6:
+            raise ValueError(f"Invalid FEN, expected 6 fields: {fen!r}")
+        placement, side, castling, en_passant, halfmove, fullmove = fields
+
+        ranks = placement.split('/')
+        if len(ranks) != 8 or side not in ('w', 'b'):
+            raise ValueError(f"Invalid FEN: {fen!r}")
+
+        rights = 0
+        if castling != '-':
+            for symbol in castling:
+                right = _CASTLING_SYMBOLS.get(symbol)
+                if right is None:
+                    raise ValueError(f"Invalid FEN castling field: {castling!r}")
+                rights |= right
+
+        squares = [Piece.EMPTY] * 64
+        for rank_idx, rank in zip(range(7, -1, -1), ranks):
+            file_idx = 0
+            for symbol in rank:
+                if symbol.isdigit():
+                    file_idx += int(symbol)
+                elif symbol in FEN_PIECES and file_idx < 8:
+                    squares[rank_idx * 8 + file_idx] = FEN_PIECES[symbol]
+                    file_idx += 1
+                else:
+                    raise ValueError(f"Invalid FEN rank: {rank!r}")
+            if file_idx != 8:
+                raise ValueError(f"Invalid FEN rank: {rank!r}")
+
+        # Pieces count as unmoved only where that matters: pawns that may
+        # still advance two squares, and kings and rooks that may castle
+        unmoved = set()
+        for idx, piece in enumerate(squares):
+            if (piece == Piece.WPAWN and idx >> 3 == 1) or (piece == Piece.BPAWN and idx >> 3 == 6):
+                unmoved.add(idx)
+        for king_square, rook_square, right in _CASTLING_PATHS:
+            # A right is only kept while its king and rook are at home
+            king, rook = (Piece.WKING, Piece.WROOK) if king_square < 8 else (Piece.BKING, Piece.BROOK)
+            if rights & right and squares[king_square] == king and squares[rook_square] == rook:
+                unmoved.update((king_square, rook_square))
+
+        board = self._chess_board
+        white_king = black_king = None
+        for idx, piece in enumerate(squares):
+            board.restore_index(idx, piece, idx not in unmoved)
+            if piece == Piece.WKING:
+                white_king = idx
+            elif piece == Piece.BKING:
+                black_king = idx
+        if white_king is None or black_king is None:
+            raise ValueError(f"Invalid FEN, both kings are required: {fen!r}")
+
+        self._white_king, self._black_king = white_king, black_king
+        self._white_to_move = side == 'w'
+        self._white_turn = None
+        self._undo_stack = None
+
+        # Recreate the double step that makes en passant possible
+        self._last_white_move = None
+        self._last_black_move = None
+        en_passant_file = None
+        if en_passant != '-':
+            if len(en_passant) != 2 or en_passant[0] not in 'abcdefgh' or en_passant[1] not in '36':
+                raise ValueError(f"Invalid FEN en passant square: {en_passant!r}")
+            col = en_passant[0]
+            if en_passant[1] == '3':
+                self._last_white_move = moves.encode(SQUARE_INDEX[col + '2'], SQUARE_INDEX[col + '4'],
+                                                     flags=moves.DOUBLE_STEP)
+            else:
+                self._last_black_move = moves.encode(SQUARE_INDEX[col + '7'], SQUARE_INDEX[col + '5'],
+                                                     flags=moves.DOUBLE_STEP)
+            en_passant_file = ord(col) - ord('a')
+
+        try:
+            self._halfmove_clock = int(halfmove)
+            self._fullmove_number = int(fullmove)
+        except ValueError:
+            raise ValueError(f"Invalid FEN move counters: {fen!r}") from None
+
+        self._white_in_check = self.square_is_attacked(SQUARES[white_king], False)
+        self._black_in_check = self.square_is_attacked(SQUARES[black_king], True)
+        self._castling_rights = self.castling_rights()
+        self._state_key = zobrist.state_key(self._white_to_move,
+                                            self._castling_rights,
+                                            en_passant_file)
+
+    def to_fen(self) -> str:
+        """Describes the current position in Forsyth-Edwards Notation.
+
+        Returns:
+            str: The FEN string
+        """
+        board = self._chess_board
+        ranks = []
+        for rank in '87654321':
+            symbols = ''
+            empty = 0
+            for col in 'abcdefgh':
+                piece = board.piece_at(col + rank)
+                if piece == Piece.EMPTY:
+                    empty += 1
+                    continue
+                if empty:
+                    symbols += str(empty)
+                    empty = 0
+                symbols += FEN_SYMBOLS[piece]
+            if empty:
+                symbols += str(empty)
+            ranks.append(symbols)
+
+        castling = ''.join(symbol for symbol, right in _CASTLING_SYMBOLS.items()
+                           if self._castling_rights & right) or '-'
+
+        return ' '.join(('/'.join(ranks),
+                         'w' if self._white_to_move else 'b',
+                         castling,
+                         self.en_passant_square() or '-',
+                         str(self._halfmove_clock),
+                         str(self._fullmove_number)))
+
+    def en_passant_square(self) -> str:
+        """Returns the square a pawn just skipped with a double step, or
+        None if the last move was not one."""
+        target = self._en_passant_target(self._white_to_move)
+        return None if target is None else SQUARES[target]
+
+    def probe_tablebase(self) -> Tuple[int, int]:
+        """Looks the position up in the endgame tablebases opened with
+        lib.tablebase.load().
+
+        Returns:
+            (int, int): tablebase.WIN, DRAW or LOSS for the side to move,
+                and the number of half moves to mate, or None if no
+                loaded table covers the position
+        """
+        # The tables assume castling is no longer possible
+        if self._castling_rights:
+            return None
+        return tablebase.probe(self._chess_board, self._white_to_move)
+
+    @property
+    def move_cache(self) -> LRUCache:
+        """The cache of move legality results, with its hit and miss
+        counts, or None if disabled."""
+        return self._move_cache
+
+    @property
+    def white_to_move(self) -> bool:
+        return self._white_to_move
+
+    @property
+    def halfmove_clock(self) -> int:
+        return self._halfmove_clock
+
+    @property
+    def fullmove_number(self) -> int:
+        return self._fullmove_number
+
+    @property
+    def position_key(self) -> int:
+        """64-bit Zobrist key of the position, including side to move, 
+        castling rights and en passant. Maintained incrementally."""
+        return self._chess_board.zobrist_key ^ self._state_key
 
     @property
     def game_state(self):
         return self._chess_board
 
+    # Rule handler for each piece, called as handler(engine, p1, p2)
+    _piece_fn_map = {Piece.BPAWN:   pawn_move_implications,
+                     Piece.BROOK:   rook_move_implications, 
+                     Piece.BKNIGHT: knight_move_implications, 
+                     Piece.BBISHOP: bishop_move_implications, 
+                     Piece.BQUEEN:  queen_move_implications, 
+                     Piece.BKING:   king_move_implications, 
+                     Piece.WPAWN:   pawn_move_implications,
+                     Piece.WROOK:   rook_move_implications, 
+                     Piece.WKNIGHT: knight_move_implications, 
+                     Piece.WBISHOP: bishop_move_implications, 
+                     Piece.WQUEEN:  queen_move_implications, 
+                     Piece.WKING:   king_move_implications}
+
+
+class MoveResult(NamedTuple):
+    """What a move did, as returned by ChessGame.apply().
+
+    Attributes:
+        move (Tuple[str, str]): The source and destination squares
+        legal (bool): False if the move was refused, in which case nothing
+            changed and the remaining fields are empty
+        captures (List[Piece]): Pieces the move captured
+        promotion (Piece): The piece a pawn promoted to, or None
+        check (bool): The opponent is in check after the move
+        checkmate (bool): The opponent is checkmated
+        stalemate (bool): The opponent has no legal move but is not in check
+        game_over (bool): The game ended with this move
+    """
+    move: Tuple[str, str]
+    legal: bool
+    captures: List[Piece]
+    promotion: Optional[Piece]
+    check: bool
+    checkmate: bool
+    stalemate: bool
+    game_over: bool
+
 
 class ChessGame:
-    """The actual chess game. A game is comprised of players (policies) and an engine (rules, state)."""
-    def __init__(self, player_1: Type[Player], player_2: Type[Player]) -> None:
+    """The actual chess game. A game is comprised of players (policies) and an engine (rules, state).
+
+    apply() plays moves without any input or output, for scripts and
+    servers; move() is the frontend's turn loop on top of it.
+    """
+    def __init__(self,
+                 player_1: Type[Player],
+                 player_2: Type[Player],
+                 frontend: ChessFE = None,
+                 engine: 'ChessEngine' = None) -> None:
         # Specify players
         self._player_1, self._player_2 = player_1, player_2
 
-        # Initialize the engine... vroom vroom
-        self._backend = ChessEngine()
+        # Initialize the engine... vroom vroom. A prepared engine lets a
+        # game start from any position, such as after an opening.
+        self._backend = engine if engine is not None else ChessEngine(cache_size=_GAME_CACHE_SIZE)
+        for player in (self._player_1, self._player_2):
+            player.attach(self._backend)
 
         # Initialize the frontend
-        self._frontend = ChessFEUnicode(self._backend.game_state)
-        self._frontend.display_state()
-        self._white_turn = True
+        self._frontend = frontend if frontend is not None else ChessFEUnicode()
+        self._frontend.state = self._backend.game_state
+        self._white_turn = self._backend.white_to_move
+        self._game_over = False
+        # The starting board is drawn by the first move(), so that games
+        # only played through apply() print nothing
+        self._displayed = False
 
         # Specify captured pieces
         self._captured_pieces = []
 
-    def move(self) -> None:
-        is_valid = False
+    def is_legal(self, move: Tuple[str, str]) -> bool:
+        """Whether the side to move may play the move."""
+        return len(self._backend.move_implications(move[0], move[1], self._white_turn)) > 0
+
+    def promotes(self, move: Tuple[str, str]) -> bool:
+        """Whether the move is a legal pawn promotion, so that apply()
+        takes a promotion piece."""
+        for p1, p2 in self._backend.move_implications(move[0], move[1], self._white_turn):
+            if p1 is None and p2 is not None:
+                return True
+        return False
+
+    def apply(self, move: Tuple[str, str], promotion: Piece = None) -> MoveResult:
+        """Plays a move for the side to move, without any input or output.
+
+        Args:
+            move (Tuple[str, str]): The source and destination squares,
+                e.g. ('e2', 'e4')
+            promotion (Piece): The piece a promoting pawn becomes. Defaults
+                to a queen; ignored by other moves.
+
+        Returns:
+            MoveResult: What the move did. Illegal moves change nothing and
+                come back with legal set to False.
+
+        Raises:
+            RuntimeError: If the game is already over
+        """
+        if self._game_over:
+            raise RuntimeError("The game is over")
+
+        white = self._white_turn
+        consequences = self._backend.move_implications(move[0], move[1], white)
+        if len(consequences) == 0:
+            return MoveResult(move, False, [], None, False, False, False, False)
+
+        # In chess, there can only ever be one capture in a move,
+        # but this just allows us to be more general...
+        board = self._backend.game_state
+        captures = []
+        promotes = False
+        for p1, p2 in consequences:
+            if p1 is not None and p2 is None:
+                captures.append(board.piece_at(p1))
+            elif p1 is None and p2 is not None:
+                promotes = True
+
+        if not promotes:
+            promotion = None
+        elif promotion is None:
+            promotion = Piece.WQUEEN if white else Piece.BQUEEN
+
+        # Castling and en passant are applied as a single move
+        self._backend.push_consequences(consequences, promotion)
+        self._captured_pieces.extend(captures)
+        self._white_turn = not white
+
+        # Both end conditions need the side to move to have no legal
+        # move, so only look for one once
+        check = self._backend.in_check(self._white_turn)
+        game_over = not self._backend.has_legal_move(self._white_turn)
+        self._game_over = game_over
+        # Played moves are final, so their undo entries are not kept, and
+        # neither is what the checks above derived from the position
+        self._backend.commit()
+        # A person takes a while to move, so the attack table is not kept
+        # waiting; a computer's search goes on with it instead
+        if not game_over and (self._player_1 if self._white_turn else self._player_2).is_human:
+            self._backend.release()
+        return MoveResult(move, True, captures, promotion, check,
+                          check and game_over, game_over and not check, game_over)
+
+    def move(self) -> Tuple[bool, bool, bool, bool]:
+        """Plays one turn through the frontend: asks the player for a move
+        until a legal one comes, then applies and displays it.
+
+        Returns:
+            (bool, bool, bool, bool): Whether the move checkmated, whose
+                turn it is (the winner's after checkmate or a concession),
+                whether the game ended otherwise (quit or stalemate), and
+                whether the player conceded
+        """
+        player = self._player_1 if self._white_turn else self._player_2
+        if not self._displayed:
+            self._frontend.display_state()
+            self._displayed = True
+
+        while True:
+            pos1, pos2, is_valid_input, end_game, concede = self._frontend.player_turn(self._white_turn, player)
 
-        while not is_valid:
-            pos1, pos2, is_valid_input, end_game, concede = self._frontend.player_turn(self._white_turn)
-            
             if end_game or concede:
+                if concede:
+                    self._white_turn = not self._white_turn
+                return False, self._white_turn, end_game, concede
+
+            if is_valid_input and self.is_legal((pos1, pos2)):
                 break
 
-            if is_valid_input:
-                consequences = self._backend.move_implications(pos1, pos2, self._white_turn)
+            # The board is unchanged, so there is nothing to redraw
+            self._frontend.notify_invalid_move()
 
-                # If the number of consequences is nonzero, then valid move.
-                is_valid = len(consequences) != 0
+        updated_piece = None
+        if self.promotes((pos1, pos2)):
+            updated_piece = player.specify_promotion(self._white_turn)
+            if updated_piece is None:
+                updated_piece = self._frontend.promotion(self._white_turn)
 
-            if not is_valid_input or not is_valid:
-                self._frontend.display_state()
-                print("Move invalid, please try again\n")
-        
-        if not end_game and not concede:
-            if is_valid:
-                # In chess, there can only ever be one capture in a move, 
-                # but this just allows us to be more general...
-                captures  = filter(lambda item: item[0] is not None and item[1] is None, consequences)
-                movements = filter(lambda item: item[0] is not None and item[1] is not None, consequences)
-                promotions = filter(lambda item: item[0] is None and item[1] is not None, consequences)
-                check = list(filter(lambda item: item[0] is None and item[1] is None, consequences))
-                in_check = len(check) > 0
-
-                # We apply captures before making moves.
-                for capture in captures:
-                    col, row = list(capture[0])
-                    self._captured_pieces.append(self._backend.game_state.board[row][col])
-                    self._backend.remove_piece(capture[0])
-
-                # Update internal state after command is verified. Note that 
-                # when castling is applied, multiple moves are required in a 
-                # single turn.
-                for positions in movements:
-                    self._backend.make_move(positions[0], positions[1])
-
-                for promotion in promotions:
-                    updated_piece = self._frontend.promotion(self._white_turn)
-                    self._backend.promote(promotion[1], updated_piece)
-
-                if in_check:
-                    self._frontend.notify_check(self._white_turn)
-
-                self._frontend.display_state()
+        result = self.apply((pos1, pos2), updated_piece)
+        if result.check:
+            self._frontend.notify_check(not self._white_turn)
+        self._frontend.display_state()
 
+        if result.checkmate:
+            # The winner's turn is reported
             self._white_turn = not self._white_turn
+        elif result.stalemate:
+            self._frontend.notify_stalemate()
+        return result.checkmate, self._white_turn, result.stalemate, False
 
-            checkmate = self._backend.checkmate(self._white_turn)
+    @property
+    def white_to_move(self) -> bool:
+        return self._white_turn
 
-            if checkmate:
-                self._white_turn = not self._white_turn
-        
-        else:
-            checkmate = False
-            if concede:
-                self._white_turn = not self._white_turn
+    @property
+    def game_over(self) -> bool:
+        """True once a move has checkmated or stalemated."""
+        return self._game_over
 
-        return checkmate, self._white_turn, end_game, concede
+    @property
+    def engine(self) -> 'ChessEngine':
+        return self._backend
+
+    @property
+    def captured_pieces(self) -> List[Piece]:
+        return self._captured_pieces
@@ -0,0 +1,191 @@
+from lib.bitboard import BoardView, SQUARE_INDEX, SQUARES
+from lib.pieces import Piece, PIECE_CODES, CODE_PIECES, BLACK, TYPE_MASK
+from lib.zobrist import PIECE_SQUARE_KEYS, board_key
+from typing import Iterator, Tuple
+
+# Board bytes hold a piece code in the low nibble. UNMOVED is set on a
+# square while the piece that started there has not left it.
+PIECE_MASK = BLACK | TYPE_MASK
+UNMOVED = 0x10
+
+_INITIAL_SQUARES = bytes(
+    [PIECE_CODES[p] | UNMOVED for p in (
+        Piece.WROOK, Piece.WKNIGHT, Piece.WBISHOP, Piece.WQUEEN,
+        Piece.WKING, Piece.WBISHOP, Piece.WKNIGHT, Piece.WROOK)]
+    + [PIECE_CODES[Piece.WPAWN] | UNMOVED] * 8
+    + [0] * 32
+    + [PIECE_CODES[Piece.BPAWN] | UNMOVED] * 8
+    + [PIECE_CODES[p] | UNMOVED for p in (
+        Piece.BROOK, Piece.BKNIGHT, Piece.BBISHOP, Piece.BQUEEN,
+        Piece.BKING, Piece.BBISHOP, Piece.BKNIGHT, Piece.BROOK)])
+
+
+class CompactBoard:
+    """Holds game state in a single 64-byte bytearray.
+
+    Each byte is one square (a1 = 0, h8 = 63) holding an integer piece
+    code from lib.pieces, with the color and type packed as bitfields.
+    Exposes the same interface as ChessBoard, e.g.
+    ``ChessEngine(CompactBoard())``. Such an engine keeps under 512 bytes
+    per game between moves, about 200 of them the board (see the budget
+    in tests/test_boards.py).
+    """
+    __slots__ = ('_squares', '_zobrist')
+
+    _rows = ('1', '2', '3', '4', '5', '6', '7', '8')
+    _cols = ('a', 'b', 'c', 'd', 'e', 'f', 'g', 'h')
+
+    def __init__(self):
+        self._squares = self.initialize_board()
+        self._zobrist = board_key(self)
+
+    @property
+    def board(self) -> BoardView:
+        return BoardView(self)
+
+    @board.setter
+    def board(self, new_board) -> None:
+        # Has-moved flags are left as they are, as for ChessBoard
+        for row in self._rows:
+            for col in self._cols:
+                self.set_piece(col + row, new_board[row][col])
+
+    @property
+    def rows(self):
+        return self._rows
+
+    @property
+    def cols(self):
+        return self._cols
+
+    @property
+    def zobrist_key(self) -> int:
+        """Zobrist hash of the piece placement, kept up to date on every change."""
+        return self._zobrist
+
+    @property
+    def squares(self) -> bytearray:
+        """The raw 64-byte square array."""
+        return self._squares
+
+    def initialize_board(self) -> bytearray:
+        """Initializes chess board.
+
+        Returns:
+            bytearray: The initialized chessboard representation
+        """
+        return bytearray(_INITIAL_SQUARES)
+
+    def move_piece(self, pos1: str, pos2: str) -> None:
+        """Change the board's state as specified.
+
+        Args:
+            pos1 (str): Position of piece to be moved
+            pos2 (str): Destination of piece to be moved
+        """
+        self.hypothetical_move_piece(pos1, pos2)
+        self._squares[SQUARE_INDEX[pos1]] = 0
+
+    def hypothetical_move_piece(self, pos1: str, pos2: str) -> None:
+        """Change the board's state without touching has-moved flags.
+
+        Args:
+            pos1 (str): Position of piece to be moved
+            pos2 (str): Destination of piece to be moved
+        """
+        squares = self._squares
+        idx1 = SQUARE_INDEX[pos1]
+        idx2 = SQUARE_INDEX[pos2]
+        moving = CODE_PIECES[squares[idx1] & PIECE_MASK]
+        self._rekey(idx1, Piece.EMPTY)
+        self._rekey(idx2, moving)
+        squares[idx2] = (squares[idx2] & UNMOVED) | (squares[idx1] & PIECE_MASK)
+        squares[idx1] &= UNMOVED
+
+    def remove_piece(self, pos: str) -> None:
+        """Removes a piece from the game board.
+
+        Args:
+            pos (str): The position of the piece to be removed
+        """
+        idx = SQUARE_INDEX[pos]
+        self._rekey(idx, Piece.EMPTY)
+        self._squares[idx] = 0
+
+    def promote_piece(self, pos: str, piece: Piece) -> None:
+        """Promotes a piece to a new piece. Classically, for pawns.
+
+        Args:
+            pos (str): The position of the piece to be promoted
+            piece (Piece): The piece that will replace the old piece
+        """
+        self.set_piece(pos, piece)
+
+    def set_piece(self, pos: str, piece: Piece) -> None:
+        """Places piece on pos, replacing whatever was there."""
+        idx = SQUARE_INDEX[pos]
+        self._rekey(idx, piece)
+        self._squares[idx] = (self._squares[idx] & UNMOVED) | PIECE_CODES[piece]
+
+    def restore_square(self, pos: str, piece: Piece, has_moved: bool) -> None:
+        """Sets both the piece and the has-moved flag of a square. Meant 
+        for undoing moves exactly.
+        """
+        self.restore_index(SQUARE_INDEX[pos], piece, has_moved)
+
+    def restore_index(self, idx: int, piece: Piece, has_moved: bool) -> None:
+        """Like restore_square, for a 0-63 square index."""
+        self._rekey(idx, piece)
+        self._squares[idx] = PIECE_CODES[piece] | (0 if has_moved else UNMOVED)
+
+    def has_moved(self, pos: str) -> bool:
+        """Checks if the piece at some position is in its initial state.
+
+        Args:
+            pos (str): The position of the piece
+
+        Returns:
+            True if the piece has moved from it's initial position
+        """
+        return not self._squares[SQUARE_INDEX[pos]] & UNMOVED
+
+    def has_moved_index(self, idx: int) -> bool:
+        """Like has_moved, for a 0-63 square index."""
+        return not self._squares[idx] & UNMOVED
+
+    def piece_at(self, pos: str) -> Piece:
+        return CODE_PIECES[self._squares[SQUARE_INDEX[pos]] & PIECE_MASK]
+
+    def piece_at_index(self, idx: int) -> Piece:
+        """Like piece_at, for a 0-63 square index."""
+        return CODE_PIECES[self._squares[idx] & PIECE_MASK]
+
+    def code_at(self, pos: str) -> int:
+        """Returns the integer piece code at pos."""
+        return self._squares[SQUARE_INDEX[pos]] & PIECE_MASK
+
+    def pieces(self, white: bool) -> Iterator[Tuple[str, Piece]]:
+        """Yields (position, piece) for every piece of one color."""
+        color = 0 if white else BLACK
+        for idx, value in enumerate(self._squares):
+            if value & TYPE_MASK and value & BLACK == color:
+                yield SQUARES[idx], CODE_PIECES[value & PIECE_MASK]
+
+    def indexed_pieces(self, white: bool) -> Iterator[Tuple[int, Piece]]:
+        """Like pieces, with 0-63 square indices instead of positions."""
+        color = 0 if white else BLACK
+        for idx, value in enumerate(self._squares):
+            if value & TYPE_MASK and value & BLACK == color:
+                yield idx, CODE_PIECES[value & PIECE_MASK]
+
+    def _rekey(self, idx: int, piece: Piece) -> None:
+        # Swap the key of the piece currently on idx for the key of piece
+        old_piece = CODE_PIECES[self._squares[idx] & PIECE_MASK]
+        self._zobrist ^= PIECE_SQUARE_KEYS[old_piece.value][idx]
+        self._zobrist ^= PIECE_SQUARE_KEYS[piece.value][idx]
+
+    def unpack_move_string(self, pos: str) -> Tuple[str, str]:
+        return pos[1], pos[0]
+
+    def pack_move_string(self, r_idx: str, c_idx: str) -> str:
+        return ''.join((c_idx, r_idx))
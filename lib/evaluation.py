@@ -0,0 +1,270 @@
+from lib.pieces import (Piece, BLACK_PIECES, PIECE_CODES, TYPE_MASK,
+                        PAWN, ROOK, KNIGHT, BISHOP, QUEEN, KING)
+from lib.bitboard import SQUARE_INDEX
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # Only the batch evaluation API needs numpy
+    np = None
+
+# Material values in centipawns
+PAWN_VALUE, KNIGHT_VALUE, BISHOP_VALUE = 100, 320, 330
+ROOK_VALUE, QUEEN_VALUE, KING_VALUE = 500, 900, 0
+
+PIECE_VALUES = {Piece.WPAWN: PAWN_VALUE,     Piece.BPAWN: PAWN_VALUE,
+                Piece.WKNIGHT: KNIGHT_VALUE, Piece.BKNIGHT: KNIGHT_VALUE,
+                Piece.WBISHOP: BISHOP_VALUE, Piece.BBISHOP: BISHOP_VALUE,
+                Piece.WROOK: ROOK_VALUE,     Piece.BROOK: ROOK_VALUE,
+                Piece.WQUEEN: QUEEN_VALUE,   Piece.BQUEEN: QUEEN_VALUE,
+                Piece.WKING: KING_VALUE,     Piece.BKING: KING_VALUE,
+                Piece.EMPTY: 0}
+
+# Piece-square tables from white's point of view, indexed a1 = 0 ... h8 = 63
+# (so the first row below is rank 1). Black uses the vertically mirrored
+# square, i.e. idx ^ 56.
+PAWN_TABLE = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,   5,  10,  25,  25,  10,   5,   5,
+     10,  10,  20,  30,  30,  20,  10,  10,
+     50,  50,  50,  50,  50,  50,  50,  50,
+      0,   0,   0,   0,   0,   0,   0,   0]
+KNIGHT_TABLE = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50]
+BISHOP_TABLE = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20]
+ROOK_TABLE = [
+      0,   0,   0,   5,   5,   0,   0,   0,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      5,  10,  10,  10,  10,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0]
+QUEEN_TABLE = [
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20]
+KING_TABLE = [
+     20,  30,  10,   0,   0,  10,  30,  20,
+     20,  20,   0,   0,   0,   0,  20,  20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30]
+
+PIECE_SQUARE_TABLES = {Piece.WPAWN: PAWN_TABLE,     Piece.BPAWN: PAWN_TABLE,
+                       Piece.WKNIGHT: KNIGHT_TABLE, Piece.BKNIGHT: KNIGHT_TABLE,
+                       Piece.WBISHOP: BISHOP_TABLE, Piece.BBISHOP: BISHOP_TABLE,
+                       Piece.WROOK: ROOK_TABLE,     Piece.BROOK: ROOK_TABLE,
+                       Piece.WQUEEN: QUEEN_TABLE,   Piece.BQUEEN: QUEEN_TABLE,
+                       Piece.WKING: KING_TABLE,     Piece.BKING: KING_TABLE}
+
+
+def piece_score(piece: Piece, idx: int) -> int:
+    """Material plus piece-square bonus of one piece, from its own side's
+    point of view.
+
+    Args:
+        piece (Piece): The piece being scored
+        idx (int): Square index (0-63) of the piece
+    """
+    if piece in BLACK_PIECES:
+        idx ^= 56
+    return PIECE_VALUES[piece] + PIECE_SQUARE_TABLES[piece][idx]
+
+
+def evaluate(engine, white: bool = None) -> int:
+    """Static evaluation of the engine's current position.
+
+    Args:
+        engine (ChessEngine): The engine holding the position
+        white (bool): Side whose point of view to score from. Defaults to
+            the side to move.
+
+    Returns:
+        int: Score in centipawns, positive when the side is better
+    """
+    if white is None:
+        white = engine.white_to_move
+
+    board = engine.game_state
+    score = 0
+    for pos, piece in board.pieces(True):
+        score += piece_score(piece, SQUARE_INDEX[pos])
+    for pos, piece in board.pieces(False):
+        score -= piece_score(piece, SQUARE_INDEX[pos])
+
+    return score if white else -score
+
+
+# Batch evaluation. Positions are stacked into an (N, 64) int8 array with
+# squares ordered a1 = 0 ... h8 = 63. Each entry is the piece type code from
+# lib.pieces (PAWN ... KING), positive for white and negative for black,
+# and 0 for an empty square.
+
+MOBILITY_WEIGHT = 4
+
+SIGNED_CODES = {piece: (-(code & TYPE_MASK) if piece in BLACK_PIECES else code & TYPE_MASK)
+                for piece, code in PIECE_CODES.items()}
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError("numpy is required for batch evaluation")
+
+
+def stack_positions(positions) -> 'np.ndarray':
+    """Stacks positions into one array for evaluate_batch().
+
+    Args:
+        positions: Iterable of ChessEngine instances or boards exposing
+            the ChessBoard interface
+
+    Returns:
+        np.ndarray: (N, 64) int8 array of signed piece type codes
+    """
+    _require_numpy()
+    positions = list(positions)
+    buffer = bytearray(64 * len(positions))
+    for row, position in enumerate(positions):
+        board = position.game_state if hasattr(position, 'game_state') else position
+        base = row * 64
+        for white in (True, False):
+            for pos, piece in board.pieces(white):
+                buffer[base + SQUARE_INDEX[pos]] = SIGNED_CODES[piece] & 0xFF
+    return np.frombuffer(buffer, dtype=np.int8).reshape(len(positions), 64)
+
+
+@lru_cache(maxsize=None)
+def _batch_tables() -> tuple:
+    """Builds the lookup arrays used by evaluate_batch(), once."""
+    values = np.zeros(7, dtype=np.int32)
+    tables = np.zeros((7, 64), dtype=np.int32)
+    for type_code, value, table in ((PAWN, PAWN_VALUE, PAWN_TABLE),
+                                    (ROOK, ROOK_VALUE, ROOK_TABLE),
+                                    (KNIGHT, KNIGHT_VALUE, KNIGHT_TABLE),
+                                    (BISHOP, BISHOP_VALUE, BISHOP_TABLE),
+                                    (QUEEN, QUEEN_VALUE, QUEEN_TABLE),
+                                    (KING, KING_VALUE, KING_TABLE)):
+        values[type_code] = value
+        tables[type_code] = table
+
+    # Target squares, padded with 64 which evaluate_batch() treats as an
+    # occupied off-board square
+    def in_bounds(file_idx, rank_idx):
+        return 0 <= file_idx < 8 and 0 <= rank_idx < 8
+
+    knight_targets = np.full((64, 8), 64, dtype=np.intp)
+    rays = np.full((8, 64, 7), 64, dtype=np.intp)
+    knight_steps = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+    directions = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+    for idx in range(64):
+        file_idx, rank_idx = idx & 7, idx >> 3
+        for step_idx, (d_file, d_rank) in enumerate(knight_steps):
+            if in_bounds(file_idx + d_file, rank_idx + d_rank):
+                knight_targets[idx, step_idx] = (rank_idx + d_rank) * 8 + file_idx + d_file
+        for dir_idx, (d_file, d_rank) in enumerate(directions):
+            for dist in range(1, 8):
+                file_to, rank_to = file_idx + d_file * dist, rank_idx + d_rank * dist
+                if not in_bounds(file_to, rank_to):
+                    break
+                rays[dir_idx, idx, dist - 1] = rank_to * 8 + file_to
+
+    mirror = np.arange(64) ^ 56
+    return values, tables, knight_targets, rays, mirror
+
+
+def evaluate_batch(positions,
+                   white_to_move=None,
+                   mobility_weight: int = MOBILITY_WEIGHT,
+                   chunk_size: int = 8192) -> 'np.ndarray':
+    """Scores many positions at once with array operations.
+
+    The score is material plus piece-square tables, as in evaluate(), plus
+    a mobility proxy: the number of empty squares each knight, bishop,
+    rook and queen can move to, times mobility_weight.
+
+    Args:
+        positions: (N, 64) int8 array from stack_positions(), or anything
+            stack_positions() accepts
+        white_to_move: Optional length N sequence of bools. Scores are
+            from white's point of view unless given, in which case they
+            are from the point of view of the side to move.
+        mobility_weight (int): Centipawns per square of mobility; 0 makes
+            the result match evaluate()
+        chunk_size (int): Positions scored per step, bounding the size
+            of intermediate arrays
+
+    Returns:
+        np.ndarray: (N,) int32 array of scores in centipawns
+    """
+    _require_numpy()
+    if not isinstance(positions, np.ndarray):
+        positions = stack_positions(positions)
+
+    values, tables, knight_targets, rays, mirror = _batch_tables()
+    scores = np.empty(len(positions), dtype=np.int32)
+
+    for start in range(0, len(positions), chunk_size):
+        codes = positions[start:start + chunk_size].astype(np.int32)
+        types = np.abs(codes)
+        sign = np.sign(codes)
+
+        material = (values[types] * sign).sum(axis=1)
+
+        # Black pieces read the tables from the mirrored square
+        table_squares = np.where(codes > 0, np.arange(64), mirror)
+        placement = (tables[types, table_squares] * sign).sum(axis=1)
+
+        score = material + placement
+
+        if mobility_weight:
+            # Column 64 is the off-board sentinel, never empty
+            empty = np.zeros((len(codes), 65), dtype=np.uint8)
+            empty[:, :64] = codes == 0
+
+            knight_moves = empty[:, knight_targets].sum(axis=2, dtype=np.int32)
+
+            # Empty squares along a ray before the first blocker
+            reach = [np.cumprod(empty[:, rays[dir_idx]], axis=2, dtype=np.uint8).sum(axis=2, dtype=np.int32)
+                     for dir_idx in range(8)]
+            straight_moves = reach[0] + reach[1] + reach[2] + reach[3]
+            diagonal_moves = reach[4] + reach[5] + reach[6] + reach[7]
+
+            moves = np.select([types == KNIGHT, types == BISHOP, types == ROOK, types == QUEEN],
+                              [knight_moves, diagonal_moves, straight_moves, straight_moves + diagonal_moves],
+                              default=0)
+            score = score + mobility_weight * (moves * sign).sum(axis=1)
+
+        scores[start:start + chunk_size] = score
+
+    if white_to_move is not None:
+        scores = np.where(np.asarray(white_to_move, dtype=bool), scores, -scores).astype(np.int32)
+
+    return scores
@@ -1,25 +1,47 @@
 from curses import setupterm
 from operator import is_
 from sys import settrace
-from lib.pieces import UnicodePieces, Piece
-from typing import Tuple
+from lib.bitboard import BoardView, SQUARES, SQUARE_INDEX
+from lib.pieces import UnicodePieces, Piece, WHITE_PIECES
+from lib.zobrist import PIECE_SQUARE_KEYS, board_key
+from typing import Iterator, Tuple
+import curses
 import re
+import sys
+
+# Board squares in drawing order, top rank first
+_DRAW_RANKS = tuple(tuple(col + row for col in 'abcdefgh') for row in '87654321')
+_FRAME_HEADER = "  " + " _" * 8 + "\n"
+_FRAME_FOOTER = "  " + "".join(" " + col for col in 'abcdefgh') + "\n\n"
 
 
 class ChessBoard:
     """Holds game state."""
+    __slots__ = ('_rows', '_cols', '_board', '_has_moved', '_zobrist')
+
     def __init__(self):
         self._rows = ['1', '2', '3', '4', '5', '6', '7', '8']
         self._cols = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
         self._board, self._has_moved = self.initialize_board()
+        self._zobrist = board_key(self)
 
     @property
-    def board(self):
-        return self._board
+    def board(self) -> BoardView:
+        """The placement as ``board[row][col]``. Writes go through
+        set_piece(), which keeps the zobrist key in step."""
+        return BoardView(self)
 
     @board.setter
     def board(self, new_board):
-        self._board = new_board
+        # Has-moved flags are left as they are, so castling and double 
+        # step history survive a new placement
+        self._board = {row: {col: new_board[row][col] for col in self._cols} for row in self._rows}
+        self._zobrist = board_key(self)
+
+    @property
+    def zobrist_key(self) -> int:
+        """Zobrist hash of the piece placement, kept up to date on every change."""
+        return self._zobrist
 
     @property
     def rows(self):
@@ -75,6 +97,7 @@ class ChessBoard:
         """
         p1c1, p1c2 = self.unpack_move_string(pos1)
         p2c1, p2c2 = self.unpack_move_string(pos2)
+        self._rekey_move(pos1, pos2)
         self._board[p2c1][p2c2] = self._board[p1c1][p1c2]
         self._board[p1c1][p1c2] = Piece.EMPTY
 
@@ -92,6 +115,7 @@ class ChessBoard:
         """
         p1c1, p1c2 = self.unpack_move_string(pos1)
         p2c1, p2c2 = self.unpack_move_string(pos2)
+        self._rekey_move(pos1, pos2)
         self._board[p2c1][p2c2] = self._board[p1c1][p1c2]
         self._board[p1c1][p1c2] = Piece.EMPTY
 
@@ -102,6 +126,7 @@ class ChessBoard:
             pos (str): The position of the piece to be removed
         """
         pc1, pc2 = self.unpack_move_string(pos)
+        self._rekey_square(pos, Piece.EMPTY)
         self._board[pc1][pc2] = Piece.EMPTY
 
         if not self._has_moved[pc1][pc2]:
@@ -115,7 +140,26 @@ class ChessBoard:
             piece (Piece): The piece that will replace the old piece
         """
         pc1, pc2 = self.unpack_move_string(pos)
+        self._rekey_square(pos, piece)
+        self._board[pc1][pc2] = piece
+
+    def restore_square(self, pos: str, piece: Piece, has_moved: bool) -> None:
+        """Sets both the piece and the has-moved flag of a square. Meant 
+        for undoing moves exactly.
+
+        Args:
+            pos (str): The position to restore
+            piece (Piece): The piece to place on pos
+            has_moved (bool): The has-moved flag to give pos
+        """
+        pc1, pc2 = self.unpack_move_string(pos)
+        self._rekey_square(pos, piece)
         self._board[pc1][pc2] = piece
+        self._has_moved[pc1][pc2] = has_moved
+
+    def restore_index(self, idx: int, piece: Piece, has_moved: bool) -> None:
+        """Like restore_square, for a 0-63 square index."""
+        self.restore_square(SQUARES[idx], piece, has_moved)
 
     def has_moved(self, pos: str) -> bool:
         """Checks if the piece at some position is in its initial state.
@@ -129,13 +173,58 @@ class ChessBoard:
         pc1, pc2 = self.unpack_move_string(pos)
         return self._has_moved[pc1][pc2]
 
+    def has_moved_index(self, idx: int) -> bool:
+        """Like has_moved, for a 0-63 square index."""
+        pos = SQUARES[idx]
+        return self._has_moved[pos[1]][pos[0]]
+
     def piece_at(self, pos: str) -> Piece:
-        r_idx, c_idx = self.unpack_move_string(pos)
-        return self._board[r_idx][c_idx]
+        return self._board[pos[1]][pos[0]]
+
+    def piece_at_index(self, idx: int) -> Piece:
+        """Like piece_at, for a 0-63 square index."""
+        pos = SQUARES[idx]
+        return self._board[pos[1]][pos[0]]
+
+    def set_piece(self, pos: str, piece: Piece) -> None:
+        """Places piece on pos, replacing whatever was there."""
+        self._rekey_square(pos, piece)
+        self._board[pos[1]][pos[0]] = piece
+
+    def pieces(self, white: bool) -> Iterator[Tuple[str, Piece]]:
+        """Yields (position, piece) for every piece of one color.
+
+        Args:
+            white (bool): True for white pieces, False for black pieces
+        """
+        for r_idx in self._rows:
+            rank = self._board[r_idx]
+            for c_idx in self._cols:
+                piece = rank[c_idx]
+                if piece == Piece.EMPTY:
+                    continue
+                if (piece in WHITE_PIECES) == white:
+                    yield c_idx + r_idx, piece
+
+    def indexed_pieces(self, white: bool) -> Iterator[Tuple[int, Piece]]:
+        """Like pieces, with 0-63 square indices instead of positions."""
+        for pos, piece in self.pieces(white):
+            yield SQUARE_INDEX[pos], piece
+
+    def _rekey_square(self, pos: str, piece: Piece) -> None:
+        # Swap the key of the piece currently on pos for the key of piece
+        idx = SQUARE_INDEX[pos]
+        old_piece = self._board[pos[1]][pos[0]]
+        self._zobrist ^= PIECE_SQUARE_KEYS[old_piece.value][idx]
+        self._zobrist ^= PIECE_SQUARE_KEYS[piece.value][idx]
+
+    def _rekey_move(self, pos1: str, pos2: str) -> None:
+        # Account for the piece on pos1 replacing whatever is on pos2
+        self._rekey_square(pos2, self._board[pos1[1]][pos1[0]])
+        self._rekey_square(pos1, Piece.EMPTY)
 
     def unpack_move_string(self, pos: str) -> Tuple[str,str]:
-        idxs = list(pos)
-        return idxs[1], idxs[0]
+        return pos[1], pos[0]
 
     def pack_move_string(self, r_idx: str, c_idx: str) -> str:
         return ''.join((c_idx, r_idx))
@@ -165,37 +254,39 @@ class ChessFEUnicode(ChessFE):
 
         self._move_sequence = []
 
+    def render_state(self) -> str:
+        """Draws the board as a single string, with white at the bottom."""
+        glyphs = self._piece_to_unicode
+        piece_at = self._state.piece_at
+        lines = [_FRAME_HEADER]
+        for rank, squares in zip('87654321', _DRAW_RANKS):
+            lines.append(rank + " |" + "|".join([glyphs[piece_at(pos)] for pos in squares]) + "|\n")
+        lines.append(_FRAME_FOOTER)
+        return "".join(lines)
+
     def display_state(self):
-        if self._state is not None:
-            rows = ['1', '2', '3', '4', '5', '6', '7', '8']
-            cols = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
-            num_rows = len(rows)
-            num_cols = len(cols)
-            for idxi, i in enumerate(rows):
-                if i == '1':
-                    print("  " + " _" * num_cols)
-                
-                print(str(num_rows - idxi) + " ", end="")
-                for idxj, j in enumerate(cols):
-                    piece = self._piece_to_unicode[self._state.board[rows[-(idxi+1)]][j]]
-                    stop = ""
-                    if idxj == num_cols - 1:
-                        stop = "|\n"
-                    print("|" + piece + stop, end="")
-            print("  ", end="")
-            for i in range(ord('a'), ord('a') + num_cols):
-                print(' ' + chr(i), end="")
-            print("\n")
-        else:
-            print("No state to display")
+        # One write per frame, which matters on slow or logged terminals
+        frame = self.render_state() if self._state is not None else "No state to display\n"
+        sys.stdout.write(frame)
+        sys.stdout.flush()
 
-    def player_turn(self, is_white_turn):
-        player = "Player 1" if is_white_turn else "Player 2"
-        if len(self._move_sequence) == 0:
-            move = input(f"{player}, it's your move.\n")
-        else:
+    def _read_line(self, prompt: str) -> str:
+        return input(prompt)
+
+    def _notify(self, message: str) -> None:
+        print(message)
+
+    def player_turn(self, is_white_turn, player=None):
+        if len(self._move_sequence) > 0:
             move = self._move_sequence.pop()
-        
+        elif player is not None:
+            move = player.specify_move()
+        else:
+            player_str = "Player 1" if is_white_turn else "Player 2"
+            move = self._read_line(f"{player_str}, it's your move.\n")
+        return self._parse_turn(move)
+
+    def _parse_turn(self, move: str):
         end_game = False
         concede = False
         if move in {'quit', 'Quit', 'exit', 'Exit'}:
@@ -234,12 +325,144 @@ class ChessFEUnicode(ChessFE):
         prompt3 = "rook (r), knight (k), bishop (b), or queen (q)?\n"
         prompt4 = "Your choice: "
         prompt = prompt1 + prompt2 + prompt3 + prompt4
-        new_piece_str = input(prompt)
+        new_piece_str = self._read_line(prompt)
         return self._promotion_str_to_piece(new_piece_str, is_white_turn)
 
     def notify_check(self, is_white_turn):
         other_player = "Player 2" if is_white_turn else "Player 1"
         prompt1 = f"\n{other_player}, your king is in check."
-        print(prompt1)
+        self._notify(prompt1)
+
+    def notify_invalid_move(self):
+        self._notify("Move invalid, please try again\n")
+
+    def notify_stalemate(self):
+        self._notify("\nStalemate! The game is a draw.\n")
+
+
+class ChessFECurses(ChessFEUnicode):
+    """A full screen frontend built on curses. The board is drawn once and
+    afterwards only the squares whose piece changed are repainted, with
+    messages and prompts on the lines below it.
+
+    The terminal is taken over on the first display and given back by
+    close(), so use the frontend as a context manager or close it when the
+    game is over.
+    """
+    _MESSAGE_ROW = 11
+    _PROMPT_ROW = 13
+
+    def __init__(self, state: ChessBoard=None) -> None:
+        super().__init__(state)
+        self._screen = None
+        # What is on screen: the state drawn, and the piece drawn per square
+        self._drawn_state = None
+        self._drawn = None
+
+    def __enter__(self) -> 'ChessFECurses':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _open(self):
+        if self._screen is None:
+            self._screen = curses.initscr()
+            curses.noecho()
+            self._drawn_state = None
+        return self._screen
+
+    def close(self) -> None:
+        """Restores the terminal."""
+        if self._screen is not None:
+            curses.endwin()
+            self._screen = None
+
+    def _put(self, row: int, col: int, text: str) -> None:
+        # Writing past the edge of a small terminal raises, and a partly
+        # drawn board is better than a crash
+        try:
+            self._screen.addstr(row, col, text)
+        except curses.error:
+            pass
+
+    def display_state(self):
+        screen = self._open()
+        if self._state is None:
+            self._notify("No state to display")
+            return
+
+        glyphs = self._piece_to_unicode
+        pieces = [self._state.piece_at(pos) for pos in SQUARES]
+        if self._drawn_state is not self._state:
+            screen.erase()
+            for row, line in enumerate(self.render_state().splitlines()):
+                self._put(row, 0, line)
+            self._drawn_state = self._state
+        else:
+            # Square idx is drawn on screen row 8 - rank, after "8 |"
+            for idx, piece in enumerate(pieces):
+                if piece != self._drawn[idx]:
+                    self._put(8 - (idx >> 3), 3 + 2 * (idx & 7), glyphs[piece])
+        self._drawn = pieces
+        screen.refresh()
+
+    def player_turn(self, is_white_turn, player=None):
+        # Human players read moves with input(), which can't share the
+        # terminal with curses, so their moves are read here instead
+        if player is not None and player.is_human and len(self._move_sequence) == 0:
+            move = self._read_line(f"{player.name}, it's your turn!")
+            player.move_list.append(move)
+            return self._parse_turn(move)
+        return super().player_turn(is_white_turn, player)
+
+    def _read_line(self, prompt: str) -> str:
+        screen = self._open()
+        screen.move(self._PROMPT_ROW, 0)
+        screen.clrtobot()
+        self._put(self._PROMPT_ROW, 0, prompt.strip("\n") + " ")
+        curses.echo()
+        try:
+            line = screen.getstr().decode('utf-8', errors='replace')
+        finally:
+            curses.noecho()
+
+        # Messages are about the previous input
+        screen.move(self._MESSAGE_ROW, 0)
+        screen.clrtobot()
+        screen.refresh()
+        return line.strip()
+
+    def _notify(self, message: str) -> None:
+        screen = self._open()
+        screen.move(self._MESSAGE_ROW, 0)
+        screen.clrtoeol()
+        self._put(self._MESSAGE_ROW, 0, message.strip("\n"))
+        screen.refresh()
+
+
+class ChessFEHeadless(ChessFEUnicode):
+    """A frontend that never prints or prompts, for games played entirely
+    by agents (tournaments, scripts). Moves must come from the players,
+    and promotions the players leave open default to a queen."""
+    def display_state(self):
+        pass
+
+    def player_turn(self, is_white_turn, player=None):
+        if player is None and len(self._move_sequence) == 0:
+            raise RuntimeError("A headless game needs a player to supply every move")
+        return super().player_turn(is_white_turn, player)
+
+    def promotion(self, is_white_turn):
+        return self._promotion_str_to_piece('q', is_white_turn)
+
+    def notify_check(self, is_white_turn):
+        pass
+
+    def notify_invalid_move(self):
+        pass
+
+    def notify_stalemate(self):
+        pass
 
     
@@ -0,0 +1,92 @@
+from typing import List, Optional, Tuple
+
+# Square i is file (i % 8) and rank (i // 8), as in lib.bitboard. Every
+# table below is indexed by square and built once, at import.
+
+STRAIGHT_DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+DIAGONAL_DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+KNIGHT_STEPS = ((1, 2), (2, 1), (2, -1), (1, -2),
+                (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+KING_STEPS = ((1, 0), (1, 1), (0, 1), (-1, 1),
+              (-1, 0), (-1, -1), (0, -1), (1, -1))
+
+
+def _walk(idx: int, d_file: int, d_rank: int) -> Tuple[int, ...]:
+    file_to, rank_to = (idx & 7) + d_file, (idx >> 3) + d_rank
+    squares = []
+    while 0 <= file_to < 8 and 0 <= rank_to < 8:
+        squares.append(rank_to * 8 + file_to)
+        file_to += d_file
+        rank_to += d_rank
+    return tuple(squares)
+
+
+def _steps(idx: int, steps) -> Tuple[int, ...]:
+    targets = []
+    for d_file, d_rank in steps:
+        file_to, rank_to = (idx & 7) + d_file, (idx >> 3) + d_rank
+        if 0 <= file_to < 8 and 0 <= rank_to < 8:
+            targets.append(rank_to * 8 + file_to)
+    return tuple(targets)
+
+
+def _mask(squares) -> int:
+    mask = 0
+    for idx in squares:
+        mask |= 1 << idx
+    return mask
+
+
+# STRAIGHT_RAYS[idx] and DIAGONAL_RAYS[idx] hold one ray per direction,
+# each listing the squares from idx outwards to the edge of the board.
+# QUEEN_RAYS[idx] is both, straight rays first.
+STRAIGHT_RAYS = [tuple(_walk(idx, *d) for d in STRAIGHT_DIRECTIONS) for idx in range(64)]
+DIAGONAL_RAYS = [tuple(_walk(idx, *d) for d in DIAGONAL_DIRECTIONS) for idx in range(64)]
+QUEEN_RAYS = [STRAIGHT_RAYS[idx] + DIAGONAL_RAYS[idx] for idx in range(64)]
+
+# Leaper targets in step order, and the same squares as bitmasks
+KNIGHT_TARGETS = [_steps(idx, KNIGHT_STEPS) for idx in range(64)]
+KING_TARGETS = [_steps(idx, KING_STEPS) for idx in range(64)]
+KNIGHT_ATTACKS = [_mask(targets) for targets in KNIGHT_TARGETS]
+KING_ATTACKS = [_mask(targets) for targets in KING_TARGETS]
+
+# PAWN_ATTACKS[0] for white pawns, PAWN_ATTACKS[1] for black pawns
+PAWN_ATTACKS = ([_mask(_steps(idx, ((-1, 1), (1, 1)))) for idx in range(64)],
+                [_mask(_steps(idx, ((-1, -1), (1, -1)))) for idx in range(64)])
+
+
+def _between_tables(rays: List[Tuple[Tuple[int, ...], ...]]) -> List[Optional[Tuple[int, ...]]]:
+    table = [None] * 4096
+    for idx in range(64):
+        for ray in rays[idx]:
+            for distance, target in enumerate(ray):
+                table[idx << 6 | target] = ray[:distance]
+    return table
+
+
+# STRAIGHT_BETWEEN[a << 6 | b] lists the squares strictly between a and b
+# when they share a rank or file, and is None otherwise (including a == b).
+# DIAGONAL_BETWEEN is the same for squares on a shared diagonal.
+STRAIGHT_BETWEEN = _between_tables(STRAIGHT_RAYS)
+DIAGONAL_BETWEEN = _between_tables(DIAGONAL_RAYS)
+
+# BETWEEN_MASKS[a << 6 | b] is the bitmask of the squares strictly between
+# a and b on any shared line, 0 when they are adjacent or not aligned.
+BETWEEN_MASKS = [_mask(straight or diagonal or ())
+                 for straight, diagonal in zip(STRAIGHT_BETWEEN, DIAGONAL_BETWEEN)]
+
+
+def between(a: int, b: int) -> Optional[Tuple[int, ...]]:
+    """Returns the squares strictly between two aligned squares.
+
+    Args:
+        a (int): Square index (0-63) of one end
+        b (int): Square index of the other end
+
+    Returns:
+        Tuple[int, ...]: The squares in order from a to b, or None if a
+            and b share no rank, file or diagonal
+    """
+    key = a << 6 | b
+    squares = STRAIGHT_BETWEEN[key]
+    return squares if squares is not None else DIAGONAL_BETWEEN[key]
@@ -0,0 +1,83 @@
+from lib.bitboard import SQUARES, SQUARE_INDEX
+from lib.pieces import Piece
+from typing import Optional, Tuple
+
+# Move codes are plain ints. The low 16 bits are the move word stored by
+# lib.archive: from square in bits 0-5, to square in bits 6-11 and the
+# promotion piece type in bits 12-14 (0 when the move doesn't promote).
+# Flags describing the move sit above the word.
+CAPTURE = 1 << 16
+EN_PASSANT = 1 << 17
+CASTLE = 1 << 18
+DOUBLE_STEP = 1 << 19
+
+_WORD_MASK = 0xFFFF
+_PROMOTION_MASK = 0x7 << 12
+_PROMOTION_CODES = {Piece.WQUEEN: 1, Piece.WROOK: 2, Piece.WBISHOP: 3, Piece.WKNIGHT: 4,
+                    Piece.BQUEEN: 1, Piece.BROOK: 2, Piece.BBISHOP: 3, Piece.BKNIGHT: 4}
+_WHITE_PROMOTIONS = (None, Piece.WQUEEN, Piece.WROOK, Piece.WBISHOP, Piece.WKNIGHT)
+_BLACK_PROMOTIONS = (None, Piece.BQUEEN, Piece.BROOK, Piece.BBISHOP, Piece.BKNIGHT)
+
+
+def encode(src: int, dest: int, promotion: Piece = None, flags: int = 0) -> int:
+    """Packs a move into an int.
+
+    Args:
+        src (int): Source square index (0-63, a1 is 0)
+        dest (int): Destination square index
+        promotion (Piece): The promotion piece, if the move promotes
+        flags (int): Any of CAPTURE, EN_PASSANT, CASTLE and DOUBLE_STEP
+
+    Returns:
+        int: The move code
+    """
+    code = src | (dest << 6) | flags
+    if promotion is not None:
+        code |= _PROMOTION_CODES[promotion] << 12
+    return code
+
+
+def source(code: int) -> int:
+    return code & 0x3F
+
+
+def destination(code: int) -> int:
+    return (code >> 6) & 0x3F
+
+
+def promotion_piece(code: int, white: bool) -> Optional[Piece]:
+    """Returns the promotion piece of a move, colored for the side that
+    plays it, or None."""
+    return (_WHITE_PROMOTIONS if white else _BLACK_PROMOTIONS)[(code >> 12) & 0x7]
+
+
+def promotes(code: int) -> bool:
+    """Whether a move promotes a pawn."""
+    return code & _PROMOTION_MASK != 0
+
+
+def underpromotes(code: int) -> bool:
+    """Whether a move promotes to anything but a queen."""
+    return (code >> 12) & 0x7 > 1
+
+
+def word(code: int) -> int:
+    """Returns the 16-bit move word of lib.archive, without the flags."""
+    return code & _WORD_MASK
+
+
+def square_names(code: int) -> Tuple[str, str]:
+    """Returns the source and destination square names, e.g. ('e2', 'e4')."""
+    return SQUARES[code & 0x3F], SQUARES[(code >> 6) & 0x3F]
+
+
+def from_squares(move: Tuple[str, str], promotion: Piece = None) -> int:
+    """Packs a move given by square names. The code has no flags."""
+    return encode(SQUARE_INDEX[move[0]], SQUARE_INDEX[move[1]], promotion)
+
+
+def to_string(code: int) -> str:
+    """Formats a move as the frontend reads it (e.g. 'e2,e4'), with the
+    promotion letter appended (e.g. 'e7,e8q')."""
+    text = f"{SQUARES[code & 0x3F]},{SQUARES[(code >> 6) & 0x3F]}"
+    return text + ' qrbk'[(code >> 12) & 0x7].strip()
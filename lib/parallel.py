@@ -0,0 +1,191 @@
+from lib.agents import AlphaBetaAgent
+from lib.bitboard import SQUARES, SQUARE_INDEX
+from lib.chess import ChessEngine
+from lib.pieces import Piece
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+import os
+import struct
+
+# A slot is two little-endian 64-bit words: (key ^ data, data). A reader
+# only accepts the slot if the stored key matches once the data is XORed
+# back out, so torn writes from concurrent processes are simply misses.
+_SLOT = struct.Struct('<QQ')
+
+# Layout of the data word
+_SCORE_BITS, _SCORE_OFFSET = 20, 1 << 19
+_NO_PROMOTION = 15
+
+
+def _pack_entry(depth: int, score: int, flag: int, move: Tuple[str, str], promotion: Optional[Piece]) -> int:
+    promotion_code = _NO_PROMOTION if promotion is None else promotion.value
+    data = (score + _SCORE_OFFSET) & ((1 << _SCORE_BITS) - 1)
+    data |= (depth & 0x7F) << 20
+    data |= (flag & 0x3) << 27
+    data |= SQUARE_INDEX[move[0]] << 29
+    data |= SQUARE_INDEX[move[1]] << 35
+    data |= promotion_code << 41
+    return data
+
+
+def _unpack_entry(data: int) -> tuple:
+    score = (data & ((1 << _SCORE_BITS) - 1)) - _SCORE_OFFSET
+    depth = (data >> 20) & 0x7F
+    flag = (data >> 27) & 0x3
+    move = (SQUARES[(data >> 29) & 0x3F], SQUARES[(data >> 35) & 0x3F])
+    promotion_code = (data >> 41) & 0xF
+    promotion = None if promotion_code == _NO_PROMOTION else Piece(promotion_code)
+    return depth, score, flag, move, promotion
+
+
+class SharedTranspositionTable:
+    """A fixed-size transposition table in shared memory, so that search
+    processes can share results. Drop-in replacement for
+    lib.agents.TranspositionTable.
+
+    Args:
+        num_entries (int): Number of slots (16 bytes each)
+        name (str): Name of an existing table to attach to. A new block
+            is created when omitted.
+    """
+    __slots__ = ('_shm', '_buffer', '_num_entries', '_owner')
+
+    def __init__(self, num_entries: int = 1 << 20, name: str = None) -> None:
+        self._num_entries = num_entries
+        self._owner = name is None
+        if self._owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=num_entries * _SLOT.size)
+            self._shm.buf[:] = bytes(num_entries * _SLOT.size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._buffer = self._shm.buf
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def num_entries(self) -> int:
+        return self._num_entries
+
+    def get(self, key: int) -> Optional[tuple]:
+        """Looks up a position.
+
+        Returns:
+            tuple: (depth, score, flag, move, promotion), or None if the
+                position is not stored
+        """
+        checked, data = _SLOT.unpack_from(self._buffer, (key % self._num_entries) * _SLOT.size)
+        if data == 0 or checked ^ data != key:
+            return None
+        return _unpack_entry(data)
+
+    def store(self, key: int, depth: int, score: int, flag: int, move: Tuple[str, str], promotion: Optional[Piece]) -> None:
+        data = _pack_entry(depth, score, flag, move, promotion)
+        _SLOT.pack_into(self._buffer, (key % self._num_entries) * _SLOT.size, key ^ data, data)
+
+    def clear(self) -> None:
+        self._buffer[:] = bytes(self._num_entries * _SLOT.size)
+
+    def close(self) -> None:
+        """Detaches from the shared block, freeing it if we created it.
+        Closing again does nothing."""
+        if self._shm is None:
+            return
+        self._buffer.release()
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+        self._shm = self._buffer = None
+
+
+# Each worker process attaches to the shared table once, when it starts
+_worker_table = None
+
+
+def _init_worker(table_name: str, num_entries: int) -> None:
+    global _worker_table
+    _worker_table = SharedTranspositionTable(num_entries, name=table_name)
+
+
+def _search_worker(fen: str, worker_idx: int, time_limit: float, max_depth: int) -> tuple:
+    # The position comes as a FEN, which is all the search needs and a
+    # fraction of the size of a pickled engine with its undo history
+    agent = AlphaBetaAgent("worker", "white", time_limit=time_limit,
+                           max_depth=max_depth, table=_worker_table)
+    agent.attach(ChessEngine.from_fen(fen))
+
+    # Helpers start one ply deeper every other worker, so that they don't
+    # all search the same tree in lockstep (Lazy SMP)
+    move, promotion = agent.search(start_depth=1 + (worker_idx % 2))
+    return agent.completed_depth, worker_idx, move, promotion, agent.nodes, agent.score
+
+
+class ParallelAlphaBetaAgent(AlphaBetaAgent):
+    """An AlphaBetaAgent that searches with several processes at once.
+
+    Every worker runs the full search on its own copy of the position
+    (Lazy SMP), and all of them share one transposition table in shared
+    memory, so they mostly divide the tree between them through the table.
+    The move of the deepest completed search is played.
+
+    Call close() when done to stop the workers and free the table. Closing
+    more than once is harmless.
+
+    Args:
+        name (str): Player name
+        color (str): 'white' or 'black'
+        time_limit (float): Seconds to spend searching each move
+        workers (int): Number of search processes. Defaults to the
+            number of CPUs.
+        table_size (int): Number of shared transposition table slots
+    """
+    __slots__ = ('_workers', '_pool')
+
+    def __init__(self,
+                 name: str,
+                 color: str,
+                 time_limit: float = 5.0,
+                 workers: int = None,
+                 max_depth: int = 64,
+                 table_size: int = 1 << 20) -> None:
+        super().__init__(name, color, time_limit=time_limit, max_depth=max_depth,
+                         table=SharedTranspositionTable(table_size))
+        self._workers = workers or os.cpu_count() or 1
+        self._pool = None
+
+    def search(self, start_depth: int = 1) -> Tuple[Tuple[str, str], Optional[Piece]]:
+        self._nodes = 0
+        self._completed_depth = 0
+
+        # Root moves are only needed here when the tables cover the
+        # position; the workers generate their own
+        if self._engine.probe_tablebase() is not None:
+            best = self._tablebase_move(self._ordered_moves(None))
+            if best is not None:
+                return self._decode(best)
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self._workers,
+                                             initializer=_init_worker,
+                                             initargs=(self._table.name, self._table.num_entries))
+
+        fen = self._engine.to_fen()
+        futures = [self._pool.submit(_search_worker, fen, idx,
+                                     self._time_limit, self._max_depth)
+                   for idx in range(self._workers)]
+        results = [future.result() for future in futures]
+
+        self._nodes = sum(result[4] for result in results)
+
+        # Deepest completed search wins, ties go to the lowest worker
+        depth, _, move, promotion, _, score = max(results, key=lambda result: (result[0], -result[1]))
+        self._completed_depth, self._score = depth, score
+        return move, promotion
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self._table.close()
@@ -0,0 +1,295 @@
+from lib.chess import ChessEngine
+from lib.pieces import Piece
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+import os
+import re
+
+_HEADER = re.compile(r'^\[(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]\s*$')
+_TOKEN = re.compile(r'\{[^}]*\}|;[^\n]*|\(|\)|\$\d+|1-0|0-1|1/2-1/2|\*|\d+\.+|[^\s(){};$]+')
+_SAN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+_RESULTS = frozenset({'1-0', '0-1', '1/2-1/2', '*'})
+
+_PIECE_TYPES = {'': (Piece.WPAWN, Piece.BPAWN),
+                'N': (Piece.WKNIGHT, Piece.BKNIGHT),
+                'B': (Piece.WBISHOP, Piece.BBISHOP),
+                'R': (Piece.WROOK, Piece.BROOK),
+                'Q': (Piece.WQUEEN, Piece.BQUEEN),
+                'K': (Piece.WKING, Piece.BKING)}
+
+
+class IllegalMoveError(ValueError):
+    """A SAN move that no legal move matches."""
+
+
+class AmbiguousMoveError(ValueError):
+    """A SAN move that more than one legal move matches."""
+
+
+class PGNGame(NamedTuple):
+    """One game read from a PGN file.
+
+    Attributes:
+        offset (int): Byte offset of the game's first line in the file
+        headers (dict): Tag pairs, e.g. headers['White']
+        moves (List[str]): Moves of the main line in SAN, without move
+            numbers, comments, variations or annotations
+        result (str): The game termination marker ('1-0', '0-1',
+            '1/2-1/2' or '*'), or None if missing
+    """
+    offset: int
+    headers: dict
+    moves: List[str]
+    result: Optional[str]
+
+
+class GameReport(NamedTuple):
+    """The outcome of validating one game.
+
+    Attributes:
+        offset (int): Byte offset of the game, to find it again with
+            read_games(path, offset)
+        plies (int): Number of moves that were legal
+        error (str): Why the game is invalid, or None if it is valid
+    """
+    offset: int
+    plies: int
+    error: Optional[str]
+
+
+def _parse_movetext(lines: List[str]) -> Tuple[List[str], Optional[str]]:
+    moves = []
+    result = None
+    depth = 0
+    for token in _TOKEN.findall('\n'.join(lines)):
+        first = token[0]
+        if first in '{;$':
+            continue
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth = max(depth - 1, 0)
+        elif depth > 0 or first.isdigit() and token.endswith('.'):
+            continue
+        elif token in _RESULTS:
+            result = token
+        else:
+            moves.append(token)
+    return moves, result
+
+
+def read_games(path: str, start: int = 0, end: int = None) -> Iterator[PGNGame]:
+    """Reads games from a PGN file one at a time, so that memory use does
+    not depend on the size of the file.
+
+    Args:
+        path (str): The PGN file
+        start (int): Byte offset to start at. It must be the start of a
+            game, as returned by split_offsets() or PGNGame.offset.
+        end (int): Byte offset to stop at, also the start of a game.
+            Reads to the end of the file when omitted.
+
+    Yields:
+        PGNGame: Each game in turn
+    """
+    with open(path, 'rb') as stream:
+        stream.seek(start)
+        offset = start
+
+        game_offset = None
+        headers = {}
+        movetext = []
+
+        for raw_line in stream:
+            if end is not None and offset >= end:
+                break
+            line_offset = offset
+            offset += len(raw_line)
+
+            line = raw_line.decode('utf-8', errors='replace').strip()
+            if not line or line[0] == '%':
+                continue
+
+            if line[0] == '[':
+                # A tag after movetext begins the next game
+                if movetext:
+                    moves, result = _parse_movetext(movetext)
+                    yield PGNGame(game_offset, headers, moves, result)
+                    game_offset, headers, movetext = None, {}, []
+
+                if game_offset is None:
+                    game_offset = line_offset
+                match = _HEADER.match(line)
+                if match is not None:
+                    headers[match.group(1)] = re.sub(r'\\(.)', r'\1', match.group(2))
+            else:
+                if game_offset is None:
+                    game_offset = line_offset
+                movetext.append(line)
+
+        if game_offset is not None:
+            moves, result = _parse_movetext(movetext)
+            yield PGNGame(game_offset, headers, moves, result)
+
+
+def split_offsets(path: str, parts: int) -> List[int]:
+    """Divides a PGN file into roughly equal byte ranges that begin at game
+    boundaries, so that each can be read independently.
+
+    Args:
+        path (str): The PGN file
+        parts (int): Number of ranges wanted
+
+    Returns:
+        List[int]: Increasing offsets, starting with 0 and ending with the
+            file size. Range i is offsets[i] to offsets[i + 1]. There may be
+            fewer than parts ranges.
+    """
+    size = os.path.getsize(path)
+    offsets = [0]
+    with open(path, 'rb') as stream:
+        for part in range(1, parts):
+            target = max(size * part // parts, offsets[-1] + 1)
+            if target >= size:
+                break
+
+            # Skip the partial line we landed in. Not knowing what the line
+            # before was, a tag right after it may continue a header block.
+            stream.seek(target)
+            offset = target + len(stream.readline())
+            previous_is_tag = True
+
+            boundary = size
+            for raw_line in stream:
+                line = raw_line.strip()
+                is_tag = line[:1] == b'['
+                if is_tag and not previous_is_tag:
+                    boundary = offset
+                    break
+                if line:
+                    previous_is_tag = is_tag
+                offset += len(raw_line)
+
+            if boundary >= size:
+                break
+            if boundary > offsets[-1]:
+                offsets.append(boundary)
+    offsets.append(size)
+    return offsets
+
+
+def san_to_move(engine: ChessEngine, san: str) -> Tuple[Tuple[str, str], Optional[Piece]]:
+    """Resolves a move in Standard Algebraic Notation for the side to move.
+
+    Args:
+        engine (ChessEngine): The current position
+        san (str): The move, e.g. 'Nbd7', 'exd8=Q+' or 'O-O'
+
+    Returns:
+        ((str, str), Piece): The source and destination of the move, and
+            the promotion piece (None unless the move promotes)
+
+    Raises:
+        IllegalMoveError: If no legal move matches
+        AmbiguousMoveError: If several legal moves match
+    """
+    white = engine.white_to_move
+    board = engine.game_state
+    text = san.rstrip('+#!?')
+
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        rank = '1' if white else '8'
+        move = ('e' + rank, ('g' if len(text) == 3 else 'c') + rank)
+        if board.piece_at(move[0]) != (Piece.WKING if white else Piece.BKING) or \
+                len(engine.move_implications(move[0], move[1], white)) == 0:
+            raise IllegalMoveError(f"Illegal move: {san}")
+        return move, None
+
+    match = _SAN.match(text)
+    if match is None:
+        raise IllegalMoveError(f"Unreadable move: {san}")
+    piece_letter, from_file, from_rank, target, promotion_letter = match.groups()
+    piece = _PIECE_TYPES[piece_letter or ''][0 if white else 1]
+
+    promotion = None
+    if promotion_letter is not None:
+        if piece_letter is not None:
+            raise IllegalMoveError(f"Illegal move: {san}")
+        promotion = _PIECE_TYPES[promotion_letter][0 if white else 1]
+
+    matches = []
+    for pos, candidate in board.pieces(white):
+        if candidate != piece:
+            continue
+        if (from_file is not None and pos[0] != from_file) or (from_rank is not None and pos[1] != from_rank):
+            continue
+        consequences = engine.move_implications(pos, target, white)
+        if len(consequences) == 0:
+            continue
+
+        promotes = any(item[0] is None and item[1] is not None for item in consequences)
+        if promotes != (promotion is not None):
+            continue
+        matches.append((pos, target))
+
+    if len(matches) == 0:
+        raise IllegalMoveError(f"Illegal move: {san}")
+    if len(matches) > 1:
+        raise AmbiguousMoveError(f"Ambiguous move: {san} ({', '.join(pos for pos, _ in matches)})")
+    return matches[0], promotion
+
+
+def validate_game(game: PGNGame) -> GameReport:
+    """Replays a game, checking that every move is legal and unambiguous.
+
+    Games with a FEN tag start from that position.
+
+    Args:
+        game (PGNGame): The game to check
+
+    Returns:
+        GameReport: How far the game got, and what went wrong if anything
+    """
+    try:
+        engine = ChessEngine.from_fen(game.headers['FEN']) if 'FEN' in game.headers else ChessEngine()
+    except ValueError as e:
+        return GameReport(game.offset, 0, str(e))
+
+    for ply, san in enumerate(game.moves):
+        try:
+            move, promotion = san_to_move(engine, san)
+        except ValueError as e:
+            move_number = engine.fullmove_number
+            dots = '.' if engine.white_to_move else '...'
+            return GameReport(game.offset, ply, f"{move_number}{dots} {e}")
+        engine.push(move, promotion)
+
+    return GameReport(game.offset, len(game.moves), None)
+
+
+def _validate_range(path: str, start: int, end: int) -> List[GameReport]:
+    return [validate_game(game) for game in read_games(path, start, end)]
+
+
+def validate_file(path: str, workers: int = None, chunks_per_worker: int = 4) -> Iterator[GameReport]:
+    """Validates every game of a PGN file across worker processes.
+
+    The file is split into byte ranges at game boundaries, and each worker
+    reads and checks its own ranges, so nothing but the reports is sent
+    between processes.
+
+    Args:
+        path (str): The PGN file
+        workers (int): Number of processes. Defaults to the number of CPUs.
+        chunks_per_worker (int): Ranges per worker, to even out the load
+
+    Yields:
+        GameReport: One report per game, in file order
+    """
+    workers = workers or os.cpu_count() or 1
+    offsets = split_offsets(path, workers * chunks_per_worker)
+    starts, ends = offsets[:-1], offsets[1:]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for reports in pool.map(_validate_range, [path] * len(starts), starts, ends):
+            yield from reports
@@ -43,4 +43,34 @@ class Piece(Enum):
     BKING = 11
     EMPTY = 12
 
-    
\ No newline at end of file
+    
+
+WHITE_PIECES = (Piece.WPAWN, Piece.WROOK, Piece.WKNIGHT,
+                Piece.WBISHOP, Piece.WQUEEN, Piece.WKING)
+BLACK_PIECES = (Piece.BPAWN, Piece.BROOK, Piece.BKNIGHT,
+                Piece.BBISHOP, Piece.BQUEEN, Piece.BKING)
+ALL_PIECES = WHITE_PIECES + BLACK_PIECES
+
+# Integer piece codes: bits 0-2 hold the piece type, bit 3 is set for
+# black pieces. Zero is an empty square.
+PAWN, ROOK, KNIGHT, BISHOP, QUEEN, KING = 1, 2, 3, 4, 5, 6
+TYPE_MASK = 0x07
+BLACK = 0x08
+
+PIECE_CODES = {Piece.EMPTY: 0}
+for _piece in ALL_PIECES:
+    _type_code = (_piece.value % 6) + 1
+    PIECE_CODES[_piece] = _type_code | (BLACK if _piece in BLACK_PIECES else 0)
+
+CODE_PIECES = [Piece.EMPTY] * 16
+for _piece, _code in PIECE_CODES.items():
+    CODE_PIECES[_code] = _piece
+CODE_PIECES = tuple(CODE_PIECES)
+del _piece, _code, _type_code
+
+# Letters used by FEN (and SAN, uppercase) for each piece
+FEN_SYMBOLS = {Piece.WPAWN: 'P', Piece.WROOK: 'R', Piece.WKNIGHT: 'N',
+               Piece.WBISHOP: 'B', Piece.WQUEEN: 'Q', Piece.WKING: 'K',
+               Piece.BPAWN: 'p', Piece.BROOK: 'r', Piece.BKNIGHT: 'n',
+               Piece.BBISHOP: 'b', Piece.BQUEEN: 'q', Piece.BKING: 'k'}
+FEN_PIECES = {symbol: piece for piece, symbol in FEN_SYMBOLS.items()}
@@ -0,0 +1,121 @@
+from lib.agents import AlphaBetaAgent
+from lib.pieces import Piece
+from typing import Optional, Tuple
+import copy
+import threading
+
+
+class PonderingAgent(AlphaBetaAgent):
+    """An AlphaBetaAgent that keeps searching while the opponent thinks.
+
+    Once it has chosen a move, a background thread searches the position
+    that move leads to, on its own copy of the engine, and fills the
+    shared transposition table as it goes. When the opponent's reply
+    arrives the pondering stops, and the position after the reply usually
+    has an exact table entry already, from the subtree the pondering
+    search explored under that reply:
+
+    - if that entry is at least as deep as the last full search reached,
+      its move is played at once, without searching;
+    - otherwise iterative deepening resumes one ply below it, so the
+      time budget goes into depth that was not searched yet.
+
+    The thread shares the interpreter lock with the game, so it only gets
+    the CPU while the game waits on the opponent (e.g. on input()). Call
+    close() when done to stop it.
+
+    Args:
+        name (str): Player name
+        color (str): 'white' or 'black'
+        time_limit (float): Seconds to spend searching each move
+        max_depth (int): Maximum search depth in plies
+        table_size (int): Maximum number of transposition table entries
+    """
+    __slots__ = ('_ponderer', '_ponder_thread', '_target_depth', '_reused_depth')
+
+    def __init__(self,
+                 name: str,
+                 color: str,
+                 time_limit: float = 5.0,
+                 max_depth: int = 64,
+                 table_size: int = 1 << 20) -> None:
+        super().__init__(name, color, time_limit=time_limit, max_depth=max_depth, table_size=table_size)
+        self._ponderer = None
+        self._ponder_thread = None
+        # Depth the last full search completed, as a measure of what the
+        # time budget buys
+        self._target_depth = 1
+        self._reused_depth = 0
+
+    @property
+    def pondering(self) -> bool:
+        """True while the background search is running."""
+        return self._ponder_thread is not None and self._ponder_thread.is_alive()
+
+    @property
+    def reused_depth(self) -> int:
+        """Depth of the pondered result the last move started from, 0 if
+        there was none."""
+        return self._reused_depth
+
+    def specify_move(self) -> str:
+        self.stop_pondering()
+        move = super().specify_move()
+        self._start_pondering()
+        return move
+
+    def search(self, start_depth: int = 1) -> Tuple[Tuple[str, str], Optional[Piece]]:
+        self._reused_depth = 0
+        entry = self._table.get(self._engine.position_key)
+        if entry is not None and entry[2] == self.EXACT:
+            depth, score, _, move, promotion = entry
+            engine = self._engine
+            # Keys can collide, and an entry whose move is illegal here
+            # belongs to another position
+            if len(engine.move_implications(move[0], move[1], engine.white_to_move)) > 0:
+                self._reused_depth = depth
+                if depth >= self._target_depth or depth >= self._max_depth:
+                    self._nodes = 0
+                    self._completed_depth, self._score = depth, score
+                    return move, promotion
+                start_depth = max(start_depth, depth + 1)
+
+        move, promotion = super().search(start_depth)
+        if self._completed_depth > 0:
+            self._target_depth = self._completed_depth
+        else:
+            # Nothing deeper finished, so the pondered move stands
+            self._completed_depth = self._reused_depth
+        return move, promotion
+
+    def _start_pondering(self) -> None:
+        # The game applies our move only after specify_move() returns, so
+        # the pondering copy plays it itself
+        p1, p2 = self.move_list[-1].split(',')
+        engine = copy.deepcopy(self._engine)
+        engine.push((p1, p2), self._promotion)
+        if not engine.has_legal_move(engine.white_to_move):
+            return
+
+        opponent = 'black' if self.color == 'white' else 'white'
+        self._ponderer = AlphaBetaAgent(self.name, opponent, time_limit=float('inf'),
+                                        max_depth=self._max_depth, table=self._table)
+        self._ponderer.attach(engine)
+        self._ponder_thread = threading.Thread(target=self._ponderer.search, daemon=True)
+        self._ponder_thread.start()
+
+    def stop_pondering(self) -> None:
+        """Stops the background search and waits for it to end."""
+        thread = self._ponder_thread
+        if thread is None:
+            return
+        # stop() may land before the search has set its deadline, so
+        # repeat it until the thread is gone
+        while thread.is_alive():
+            self._ponderer.stop()
+            thread.join(0.01)
+        self._ponder_thread = None
+        self._ponderer = None
+
+    def close(self) -> None:
+        self.stop_pondering()
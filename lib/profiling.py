@@ -0,0 +1,236 @@
+from lib.chess import ChessEngine, ChessGame, _GAME_CACHE_SIZE
+from bisect import bisect_left
+from typing import Dict, List, NamedTuple, Optional
+import cProfile
+import functools
+import time
+
+# Histogram bucket upper bounds in seconds, 100us to 100s in 1-2-5 steps.
+# Anything slower lands in a last, unbounded bucket.
+_BUCKET_BOUNDS = tuple(mantissa * 10.0 ** exponent
+                       for exponent in range(-4, 3)
+                       for mantissa in (1, 2, 5))
+
+
+class CallStats(NamedTuple):
+    """Totals for one instrumented function.
+
+    Attributes:
+        calls (int): Number of calls
+        total_time (float): Cumulative seconds, including nested calls
+    """
+    calls: int
+    total_time: float
+
+
+class LatencyHistogram:
+    """Counts durations in logarithmic buckets, so that memory use stays
+    fixed however many are recorded."""
+    __slots__ = ('_counts', '_total', '_max')
+
+    def __init__(self) -> None:
+        self._counts = [0] * (len(_BUCKET_BOUNDS) + 1)
+        self._total = 0.0
+        self._max = 0.0
+
+    def record(self, seconds: float) -> None:
+        self._counts[bisect_left(_BUCKET_BOUNDS, seconds)] += 1
+        self._total += seconds
+        self._max = max(self._max, seconds)
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    @property
+    def mean(self) -> float:
+        count = self.count
+        return self._total / count if count else 0.0
+
+    @property
+    def max(self) -> float:
+        return self._max
+
+    def buckets(self) -> List[tuple]:
+        """Returns (upper bound in seconds, count) pairs for the non-empty
+        buckets. The last bucket's bound is infinity."""
+        bounds = _BUCKET_BOUNDS + (float('inf'),)
+        return [(bound, count) for bound, count in zip(bounds, self._counts) if count]
+
+    def percentile(self, fraction: float) -> float:
+        """Returns an upper bound for the given fraction (e.g. 0.99) of
+        the durations: the bound of the bucket it falls in, or the
+        maximum for the last bucket."""
+        target = fraction * self.count
+        seen = 0
+        for idx, count in enumerate(self._counts):
+            seen += count
+            if count and seen >= target:
+                return _BUCKET_BOUNDS[idx] if idx < len(_BUCKET_BOUNDS) else self._max
+        return 0.0
+
+
+class Profiler:
+    """Collects call counts, cumulative times and latency histograms.
+
+    One profiler is usually shared by all the instrumented engines and
+    games of a process (see PROFILER), so that report() covers them all.
+    """
+    __slots__ = ('_calls', '_histograms')
+
+    def __init__(self) -> None:
+        self._calls = {}
+        self._histograms = {}
+
+    def record_call(self, name: str, seconds: float) -> None:
+        entry = self._calls.get(name)
+        if entry is None:
+            entry = self._calls[name] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def record_latency(self, name: str, seconds: float) -> None:
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = LatencyHistogram()
+        histogram.record(seconds)
+
+    @property
+    def calls(self) -> Dict[str, CallStats]:
+        return {name: CallStats(*entry) for name, entry in self._calls.items()}
+
+    @property
+    def histograms(self) -> Dict[str, LatencyHistogram]:
+        return dict(self._histograms)
+
+    def reset(self) -> None:
+        self._calls.clear()
+        self._histograms.clear()
+
+    def report(self) -> str:
+        """Formats the statistics as a table, slowest functions first."""
+        lines = [f"{'function':<28}{'calls':>10}{'total s':>11}{'per call us':>13}"]
+        for name, (calls, total) in sorted(self._calls.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{name:<28}{calls:>10}{total:>11.3f}{1e6 * total / calls:>13.1f}")
+
+        for name, histogram in sorted(self._histograms.items()):
+            lines.append("")
+            lines.append(f"{name}: {histogram.count} turns, mean {histogram.mean:.3f}s, "
+                         f"p50 <= {histogram.percentile(0.5):g}s, p99 <= {histogram.percentile(0.99):g}s, "
+                         f"max {histogram.max:.3f}s")
+            for bound, count in histogram.buckets():
+                lines.append(f"  <= {bound:<8g}{count:>8}")
+        return "\n".join(lines)
+
+
+# The profiler instrumented objects report to unless given another one
+PROFILER = Profiler()
+
+
+def _timed(name: str, fn):
+    @functools.wraps(fn)
+    def timed(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(self, *args, **kwargs)
+        finally:
+            self._profiler.record_call(name, time.perf_counter() - start)
+    return timed
+
+
+class InstrumentedEngine(ChessEngine):
+    """A ChessEngine that counts the calls of its rule functions and times
+    them. It behaves exactly like ChessEngine, only slower, so it can be
+    swapped in wherever an engine is created.
+
+    Args:
+        board: As for ChessEngine
+        cache_size (int): As for ChessEngine
+        profiler (Profiler): Where to record. Defaults to PROFILER.
+    """
+    __slots__ = ('_profiler',)
+
+    def __init__(self, board=None, cache_size: int = 0, profiler: Profiler = None) -> None:
+        super().__init__(board, cache_size)
+        self._profiler = profiler if profiler is not None else PROFILER
+
+    @property
+    def profiler(self) -> Profiler:
+        return self._profiler
+
+    move_implications = _timed('move_implications', ChessEngine.move_implications)
+    has_legal_move = _timed('has_legal_move', ChessEngine.has_legal_move)
+    legal_moves = _timed('legal_moves', ChessEngine.legal_moves)
+    king_lines = _timed('king_lines', ChessEngine.king_lines)
+    tile_is_threatened = _timed('tile_is_threatened', ChessEngine.tile_is_threatened)
+    checkmate = _timed('checkmate', ChessEngine.checkmate)
+    move_jeopardizes_our_king = _timed('move_jeopardizes_our_king', ChessEngine.move_jeopardizes_our_king)
+    _attack_map = _timed('_attack_map', ChessEngine._attack_map)
+    push = _timed('push', ChessEngine.push)
+    push_consequences = _timed('push_consequences', ChessEngine.push_consequences)
+    push_move = _timed('push_move', ChessEngine.push_move)
+    pop = _timed('pop', ChessEngine.pop)
+
+    # Handlers are named after their function, so both colors of a piece
+    # add up under one name
+    _piece_fn_map = {piece: _timed(handler.__name__, handler)
+                     for piece, handler in ChessEngine._piece_fn_map.items()}
+
+
+class InstrumentedGame(ChessGame):
+    """A ChessGame that records the latency of every turn in histograms
+    ('white turn' and 'black turn', including the time the player takes),
+    and can run turns under cProfile.
+
+    Args:
+        player_1, player_2, frontend: As for ChessGame
+        engine (ChessEngine): As for ChessGame. Defaults to an
+            InstrumentedEngine reporting to the same profiler.
+        profiler (Profiler): Where to record. Defaults to PROFILER.
+    """
+    def __init__(self,
+                 player_1,
+                 player_2,
+                 frontend=None,
+                 engine: ChessEngine = None,
+                 profiler: Profiler = None) -> None:
+        self._profiler = profiler if profiler is not None else PROFILER
+        self._cprofile = None
+        self._cprofile_path = None
+        if engine is None:
+            engine = InstrumentedEngine(cache_size=_GAME_CACHE_SIZE, profiler=self._profiler)
+        super().__init__(player_1, player_2, frontend=frontend, engine=engine)
+
+    @property
+    def profiler(self) -> Profiler:
+        return self._profiler
+
+    def start_cprofile(self, path: Optional[str] = None) -> None:
+        """Runs the following turns under cProfile until stop_cprofile().
+
+        Args:
+            path (str): File to dump the stats to on stop, for pstats or
+                snakeviz. When omitted they are printed instead.
+        """
+        self._cprofile = cProfile.Profile()
+        self._cprofile_path = path
+
+    def stop_cprofile(self) -> None:
+        """Stops profiling turns and dumps or prints the stats."""
+        if self._cprofile is None:
+            return
+        profile, self._cprofile = self._cprofile, None
+        if self._cprofile_path is not None:
+            profile.dump_stats(self._cprofile_path)
+        else:
+            profile.print_stats('cumulative')
+
+    def move(self):
+        side = 'white turn' if self._white_turn else 'black turn'
+        start = time.perf_counter()
+        if self._cprofile is not None:
+            result = self._cprofile.runcall(super().move)
+        else:
+            result = super().move()
+        self._profiler.record_latency(side, time.perf_counter() - start)
+        return result
@@ -0,0 +1,410 @@
+from lib.agents import AlphaBetaAgent, Player
+from lib.chess import ChessEngine, ChessGame
+from lib.compact import CompactBoard
+from lib.frontend import ChessFEHeadless, ChessFEUnicode
+from lib.pieces import Piece
+from concurrent.futures import Executor
+from typing import Callable, NamedTuple, Optional, Tuple
+import asyncio
+import re
+
+_MOVE = re.compile(r'^\s*([a-hA-H][1-8])\s*,\s*([a-hA-H][1-8])\s*$')
+_QUIT_COMMANDS = frozenset({'quit', 'exit', 'concede', 'resign'})
+# Same letters as the frontend's promotion prompt
+_PROMOTIONS = {'q': (Piece.WQUEEN, Piece.BQUEEN), 'r': (Piece.WROOK, Piece.BROOK),
+               'b': (Piece.WBISHOP, Piece.BBISHOP), 'k': (Piece.WKNIGHT, Piece.BKNIGHT)}
+
+# Engines of hosted games keep a small move cache for the repeated checks
+# of each move, as thousands of them may be alive at once
+_ENGINE_CACHE_SIZE = 16
+
+
+class GameOutcome(NamedTuple):
+    """How a hosted game ended.
+
+    Attributes:
+        result (str): '1-0', '0-1' or '1/2-1/2'
+        reason (str): 'checkmate', 'stalemate' or 'resignation' (which
+            includes quitting and disconnecting)
+        plies (int): Number of moves played
+    """
+    result: str
+    reason: str
+    plies: int
+
+
+class AsyncPlayer:
+    """A player whose moves are awaited, so that a game waiting on it
+    doesn't hold up the others.
+
+    Args:
+        name (str): Player name
+        color (str): 'white' or 'black'
+    """
+    __slots__ = ('_name', '_color')
+
+    def __init__(self, name: str, color: str) -> None:
+        if color not in ('white', 'black'):
+            raise ValueError("Color must be 'white' or 'black'")
+        self._name = name
+        self._color = color
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def color(self) -> str:
+        return self._color
+
+    @property
+    def is_human(self) -> bool:
+        """Whether the moves come from a person, as for Player. Computer
+        players return False."""
+        return True
+
+    def attach(self, engine: ChessEngine) -> None:
+        """Called with the engine of the game before it starts."""
+        pass
+
+    async def specify_move(self) -> str:
+        """Returns a move in the frontend's 'e2,e4' form, or one of 'quit',
+        'exit', 'concede' and 'resign' to give up."""
+        raise NotImplementedError()
+
+    async def specify_promotion(self, is_white_turn: bool) -> Optional[Piece]:
+        """Chooses the piece for a promotion. None means a queen."""
+        return None
+
+    async def notify(self, message: str) -> None:
+        """Receives game messages, including the board after each move."""
+        pass
+
+
+class AsyncAgent(AsyncPlayer):
+    """Adapts a synchronous computer player, running its search in an
+    executor so that the event loop stays free meanwhile.
+
+    Args:
+        agent (Player): The player making the decisions
+        executor (Executor): Where to run the search. None uses the
+            event loop's default executor.
+    """
+    __slots__ = ('_agent', '_executor')
+
+    def __init__(self, agent: Player, executor: Executor = None) -> None:
+        super().__init__(agent.name, agent.color)
+        self._agent = agent
+        self._executor = executor
+
+    @property
+    def is_human(self) -> bool:
+        return self._agent.is_human
+
+    def attach(self, engine: ChessEngine) -> None:
+        self._agent.attach(engine)
+
+    async def specify_move(self) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._agent.specify_move)
+
+    async def specify_promotion(self, is_white_turn: bool) -> Optional[Piece]:
+        return self._agent.specify_promotion(is_white_turn)
+
+
+class RemotePlayer(AsyncPlayer):
+    """A human playing over a stream connection, one line per input.
+
+    Args:
+        name (str): Player name
+        color (str): 'white' or 'black'
+        reader (asyncio.StreamReader): Lines from the client
+        writer (asyncio.StreamWriter): Lines to the client
+    """
+    __slots__ = ('_reader', '_writer')
+
+    def __init__(self, name: str, color: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        super().__init__(name, color)
+        self._reader = reader
+        self._writer = writer
+
+    async def ask(self, prompt: str) -> Optional[str]:
+        """Sends a prompt and waits for the reply line.
+
+        Returns:
+            str: The reply, or None once the connection is closed
+        """
+        await self.notify(prompt)
+        try:
+            line = await self._reader.readline()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            return None
+        if not line:
+            return None
+        return line.decode('utf-8', errors='replace').strip()
+
+    async def specify_move(self) -> str:
+        move = await self.ask(f"{self._name}, it's your move.")
+        # A closed connection gives the game up
+        return move if move is not None else 'quit'
+
+    async def specify_promotion(self, is_white_turn: bool) -> Optional[Piece]:
+        choice = await self.ask("Promote to a rook (r), knight (k), bishop (b), or queen (q)?")
+        pieces = _PROMOTIONS.get((choice or 'q').lower()[:1], _PROMOTIONS['q'])
+        return pieces[0 if is_white_turn else 1]
+
+    async def notify(self, message: str) -> None:
+        if self._writer.is_closing():
+            return
+        self._writer.write(message.rstrip('\n').encode('utf-8') + b'\n')
+        try:
+            await self._writer.drain()
+        except ConnectionError:
+            pass
+
+
+def parse_move(text: str) -> Optional[Tuple[str, str]]:
+    """Reads a move in the frontend's 'e2,e4' form.
+
+    Returns:
+        (str, str): The source and destination squares, or None if the
+            text is not a move
+    """
+    match = _MOVE.match(text)
+    if match is None:
+        return None
+    return match.group(1).lower(), match.group(2).lower()
+
+
+class GameSession:
+    """One game between two async players, played as a coroutine.
+
+    The rule checks run in an executor: move validation, applying the
+    move, and looking for checkmate or stalemate all block for a while,
+    and the event loop may be serving thousands of other games.
+
+    Args:
+        white (AsyncPlayer): The white player
+        black (AsyncPlayer): The black player
+        engine (ChessEngine): The starting position. Defaults to a new game
+            on a CompactBoard, the smallest backend, since a server holds
+            many games at once.
+        executor (Executor): Where to run rule checks. None uses the event
+            loop's default executor.
+    """
+    __slots__ = ('_players', '_game', '_executor', '_renderer', '_plies')
+
+    def __init__(self,
+                 white: AsyncPlayer,
+                 black: AsyncPlayer,
+                 engine: ChessEngine = None,
+                 executor: Executor = None) -> None:
+        self._players = (white, black)
+        if engine is None:
+            engine = ChessEngine(CompactBoard(), cache_size=_ENGINE_CACHE_SIZE)
+        # The game attaches the players to its engine
+        self._game = ChessGame(white, black, frontend=ChessFEHeadless(), engine=engine)
+        self._executor = executor
+        self._renderer = ChessFEUnicode(engine.game_state)
+        self._plies = 0
+
+    @property
+    def engine(self) -> ChessEngine:
+        return self._game.engine
+
+    async def broadcast(self, message: str) -> None:
+        """Sends a message to both players."""
+        await asyncio.gather(*(player.notify(message) for player in self._players))
+
+    async def play(self) -> GameOutcome:
+        """Plays the game to its end.
+
+        Returns:
+            GameOutcome: The result and how it came about
+        """
+        loop = asyncio.get_running_loop()
+        game = self._game
+        await self.broadcast(self._renderer.render_state())
+
+        while True:
+            white = game.white_to_move
+            player = self._players[0 if white else 1]
+
+            text = await player.specify_move()
+            if text.strip().lower() in _QUIT_COMMANDS:
+                await self.broadcast(f"{player.name} resigns.")
+                return GameOutcome('0-1' if white else '1-0', 'resignation', self._plies)
+
+            move = parse_move(text)
+            legal = False
+            if move is not None:
+                legal = await loop.run_in_executor(self._executor, game.is_legal, move)
+            if not legal:
+                await player.notify("Move invalid, please try again")
+                continue
+
+            # The legality check left the move's consequences in the cache
+            promotion = None
+            if game.promotes(move):
+                promotion = await player.specify_promotion(white)
+
+            result = await loop.run_in_executor(self._executor, game.apply, move, promotion)
+            self._plies += 1
+            await self.broadcast(self._renderer.render_state())
+
+            if result.checkmate:
+                await self.broadcast(f"Checkmate! {player.name} wins.")
+                return GameOutcome('1-0' if white else '0-1', 'checkmate', self._plies)
+            if result.stalemate:
+                await self.broadcast("Stalemate! The game is a draw.")
+                return GameOutcome('1/2-1/2', 'stalemate', self._plies)
+            if result.check:
+                await self._players[1 if white else 0].notify("Your king is in check.")
+
+
+class ChessServer:
+    """Hosts games for clients connecting over TCP or a Unix socket.
+
+    The protocol is line based, so a client can be as simple as netcat.
+    After the greeting a client sends 'play' to be paired with the next
+    client who does the same, or 'play computer' for a game against the
+    engine, and then moves such as 'e2,e4'. Any other command gets an
+    error line, and a client who disconnects while waiting for an
+    opponent is not paired. Every game is a coroutine, so idle games
+    cost no more than their engine's memory.
+
+    Args:
+        agent_factory: Builds the computer player for a color. Defaults
+            to an AlphaBetaAgent with think_time seconds per move.
+        executor (Executor): Where to run rule checks and searches. None
+            uses the event loop's default executor.
+        think_time (float): Seconds per move of the default computer
+    """
+    __slots__ = ('_agent_factory', '_executor', '_server', '_waiting', '_games', '_outcomes')
+
+    def __init__(self,
+                 agent_factory: Callable[[str], Player] = None,
+                 executor: Executor = None,
+                 think_time: float = 1.0) -> None:
+        if agent_factory is None:
+            def agent_factory(color: str) -> Player:
+                return AlphaBetaAgent("Computer", color, time_limit=think_time, table_size=1 << 16)
+        self._agent_factory = agent_factory
+        self._executor = executor
+        self._server = None
+        # The future a client waiting for an opponent awaits, which the
+        # next client to send 'play' completes with its own streams
+        self._waiting = None
+        self._games = 0
+        self._outcomes = []
+
+    @property
+    def active_games(self) -> int:
+        return self._games
+
+    @property
+    def outcomes(self) -> list:
+        """GameOutcome of every game finished so far."""
+        return self._outcomes
+
+    @property
+    def sockets(self) -> list:
+        """The listening sockets, e.g. to find the port when serving on
+        port 0."""
+        return list(self._server.sockets) if self._server is not None else []
+
+    async def start_tcp(self, host: str = '127.0.0.1', port: int = 0) -> None:
+        self._server = await asyncio.start_server(self._handle, host, port)
+
+    async def start_unix(self, path: str) -> None:
+        self._server = await asyncio.start_unix_server(self._handle, path)
+
+    async def serve_forever(self) -> None:
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _run_game(self, session: GameSession) -> GameOutcome:
+        self._games += 1
+        try:
+            outcome = await session.play()
+        finally:
+            self._games -= 1
+        self._outcomes.append(outcome)
+        await session.broadcast(f"Game over: {outcome.result} ({outcome.reason})")
+        return outcome
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            await self._serve_client(reader, writer)
+        finally:
+            writer.close()
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        greeter = RemotePlayer("Player", 'white', reader, writer)
+        command = await greeter.ask("Welcome! Send 'play' for a human opponent or 'play computer'.")
+        while command is not None:
+            words = command.lower().split()
+            if words == ['play']:
+                await self._pair(reader, writer, greeter)
+                return
+            if words == ['play', 'computer']:
+                human = RemotePlayer("Player 1", 'white', reader, writer)
+                computer = AsyncAgent(self._agent_factory('black'), self._executor)
+                await self._run_game(GameSession(human, computer, executor=self._executor))
+                return
+            command = await greeter.ask(f"Unknown command {command!r}. Send 'play' or 'play computer'.")
+
+    async def _pair(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, greeter: RemotePlayer) -> None:
+        while self._waiting is not None:
+            # Hand our streams to the waiting client, whose handler plays
+            # the game. It answers False if it turned out to be gone
+            opponent = self._waiting
+            self._waiting = None
+            finished = asyncio.get_running_loop().create_future()
+            opponent.set_result((reader, writer, finished))
+            if await finished:
+                return
+        await self._wait_for_opponent(reader, writer, greeter)
+
+    async def _wait_for_opponent(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, greeter: RemotePlayer) -> None:
+        # First of a pair: white, once someone joins. The client is read
+        # meanwhile, so that one who disconnects leaves the pairing slot
+        opponent = asyncio.get_running_loop().create_future()
+        self._waiting = opponent
+        finished = None
+        try:
+            await greeter.notify("Waiting for an opponent...")
+            while not opponent.done():
+                watcher = asyncio.ensure_future(reader.readline())
+                await asyncio.wait((opponent, watcher), return_when=asyncio.FIRST_COMPLETED)
+                if not watcher.done():
+                    # Cancelling leaves any partial line in the buffer
+                    watcher.cancel()
+                    await asyncio.wait((watcher,))
+                if watcher.cancelled():
+                    continue
+                if watcher.exception() is not None or not watcher.result():
+                    return
+                if not opponent.done():
+                    await greeter.notify("Waiting for an opponent...")
+
+            black_reader, black_writer, finished = opponent.result()
+            white = RemotePlayer("Player 1", 'white', reader, writer)
+            black = RemotePlayer("Player 2", 'black', black_reader, black_writer)
+            try:
+                await self._run_game(GameSession(white, black, executor=self._executor))
+            finally:
+                finished.set_result(True)
+        finally:
+            if self._waiting is opponent:
+                self._waiting = None
+            if finished is None and opponent.done():
+                finished = opponent.result()[2]
+            if finished is not None and not finished.done():
+                # No game was played, so the opponent waits for another
+                finished.set_result(False)
@@ -0,0 +1,469 @@
+from lib.bitboard import SQUARE_INDEX
+from lib.pieces import Piece
+from typing import Dict, List, Optional, Tuple
+import mmap
+import os
+import struct
+
+# Endgame tablebases for a lone black king against a few white pieces.
+# Positions with the pieces on the other side are probed with the colors
+# swapped. Every position takes one byte: the result for the side to move
+# in bits 6-7 and the number of moves to mate in bits 0-5.
+#
+# The generator only ever deals with kings, one or two white pieces and
+# simple geometry, so it works on square indices (a1 = 0 ... h8 = 63) with
+# its own move tables rather than going through ChessEngine, which would
+# take hours for KBNK. The tablebase.py tool's --check option compares
+# the results with ChessEngine's rules.
+
+MATERIALS = ('KQK', 'KRK', 'KPK', 'KBNK')
+
+# Result codes stored in the top two bits
+_ILLEGAL, _WIN, _LOSS, _DRAW = 0, 1, 2, 3
+_DRAW_VALUE = _DRAW << 6
+
+# Probe results, from the side to move's point of view
+WIN, DRAW, LOSS = 1, 0, -1
+
+_MAGIC = b'CHTB'
+_VERSION = 1
+_HEADER = struct.Struct('<4sH8sxxQ')
+
+# Pieces of each material set after the two kings, all white
+_EXTRA_PIECES = {'KQK': ('Q',), 'KRK': ('R',), 'KPK': ('P',), 'KBNK': ('B', 'N')}
+_PROMOTIONS = (('Q', 'KQK'), ('R', 'KRK'))
+
+_PIECE_LETTERS = {Piece.WQUEEN: 'Q', Piece.WROOK: 'R', Piece.WBISHOP: 'B', Piece.WKNIGHT: 'N', Piece.WPAWN: 'P',
+                  Piece.BQUEEN: 'Q', Piece.BROOK: 'R', Piece.BBISHOP: 'B', Piece.BKNIGHT: 'N', Piece.BPAWN: 'P'}
+_LETTER_ORDER = 'QRBNP'
+
+
+def _targets(sq: int, steps) -> tuple:
+    file_idx, rank_idx = sq & 7, sq >> 3
+    return tuple((rank_idx + d_rank) * 8 + file_idx + d_file for d_file, d_rank in steps
+                 if 0 <= file_idx + d_file < 8 and 0 <= rank_idx + d_rank < 8)
+
+
+def _ray(sq: int, d_file: int, d_rank: int) -> tuple:
+    squares = []
+    file_idx, rank_idx = (sq & 7) + d_file, (sq >> 3) + d_rank
+    while 0 <= file_idx < 8 and 0 <= rank_idx < 8:
+        squares.append(rank_idx * 8 + file_idx)
+        file_idx, rank_idx = file_idx + d_file, rank_idx + d_rank
+    return tuple(squares)
+
+
+_KING_TARGETS = tuple(_targets(sq, ((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)))
+                      for sq in range(64))
+_KNIGHT_TARGETS = tuple(_targets(sq, ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)))
+                        for sq in range(64))
+_KING_SETS = tuple(frozenset(targets) for targets in _KING_TARGETS)
+_KNIGHT_SETS = tuple(frozenset(targets) for targets in _KNIGHT_TARGETS)
+_PAWN_ATTACK_SETS = tuple(frozenset(_targets(sq, ((1, 1), (-1, 1)))) for sq in range(64))
+
+_STRAIGHT, _DIAGONAL = 1, 2
+_SLIDER_DIRECTIONS = {'R': ((1, 0), (-1, 0), (0, 1), (0, -1)),
+                      'B': ((1, 1), (1, -1), (-1, 1), (-1, -1))}
+_SLIDER_DIRECTIONS['Q'] = _SLIDER_DIRECTIONS['R'] + _SLIDER_DIRECTIONS['B']
+_SLIDER_LINES = {'Q': _STRAIGHT | _DIAGONAL, 'R': _STRAIGHT, 'B': _DIAGONAL}
+_RAYS = {kind: tuple(tuple(_ray(sq, *direction) for direction in directions) for sq in range(64))
+         for kind, directions in _SLIDER_DIRECTIONS.items()}
+
+# For a pair of squares on a common line, the kind of line and a mask of
+# the squares strictly between them
+_LINE_KIND = [0] * 4096
+_BETWEEN = [0] * 4096
+for _sq in range(64):
+    for _kind, _directions in ((_STRAIGHT, _SLIDER_DIRECTIONS['R']), (_DIAGONAL, _SLIDER_DIRECTIONS['B'])):
+        for _direction in _directions:
+            _mask = 0
+            for _target in _ray(_sq, *_direction):
+                _LINE_KIND[_sq * 64 + _target] = _kind
+                _BETWEEN[_sq * 64 + _target] = _mask
+                _mask |= 1 << _target
+del _sq, _kind, _directions, _direction, _mask, _target
+
+# The eight symmetries of the board, as square maps. Pawnless positions are
+# stored with the white king in the a1-d1-d4 triangle.
+_TRANSFORMS = tuple(tuple(fn(sq & 7, sq >> 3) for sq in range(64)) for fn in (
+    lambda f, r: r * 8 + f,
+    lambda f, r: r * 8 + 7 - f,
+    lambda f, r: (7 - r) * 8 + f,
+    lambda f, r: (7 - r) * 8 + 7 - f,
+    lambda f, r: f * 8 + r,
+    lambda f, r: f * 8 + 7 - r,
+    lambda f, r: (7 - f) * 8 + r,
+    lambda f, r: (7 - f) * 8 + 7 - r))
+_TRIANGLE = (0, 1, 2, 3, 9, 10, 11, 18, 19, 27)
+_TRIANGLE_INDEX = [-1] * 64
+for _idx, _sq in enumerate(_TRIANGLE):
+    _TRIANGLE_INDEX[_sq] = _idx
+del _idx, _sq
+_KING_TRANSFORMS = tuple(tuple(t for t in range(8) if _TRANSFORMS[t][sq] in _TRIANGLE) for sq in range(64))
+
+
+def _attacked(target: int, wk: int, kinds: tuple, extras: tuple, occupied: int) -> bool:
+    """Checks whether white attacks a square, given the occupancy mask."""
+    if target in _KING_SETS[wk]:
+        return True
+    for kind, sq in zip(kinds, extras):
+        if sq == target:
+            continue
+        if kind == 'N':
+            if target in _KNIGHT_SETS[sq]:
+                return True
+        elif kind == 'P':
+            if target in _PAWN_ATTACK_SETS[sq]:
+                return True
+        elif _LINE_KIND[sq * 64 + target] & _SLIDER_LINES[kind] and not occupied & _BETWEEN[sq * 64 + target]:
+            return True
+    return False
+
+
+class _Layout:
+    """Maps positions of one material set to table indices and back.
+
+    Index = ((wk * 64 + bk) * 64 + extra...) * 2 + black_to_move, where
+    wk counts triangle squares only for pawnless sets. Pawn positions are
+    mirrored to put the pawn on files a-d.
+    """
+    __slots__ = ('name', 'kinds', 'has_pawn', 'size')
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.kinds = _EXTRA_PIECES[name]
+        self.has_pawn = 'P' in self.kinds
+        king_squares = 64 if self.has_pawn else len(_TRIANGLE)
+        self.size = king_squares * 64 ** (1 + len(self.kinds)) * 2
+
+    def index(self, wk: int, bk: int, extras: tuple, black_to_move: bool) -> int:
+        if self.has_pawn:
+            if extras[0] & 7 > 3:
+                mirror = _TRANSFORMS[1]
+                wk, bk, extras = mirror[wk], mirror[bk], tuple(mirror[sq] for sq in extras)
+            idx = wk
+        else:
+            transforms = _KING_TRANSFORMS[wk]
+            if len(transforms) == 1:
+                transform = _TRANSFORMS[transforms[0]]
+                squares = (transform[wk], transform[bk]) + tuple(transform[sq] for sq in extras)
+            else:
+                # The king is on the diagonal, so two symmetries keep it in
+                # the triangle. Take the smaller result to stay unique.
+                squares = min((_TRANSFORMS[t][wk], _TRANSFORMS[t][bk]) + tuple(_TRANSFORMS[t][sq] for sq in extras)
+                              for t in transforms)
+            wk, bk, extras = squares[0], squares[1], squares[2:]
+            idx = _TRIANGLE_INDEX[wk]
+
+        idx = idx * 64 + bk
+        for sq in extras:
+            idx = idx * 64 + sq
+        return idx * 2 + black_to_move
+
+    def decode(self, idx: int) -> Tuple[int, int, tuple, bool]:
+        black_to_move = bool(idx & 1)
+        idx >>= 1
+        extras = []
+        for _ in self.kinds:
+            extras.append(idx & 63)
+            idx >>= 6
+        bk = idx & 63
+        idx >>= 6
+        wk = idx if self.has_pawn else _TRIANGLE[idx]
+        return wk, bk, tuple(reversed(extras)), black_to_move
+
+
+def _legal(layout: _Layout, wk: int, bk: int, extras: tuple) -> bool:
+    # Placement only: distinct squares, kings apart, pawns off the back ranks
+    squares = {wk, bk, *extras}
+    if len(squares) != 2 + len(extras) or bk in _KING_SETS[wk]:
+        return False
+    if layout.has_pawn and not 8 <= extras[0] < 56:
+        return False
+    return True
+
+
+def _occupancy(wk: int, bk: int, extras: tuple) -> int:
+    occupied = (1 << wk) | (1 << bk)
+    for sq in extras:
+        occupied |= 1 << sq
+    return occupied
+
+
+def _white_origins(kind: int, sq: int, occupied: int) -> List[int]:
+    # Squares a white piece on sq could have come from with a quiet move
+    if kind == 'N':
+        return [origin for origin in _KNIGHT_TARGETS[sq] if not occupied >> origin & 1]
+    if kind == 'P':
+        origins = []
+        if sq >= 16 and not occupied >> (sq - 8) & 1:
+            origins.append(sq - 8)
+            if sq >> 3 == 3 and not occupied >> (sq - 16) & 1:
+                origins.append(sq - 16)
+        return origins
+    origins = []
+    for ray in _RAYS[kind][sq]:
+        for origin in ray:
+            if occupied >> origin & 1:
+                break
+            origins.append(origin)
+    return origins
+
+
+def solve(name: str, solved: Dict[str, 'Tablebase'] = None) -> bytearray:
+    """Computes a tablebase by retrograde analysis.
+
+    Starting from every mate, wins for white are found by taking back
+    white moves, and losses for black by taking back black moves from
+    positions whose every black reply is now known to lose. Positions
+    reached in the order of their distance to mate get the shortest mate.
+
+    Args:
+        name (str): One of MATERIALS
+        solved: Tables of the sets that promotions lead to ('KQK' and
+            'KRK' for 'KPK')
+
+    Returns:
+        bytearray: One byte per index, see the module comment
+    """
+    layout = _Layout(name)
+    kinds = layout.kinds
+    values = bytearray(layout.size)
+    # Black replies not yet known to lose, 255 once black can escape
+    counts = bytearray(layout.size)
+    buckets = [[]]
+
+    def bucket(plies):
+        while len(buckets) <= plies:
+            buckets.append([])
+        return buckets[plies]
+
+    for idx in range(0, layout.size, 2):
+        wk, bk, extras, _ = layout.decode(idx)
+        if not _legal(layout, wk, bk, extras) or layout.index(wk, bk, extras, False) != idx:
+            continue
+        occupied = _occupancy(wk, bk, extras)
+        in_check = _attacked(bk, wk, kinds, extras, occupied)
+
+        # White to move is only legal if black is not in check
+        if not in_check:
+            values[idx] = _DRAW_VALUE
+
+            # Promotions lead into another table
+            if layout.has_pawn and extras[0] >= 48 and not occupied >> (extras[0] + 8) & 1:
+                for kind, target_name in _PROMOTIONS:
+                    target = solved[target_name]
+                    result, plies = target.lookup(wk, bk, (extras[0] + 8,), True)
+                    if result == LOSS:
+                        bucket(plies + 1).append(idx)
+
+        # Black to move: count the king's legal replies
+        values[idx + 1] = _DRAW_VALUE
+        without_king = occupied & ~(1 << bk)
+        replies = []
+        escapes = False
+        for target in _KING_TARGETS[bk]:
+            if target in _KING_SETS[wk]:
+                continue
+            if target in extras:
+                # Capturing a piece leaves a drawn ending, unless defended
+                remaining = tuple(sq for sq in extras if sq != target)
+                remaining_kinds = tuple(kind for kind, sq in zip(kinds, extras) if sq != target)
+                if not _attacked(target, wk, remaining_kinds, remaining, without_king):
+                    escapes = True
+            elif not _attacked(target, wk, kinds, extras, without_king):
+                replies.append(target)
+
+        if escapes:
+            counts[idx + 1] = 255
+        elif len(replies) == 0:
+            if in_check:
+                values[idx + 1] = _LOSS << 6
+                buckets[0].append(idx + 1)
+        elif len(_KING_TRANSFORMS[wk]) > 1 and not layout.has_pawn:
+            # Symmetric replies lead to the same stored position, and
+            # each stored position takes back its black moves only once
+            counts[idx + 1] = len({layout.index(wk, target, extras, False) for target in replies})
+        else:
+            counts[idx + 1] = len(replies)
+
+    plies = 0
+    while plies < len(buckets):
+        for idx in buckets[plies]:
+            wk, bk, extras, black_to_move = layout.decode(idx)
+            occupied = _occupancy(wk, bk, extras)
+
+            if black_to_move:
+                # Black is mated in plies: every white move leading here wins
+                for origin in _KING_TARGETS[wk]:
+                    if occupied >> origin & 1 or origin in _KING_SETS[bk]:
+                        continue
+                    # The king may have been blocking a check
+                    if _attacked(bk, origin, kinds, extras, occupied & ~(1 << wk) | (1 << origin)):
+                        continue
+                    previous = layout.index(origin, bk, extras, False)
+                    if values[previous] == _DRAW_VALUE:
+                        bucket(plies + 1).append(previous)
+
+                for piece_idx, kind in enumerate(kinds):
+                    sq = extras[piece_idx]
+                    for origin in _white_origins(kind, sq, occupied):
+                        moved = extras[:piece_idx] + (origin,) + extras[piece_idx + 1:]
+                        moved_occupied = occupied & ~(1 << sq) | (1 << origin)
+                        if _attacked(bk, wk, kinds, moved, moved_occupied):
+                            continue
+                        previous = layout.index(wk, bk, moved, False)
+                        if values[previous] == _DRAW_VALUE:
+                            bucket(plies + 1).append(previous)
+            else:
+                # The first time a white position comes up is its fastest win
+                if values[idx] != _DRAW_VALUE:
+                    continue
+                values[idx] = (_WIN << 6) | ((plies + 1) // 2)
+
+                predecessors = {layout.index(wk, origin, extras, True) for origin in _KING_TARGETS[bk]
+                                if not occupied >> origin & 1 and origin not in _KING_SETS[wk]}
+                for previous in predecessors:
+                    if values[previous] != _DRAW_VALUE or counts[previous] == 255:
+                        continue
+                    counts[previous] -= 1
+                    if counts[previous] == 0:
+                        values[previous] = (_LOSS << 6) | ((plies + 1) // 2)
+                        bucket(plies + 1).append(previous)
+        buckets[plies] = None
+        plies += 1
+
+    return values
+
+
+def write_table(path: str, name: str, values: bytearray) -> None:
+    with open(path, 'wb') as stream:
+        stream.write(_HEADER.pack(_MAGIC, _VERSION, name.encode('ascii'), len(values)))
+        stream.write(values)
+
+
+class Tablebase:
+    """A generated table, read through mmap.
+
+    Args:
+        path (str): The table file
+
+    Raises:
+        ValueError: If the file is not a tablebase
+    """
+    __slots__ = ('_file', '_map', '_layout')
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, name, size = _HEADER.unpack_from(self._map, 0)
+        name = name.rstrip(b'\0').decode('ascii')
+        if magic != _MAGIC or version != _VERSION or name not in _EXTRA_PIECES:
+            self.close()
+            raise ValueError(f"Not a tablebase: {path}")
+        self._layout = _Layout(name)
+
+    @property
+    def name(self) -> str:
+        return self._layout.name
+
+    def lookup(self, wk: int, bk: int, extras: tuple, black_to_move: bool) -> Optional[Tuple[int, int]]:
+        """Looks up a position given as square indices, white being the
+        side with the extra pieces (in the order of the table's name).
+
+        Returns:
+            (int, int): WIN, DRAW or LOSS for the side to move, and the
+                number of half moves to mate (0 for draws), or None for an
+                illegal position
+        """
+        value = self._map[_HEADER.size + self._layout.index(wk, bk, extras, black_to_move)]
+        result, moves = value >> 6, value & 0x3F
+        if result == _WIN:
+            return WIN, 2 * moves - 1
+        if result == _LOSS:
+            return LOSS, 2 * moves
+        if result == _DRAW:
+            return DRAW, 0
+        return None
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+
+# Tables opened by load(), by material name
+_tables = {}
+
+
+def table_path(directory: str, name: str) -> str:
+    return os.path.join(directory, f"{name}.tb")
+
+
+def load(directory: str) -> List[str]:
+    """Opens every table found in a directory for probe().
+
+    Returns:
+        List[str]: The names of the tables found
+    """
+    for name in MATERIALS:
+        path = table_path(directory, name)
+        if os.path.exists(path):
+            if name in _tables:
+                _tables[name].close()
+            _tables[name] = Tablebase(path)
+    return [name for name in MATERIALS if name in _tables]
+
+
+def probe(board, white_to_move: bool) -> Optional[Tuple[int, int]]:
+    """Looks up a position in the loaded tables.
+
+    Args:
+        board: Any board exposing the ChessBoard interface
+        white_to_move (bool): True if white is to move
+
+    Returns:
+        (int, int): WIN, DRAW or LOSS for the side to move, and the number
+            of half moves to mate, or None if no loaded table covers the
+            position
+    """
+    if not _tables:
+        return None
+
+    # Give up as soon as there are more pieces than any loaded table has,
+    # which is almost always within the first few pieces
+    max_pieces = max(len(name) for name in _tables)
+    count = 0
+    sides = []
+    for white in (True, False):
+        king, extras = None, []
+        for pos, piece in board.pieces(white):
+            count += 1
+            if count > max_pieces:
+                return None
+            if piece in (Piece.WKING, Piece.BKING):
+                king = SQUARE_INDEX[pos]
+            else:
+                extras.append((_LETTER_ORDER.index(_PIECE_LETTERS[piece]), SQUARE_INDEX[pos], piece))
+        sides.append((king, sorted(extras)))
+
+    (white_king, white_extras), (black_king, black_extras) = sides
+    if white_extras and black_extras:
+        return None
+
+    if black_extras:
+        # Swap colors: mirror the ranks and let white be the stronger side
+        strong_king, weak_king = black_king ^ 56, white_king ^ 56
+        extras = black_extras
+        strong_to_move = not white_to_move
+        mirror = 56
+    else:
+        strong_king, weak_king = white_king, black_king
+        extras = white_extras
+        strong_to_move = white_to_move
+        mirror = 0
+
+    name = 'K' + ''.join(_LETTER_ORDER[order] for order, _, _ in extras) + 'K'
+    table = _tables.get(name)
+    if table is None:
+        return None
+    return table.lookup(strong_king, weak_king, tuple(sq ^ mirror for _, sq, _ in extras), not strong_to_move)
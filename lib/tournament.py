@@ -0,0 +1,381 @@
+from lib.agents import AlphaBetaAgent
+from lib.chess import ChessEngine, ChessGame
+from lib.frontend import ChessFEHeadless
+from lib.moves import square_names, underpromotes
+from lib.pieces import Piece
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, NamedTuple, Optional, Tuple
+import math
+import multiprocessing
+import os
+import random
+
+# Game results from white's point of view
+WHITE_WIN, DRAW, BLACK_WIN = 1.0, 0.5, 0.0
+
+# Plies without a capture or pawn move before a game is drawn
+FIFTY_MOVE_PLIES = 100
+
+_MINORS = (Piece.WKNIGHT, Piece.WBISHOP, Piece.BKNIGHT, Piece.BBISHOP)
+
+# Set in the worker processes, tells running games to stop early
+_stop_event = None
+
+
+class AgentSpec(NamedTuple):
+    """Describes how to build a player, so that each worker process can
+    construct its own.
+
+    Attributes:
+        name (str): Player name used in results
+        agent_class (type): A Player subclass taking (name, color, **options)
+        options (dict): Extra keyword arguments for agent_class
+    """
+    name: str
+    agent_class: type = AlphaBetaAgent
+    options: Optional[dict] = None
+
+    def build(self, color: str):
+        return self.agent_class(self.name, color, **(self.options or {}))
+
+
+class GameRecord(NamedTuple):
+    """The outcome of one game.
+
+    Attributes:
+        result (float): WHITE_WIN, DRAW or BLACK_WIN
+        reason (str): How the game ended
+        plies (int): Half moves played after the opening
+        moves (tuple): Every move of the game, opening included, as
+            'e2,e4' strings
+    """
+    result: float
+    reason: str
+    plies: int
+    moves: tuple
+
+
+class TournamentResult(NamedTuple):
+    """Running totals of a match, from agent A's point of view.
+
+    Attributes:
+        wins, draws, losses (int): Game counts
+        elo (float): Estimated Elo difference of A over B
+        elo_margin (float): Half width of the 95% confidence interval
+        llr (float): Log likelihood ratio of the SPRT
+        decision (str): 'H1' if A is stronger by elo1, 'H0' if it is not
+            stronger than elo0, or None if the test is unresolved
+    """
+    wins: int
+    draws: int
+    losses: int
+    elo: float
+    elo_margin: float
+    llr: float
+    decision: Optional[str]
+
+    @property
+    def games(self) -> int:
+        return self.wins + self.draws + self.losses
+
+
+def random_opening(seed: int, plies: int) -> Tuple[ChessEngine, list]:
+    """Plays random legal moves from the initial position.
+
+    Moves that would leave the other side without a legal reply are
+    avoided, so the game always has something left to play.
+
+    Args:
+        seed (int): Seed for the move choices. The same seed always gives
+            the same opening.
+        plies (int): Number of half moves to play
+
+    Returns:
+        (ChessEngine, list): The engine after the opening, and its moves
+    """
+    rng = random.Random(seed)
+    engine = ChessEngine()
+    moves = []
+    for _ in range(plies):
+        white_turn = engine.white_to_move
+        # Pawns only promote to queens
+        candidates = [code for code in engine.legal_moves(white_turn) if not underpromotes(code)]
+        rng.shuffle(candidates)
+        for code in candidates:
+            engine.push_move(code)
+            if engine.has_legal_move(not white_turn):
+                moves.append(','.join(square_names(code)))
+                break
+            engine.pop()
+        else:
+            break
+    return engine, moves
+
+
+def _insufficient_material(engine: ChessEngine) -> bool:
+    # Bare kings, or a single minor piece against a bare king
+    board = engine.game_state
+    others = [piece for white in (True, False) for _, piece in board.pieces(white)
+              if piece not in (Piece.WKING, Piece.BKING)]
+    return len(others) == 0 or (len(others) == 1 and others[0] in _MINORS)
+
+
+def play_game(white: AgentSpec,
+              black: AgentSpec,
+              opening_seed: int = 0,
+              opening_plies: int = 8,
+              max_plies: int = 300,
+              stop=None) -> GameRecord:
+    """Plays one game without any input or output.
+
+    Besides checkmate and stalemate, games are drawn by threefold
+    repetition, the fifty move rule, insufficient material, or by
+    reaching max_plies.
+
+    Args:
+        white (AgentSpec): The white player
+        black (AgentSpec): The black player
+        opening_seed (int): Seed of the random opening
+        opening_plies (int): Length of the random opening
+        max_plies (int): Half moves played after the opening before the
+            game is adjudicated a draw
+        stop (Event): Optional event checked before every move. Once it
+            is set the game is abandoned and scored as an "aborted" draw.
+
+    Returns:
+        GameRecord: The result of the game
+    """
+    engine, opening = random_opening(opening_seed, opening_plies)
+    white_player, black_player = white.build("white"), black.build("black")
+    game = ChessGame(white_player, black_player, frontend=ChessFEHeadless(), engine=engine)
+
+    def record(result, reason, plies):
+        # Each player keeps its own moves, so interleave them back
+        first, second = ((white_player, black_player) if len(opening) % 2 == 0
+                         else (black_player, white_player))
+        moves = list(opening)
+        for idx in range(plies):
+            moves.append((first if idx % 2 == 0 else second).move_list[idx // 2])
+        return GameRecord(result, reason, plies, tuple(moves))
+
+    seen = Counter([engine.position_key])
+
+    try:
+        for ply in range(1, max_plies + 1):
+            if stop is not None and stop.is_set():
+                return record(DRAW, "aborted", ply - 1)
+
+            checkmate, white_turn, end_game, concede = game.move()
+            if checkmate or concede:
+                return record(WHITE_WIN if white_turn else BLACK_WIN,
+                              "checkmate" if checkmate else "resignation", ply)
+            if end_game:
+                return record(DRAW, "stalemate", ply)
+
+            key = engine.position_key
+            seen[key] += 1
+            if seen[key] >= 3:
+                return record(DRAW, "repetition", ply)
+
+            if engine.halfmove_clock >= FIFTY_MOVE_PLIES:
+                return record(DRAW, "fifty moves", ply)
+
+            if _insufficient_material(engine):
+                return record(DRAW, "insufficient material", ply)
+
+        return record(DRAW, "move limit", max_plies)
+    finally:
+        white_player.close()
+        black_player.close()
+
+
+def _expected_score(elo: float) -> float:
+    return 1.0 / (1.0 + 10.0 ** (-elo / 400.0))
+
+
+def _score_to_elo(score: float) -> float:
+    score = min(max(score, 1e-6), 1.0 - 1e-6)
+    return -400.0 * math.log10(1.0 / score - 1.0)
+
+
+def _score_stats(wins: int, draws: int, losses: int) -> Tuple[float, float]:
+    # Mean and per game variance of the match score
+    games = wins + draws + losses
+    score = (wins + 0.5 * draws) / games
+    variance = (wins * (1.0 - score) ** 2 +
+                draws * (0.5 - score) ** 2 +
+                losses * score ** 2) / games
+    return score, variance
+
+
+def elo_difference(wins: int, draws: int, losses: int) -> Tuple[float, float]:
+    """Estimates the Elo difference implied by a match score.
+
+    Returns:
+        (float, float): The Elo difference and the half width of its 95%
+            confidence interval
+    """
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, math.inf
+
+    score, variance = _score_stats(wins, draws, losses)
+    deviation = 1.96 * math.sqrt(variance / games)
+    margin = (_score_to_elo(score + deviation) - _score_to_elo(score - deviation)) / 2
+    return _score_to_elo(score), margin
+
+
+def sprt_llr(wins: int, draws: int, losses: int, elo0: float, elo1: float) -> float:
+    """Log likelihood ratio of H1 (Elo difference elo1) against H0 (Elo
+    difference elo0), using the normal approximation of the score
+    (generalized SPRT)."""
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0
+
+    score, variance = _score_stats(wins, draws, losses)
+    if variance == 0:
+        return 0.0
+
+    score0, score1 = _expected_score(elo0), _expected_score(elo1)
+    return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+def sprt_bounds(alpha: float, beta: float) -> Tuple[float, float]:
+    """Returns the (lower, upper) LLR bounds for the given error rates."""
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def _init_worker(stop) -> None:
+    global _stop_event
+    _stop_event = stop
+
+
+def _play_pairing(args: tuple) -> Tuple[int, GameRecord]:
+    game_idx, agent_a, agent_b, seed, opening_plies, max_plies = args
+
+    # Both games of a pair share an opening, with colors swapped
+    a_is_white = game_idx % 2 == 0
+    white, black = (agent_a, agent_b) if a_is_white else (agent_b, agent_a)
+    return game_idx, play_game(white, black, seed + game_idx // 2, opening_plies, max_plies,
+                               _stop_event)
+
+
+class Tournament:
+    """A headless match between two agents, played across processes.
+
+    Games come in pairs that share a random opening, with each agent
+    playing white once. Play stops once the SPRT accepts either
+    hypothesis or the game limit is reached.
+
+    Args:
+        agent_a (AgentSpec): The agent under test
+        agent_b (AgentSpec): The baseline agent
+        games (int): Maximum number of games
+        workers (int): Number of processes. Defaults to the number of CPUs.
+        opening_plies (int): Length of the random openings
+        max_plies (int): Half moves after the opening before a draw is
+            adjudicated
+        elo0 (float): Elo difference of the null hypothesis
+        elo1 (float): Elo difference of the alternative hypothesis
+        alpha (float): False positive rate of the SPRT
+        beta (float): False negative rate of the SPRT
+        seed (int): Seed of the first opening
+    """
+    __slots__ = ('_agent_a', '_agent_b', '_games', '_workers', '_opening_plies',
+                 '_max_plies', '_elo0', '_elo1', '_alpha', '_beta', '_seed', '_records')
+
+    def __init__(self,
+                 agent_a: AgentSpec,
+                 agent_b: AgentSpec,
+                 games: int = 1000,
+                 workers: int = None,
+                 opening_plies: int = 8,
+                 max_plies: int = 300,
+                 elo0: float = 0.0,
+                 elo1: float = 10.0,
+                 alpha: float = 0.05,
+                 beta: float = 0.05,
+                 seed: int = 0) -> None:
+        self._agent_a, self._agent_b = agent_a, agent_b
+        self._games = games
+        self._workers = workers or os.cpu_count() or 1
+        self._opening_plies = opening_plies
+        self._max_plies = max_plies
+        self._elo0, self._elo1 = elo0, elo1
+        self._alpha, self._beta = alpha, beta
+        self._seed = seed
+        self._records = {}
+
+    @property
+    def records(self) -> dict:
+        """Finished games by game number. Even games have agent A as white."""
+        return self._records
+
+    def result(self) -> TournamentResult:
+        """Summarizes the games finished so far."""
+        wins = draws = losses = 0
+        for game_idx, record in self._records.items():
+            score = record.result if game_idx % 2 == 0 else 1.0 - record.result
+            if score == 1.0:
+                wins += 1
+            elif score == 0.0:
+                losses += 1
+            else:
+                draws += 1
+
+        elo, margin = elo_difference(wins, draws, losses)
+        llr = sprt_llr(wins, draws, losses, self._elo0, self._elo1)
+        lower, upper = sprt_bounds(self._alpha, self._beta)
+        decision = 'H1' if llr >= upper else 'H0' if llr <= lower else None
+        return TournamentResult(wins, draws, losses, elo, margin, llr, decision)
+
+    def run(self, progress: Callable[[TournamentResult], None] = None) -> TournamentResult:
+        """Plays the match.
+
+        Args:
+            progress: Optional callable, given the running result after
+                every finished game
+
+        Returns:
+            TournamentResult: The final result
+        """
+        self._records = {}
+        next_game = 0
+        pending = set()
+
+        stop = multiprocessing.Event()
+        pool = ProcessPoolExecutor(max_workers=self._workers, initializer=_init_worker, initargs=(stop,))
+        try:
+            while True:
+                # Keep every worker busy, with one game queued behind it
+                while next_game < self._games and len(pending) < 2 * self._workers:
+                    pending.add(pool.submit(_play_pairing, (next_game, self._agent_a, self._agent_b,
+                                                            self._seed, self._opening_plies,
+                                                            self._max_plies)))
+                    next_game += 1
+
+                if not pending:
+                    break
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                result = None
+                for future in done:
+                    game_idx, record = future.result()
+                    self._records[game_idx] = record
+                    result = self.result()
+                    if progress is not None:
+                        progress(result)
+
+                if result.decision is not None:
+                    break
+        finally:
+            # Queued games are dropped and running ones give up before
+            # their next move, so the workers are free almost at once
+            stop.set()
+            for future in pending:
+                future.cancel()
+            pool.shutdown()
+
+        return self.result()
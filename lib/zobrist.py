@@ -0,0 +1,52 @@
+from lib.pieces import ALL_PIECES
+import random
+
+# A fixed seed keeps keys identical across processes and runs, so they can
+# be stored (archives, books, shared tables) and compared later.
+_rng = random.Random(0x5EED_C4E55)
+
+# PIECE_SQUARE_KEYS[piece.value][square]. The row for Piece.EMPTY is all
+# zeros so that empty squares never need special casing.
+PIECE_SQUARE_KEYS = [[_rng.getrandbits(64) for _ in range(64)] for _ in ALL_PIECES]
+PIECE_SQUARE_KEYS.append([0] * 64)
+
+WHITE_TO_MOVE_KEY = _rng.getrandbits(64)
+
+# Castling rights are a 4 bit mask, see the constants below
+CASTLING_KEYS = [_rng.getrandbits(64) for _ in range(16)]
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+
+EN_PASSANT_KEYS = [_rng.getrandbits(64) for _ in range(8)]
+
+
+def board_key(board) -> int:
+    """Computes the piece placement key of a board from scratch.
+
+    Args:
+        board: Any board exposing the ChessBoard interface
+
+    Returns:
+        int: XOR of the key of every (piece, square) pair on the board
+    """
+    key = 0
+    for idx in range(64):
+        pos = chr(ord('a') + (idx & 7)) + chr(ord('1') + (idx >> 3))
+        key ^= PIECE_SQUARE_KEYS[board.piece_at(pos).value][idx]
+    return key
+
+
+def state_key(white_to_move: bool, castling_rights: int, en_passant_file: int = None) -> int:
+    """Computes the non-placement part of a position key.
+
+    Args:
+        white_to_move (bool): True if white is to move
+        castling_rights (int): Bitmask of the remaining castling rights
+        en_passant_file (int): File index (0-7) of a pawn that just
+            advanced two squares, if any
+    """
+    key = CASTLING_KEYS[castling_rights]
+    if white_to_move:
+        key ^= WHITE_TO_MOVE_KEY
+    if en_passant_file is not None:
+        key ^= EN_PASSANT_KEYS[en_passant_file]
+    return key
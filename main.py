@@ -1,24 +1,82 @@
 from lib.chess import Player, ChessGame
-import time
+from lib.agents import AlphaBetaAgent
+from lib.book import BookAgent, OpeningBook
+from lib.frontend import ChessFECurses
+from lib.ponder import PonderingAgent
+from lib.profiling import InstrumentedGame, PROFILER
+from lib import tablebase
+import argparse
 
-def init_sequence():
-    p1_name = input("\nPlayer 1, what's your name?\n")
-    p2_name = input("\nPlayer 2, what' your name?\n")
+def init_sequence(computer):
+    if computer in ('white', 'both'):
+        p1_name = "Computer"
+    else:
+        p1_name = input("\nPlayer 1, what's your name?\n")
+    if computer in ('black', 'both'):
+        p2_name = "Computer"
+    else:
+        p2_name = input("\nPlayer 2, what' your name?\n")
     return p1_name, p2_name
 
+def make_player(name, color, computer, think_time, book=None, ponder=False):
+    if computer in (color, 'both'):
+        agent_class = PonderingAgent if ponder else AlphaBetaAgent
+        agent = agent_class(name, color, time_limit=think_time)
+        if book is not None:
+            agent = BookAgent(name, color, book, fallback=agent)
+        return agent
+    return Player(name, color)
+
 def main():
-    p1_name, p2_name = init_sequence()
-    p1 = Player(p1_name, "white")
-    p2 = Player(p2_name, "black")
-
-    game = ChessGame(p1, p2)
-
-    checkmate = False
-    while not checkmate:
-        checkmate, is_white_turn, end_game, concede = game.move()
-        if end_game or concede:
-            break
-    
+    parser = argparse.ArgumentParser(description="Play chess in the terminal.")
+    parser.add_argument("--computer", choices=['white', 'black', 'both'],
+                        help="let the computer play this side")
+    parser.add_argument("--think-time", type=float, default=5.0,
+                        help="seconds the computer may think per move")
+    parser.add_argument("--book", help="opening book file for the computer")
+    parser.add_argument("--tablebases", help="directory of endgame tablebases for the computer")
+    parser.add_argument("--ponder", action="store_true",
+                        help="let the computer keep thinking during your turn")
+    parser.add_argument("--profile", action="store_true",
+                        help="print rule call counts, times and turn latencies at the end")
+    parser.add_argument("--cprofile", metavar="FILE",
+                        help="run every turn under cProfile and dump the stats to FILE")
+    parser.add_argument("--curses", action="store_true",
+                        help="full screen board that only redraws changed squares")
+    args = parser.parse_args()
+
+    if args.tablebases:
+        tablebase.load(args.tablebases)
+
+    book = OpeningBook(args.book) if args.book else None
+
+    p1_name, p2_name = init_sequence(args.computer)
+    p1 = make_player(p1_name, "white", args.computer, args.think_time, book, args.ponder)
+    p2 = make_player(p2_name, "black", args.computer, args.think_time, book, args.ponder)
+
+    frontend = ChessFECurses() if args.curses else None
+    game = None
+    try:
+        if args.profile or args.cprofile:
+            game = InstrumentedGame(p1, p2, frontend=frontend)
+            if args.cprofile:
+                game.start_cprofile(args.cprofile)
+        else:
+            game = ChessGame(p1, p2, frontend=frontend)
+
+        checkmate = False
+        while not checkmate:
+            checkmate, is_white_turn, end_game, concede = game.move()
+            if end_game or concede:
+                break
+    finally:
+        if frontend is not None:
+            frontend.close()
+        if isinstance(game, InstrumentedGame):
+            game.stop_cprofile()
+        for player in (p1, p2):
+            player.close()
+
     if checkmate or concede:
         if is_white_turn:
             print(f"\nCongratulations, {p1_name}, you've won!\n")
@@ -26,7 +84,10 @@ def main():
             print(f"\nCongratulations, {p2_name}, you've won!\n")
     else:
         print("\nThanks for playing!\n")
-        
+
+    if args.profile:
+        print(PROFILER.report())
+
 
 if __name__ == "__main__":
     main()
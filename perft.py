@@ -0,0 +1,53 @@
+from lib.chess import ChessEngine, START_FEN
+import argparse
+import time
+
+# Standard test positions with their published node counts per depth
+POSITIONS = [
+    ("start", START_FEN,
+     [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603]),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624]),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333]),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487]),
+]
+
+
+def run_position(name, fen, expected, max_depth, divide):
+    engine = ChessEngine.from_fen(fen)
+    print(f"\n{name}")
+
+    for depth in range(1, max_depth + 1):
+        start = time.perf_counter()
+        if divide and depth == max_depth:
+            counts = engine.divide(depth)
+            for move, count in sorted(counts.items()):
+                print(f"  {move}: {count}")
+            nodes = sum(counts.values())
+        else:
+            nodes = engine.perft(depth)
+        elapsed = time.perf_counter() - start
+
+        nps = nodes / elapsed if elapsed > 0 else float('inf')
+        status = ""
+        if depth <= len(expected):
+            status = "ok" if nodes == expected[depth - 1] else f"MISMATCH (expected {expected[depth - 1]})"
+        print(f"  depth {depth}: {nodes} nodes in {elapsed:.3f}s ({nps:,.0f} nodes/s) {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft node counts for the chess engine.")
+    parser.add_argument("depth", type=int, nargs="?", default=3, help="maximum depth to search")
+    parser.add_argument("--divide", action="store_true", help="print per-move counts at the maximum depth")
+    args = parser.parse_args()
+
+    for name, fen, expected in POSITIONS:
+        run_position(name, fen, expected, args.depth, args.divide)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+from lib.server import ChessServer
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+
+
+async def serve(args) -> None:
+    executor = ThreadPoolExecutor(max_workers=args.threads)
+    server = ChessServer(executor=executor, think_time=args.think_time)
+    if args.unix:
+        await server.start_unix(args.unix)
+        print(f"Serving on {args.unix}", flush=True)
+    else:
+        await server.start_tcp(args.host, args.port)
+        print(f"Serving on {args.host}:{server.sockets[0].getsockname()[1]}", flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+        # The event loop cancels the games still running as it shuts down,
+        # and with them the rule checks and searches they queued here
+        executor.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host chess games for clients over TCP or a Unix socket.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port to listen on")
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--think-time", type=float, default=1.0, help="seconds per move of the computer")
+    parser.add_argument("--threads", type=int, default=4, help="threads for rule checks and searches")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
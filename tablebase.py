@@ -0,0 +1,117 @@
+from lib import tablebase
+from lib.chess import ChessEngine
+from lib.pieces import FEN_SYMBOLS, Piece
+import argparse
+import os
+import random
+import time
+
+_WHITE_PIECES = {'Q': Piece.WQUEEN, 'R': Piece.WROOK, 'B': Piece.WBISHOP, 'N': Piece.WKNIGHT, 'P': Piece.WPAWN}
+
+
+def build(directory, names):
+    solved = {}
+    for name in tablebase.MATERIALS:
+        path = tablebase.table_path(directory, name)
+        needed = name in names or (name in ('KQK', 'KRK') and 'KPK' in names)
+        if not needed:
+            continue
+        if name not in names and os.path.exists(path):
+            solved[name] = tablebase.Tablebase(path)
+            continue
+
+        start = time.perf_counter()
+        values = tablebase.solve(name, solved)
+        tablebase.write_table(path, name, values)
+        solved[name] = tablebase.Tablebase(path)
+        print(f"{name}: {len(values)} positions in {time.perf_counter() - start:.1f}s -> {path}")
+
+
+def _fen(name, wk, bk, extras, black_to_move):
+    squares = [None] * 64
+    squares[wk], squares[bk] = Piece.WKING, Piece.BKING
+    for letter, sq in zip(name[1:-1], extras):
+        squares[sq] = _WHITE_PIECES[letter]
+
+    ranks = []
+    for rank in range(7, -1, -1):
+        symbols, empty = '', 0
+        for sq in range(rank * 8, rank * 8 + 8):
+            if squares[sq] is None:
+                empty += 1
+                continue
+            if empty:
+                symbols, empty = symbols + str(empty), 0
+            symbols += FEN_SYMBOLS[squares[sq]]
+        ranks.append(symbols + (str(empty) if empty else ''))
+    return f"{'/'.join(ranks)} {'b' if black_to_move else 'w'} - - 0 1"
+
+
+def check(name, samples, seed):
+    """Checks random table entries against ChessEngine: every result must
+    follow from the results of the positions one legal move away."""
+    rng = random.Random(seed)
+    pieces = len(name) - 2
+    checked = 0
+    while checked < samples:
+        wk, bk = rng.randrange(64), rng.randrange(64)
+        extras = tuple(rng.randrange(64) for _ in range(pieces))
+        black_to_move = rng.random() < 0.5
+        if len({wk, bk, *extras}) != 2 + pieces:
+            continue
+        try:
+            engine = ChessEngine.from_fen(_fen(name, wk, bk, extras, black_to_move))
+        except ValueError:
+            continue
+        value = engine.probe_tablebase()
+        if value is None:
+            continue
+
+        white = engine.white_to_move
+        children = []
+        for code in engine.legal_moves(white):
+            engine.push_move(code)
+            children.append(engine.probe_tablebase() or (tablebase.DRAW, 0))
+            engine.pop()
+
+        result, plies = value
+        losses = [child_plies for child_result, child_plies in children if child_result == tablebase.LOSS]
+        if not children:
+            expected = (tablebase.LOSS, 0) if engine.in_check(white) else (tablebase.DRAW, 0)
+        elif losses:
+            expected = (tablebase.WIN, min(losses) + 1)
+        elif all(child_result == tablebase.WIN for child_result, _ in children):
+            expected = (tablebase.LOSS, max(child_plies for _, child_plies in children) + 1)
+        else:
+            expected = (tablebase.DRAW, 0)
+
+        if value != expected:
+            print(f"  MISMATCH {engine.to_fen()}: table {value}, expected {expected}")
+        checked += 1
+    print(f"{name}: checked {checked} positions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and check endgame tablebases.")
+    parser.add_argument("names", nargs="*", default=list(tablebase.MATERIALS),
+                        help=f"material sets to build (default: {' '.join(tablebase.MATERIALS)})")
+    parser.add_argument("--dir", default="tablebases", help="directory holding the tables")
+    parser.add_argument("--check", type=int, metavar="N", default=0,
+                        help="check N random positions of each table instead of building")
+    args = parser.parse_args()
+
+    unknown = set(args.names) - set(tablebase.MATERIALS)
+    if unknown:
+        parser.error(f"unknown material sets: {' '.join(sorted(unknown))}")
+
+    if args.check:
+        tablebase.load(args.dir)
+        for name in args.names:
+            check(name, args.check, seed=0)
+    else:
+        os.makedirs(args.dir, exist_ok=True)
+        build(args.dir, args.names)
+
+
+if __name__ == "__main__":
+    main()
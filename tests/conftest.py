@@ -0,0 +1,40 @@
+from lib.bitboard import BitBoard
+from lib.compact import CompactBoard
+from lib.frontend import ChessBoard
+import pytest
+
+PGN = """[Event "Opera"]
+[White "Morphy"]
+[Black "Duke Karl / Count Isouard"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 d6 3. d4 Bg4 {comment} 4. dxe5 Bxf3 5. Qxf3 dxe5 6. Bc4 Nf6
+7. Qb3 Qe7 8. Nc3 c6 9. Bg5 b5 10. Nxb5 cxb5 11. Bxb5+ Nbd7 12. O-O-O Rd8
+13. Rxd7 Rxd7 14. Rd1 Qe6 15. Bxd7+ Nxd7 16. Qb8+ Nxb8 17. Rd8# 1-0
+
+[Event "Promotion"]
+[FEN "8/P6k/8/8/8/8/6pK/8 w - - 0 1"]
+[Result "*"]
+
+1. a8=N g1=R+ 2. Kxg1 (2. Kh3 Rg3+) Kg6 *
+
+[Event "Broken"]
+[Result "0-1"]
+
+1. e4 e5 2. Ke3 0-1
+"""
+
+
+@pytest.fixture(params=[ChessBoard, BitBoard, CompactBoard],
+                ids=['dict', 'bitboard', 'compact'])
+def board_class(request):
+    """Runs a test once on each board backend."""
+    return request.param
+
+
+@pytest.fixture
+def pgn_path(tmp_path):
+    """A PGN file with a won game, a game from FEN and an illegal game."""
+    path = tmp_path / 'games.pgn'
+    path.write_text(PGN)
+    return str(path)
@@ -0,0 +1,41 @@
+from lib.agents import AlphaBetaAgent, TranspositionTable
+from lib.chess import ChessEngine
+
+
+def engine_after(moves, board=None):
+    engine = ChessEngine(board)
+    for move in moves:
+        engine.push(move)
+    return engine
+
+
+def test_finds_mate_in_one(board_class):
+    engine = engine_after([('f2', 'f3'), ('e7', 'e5'), ('g2', 'g4')], board_class())
+    agent = AlphaBetaAgent('black', 'black', time_limit=5.0, max_depth=2)
+    agent.attach(engine)
+    key = engine.position_key
+    assert agent.specify_move() == 'd8,h4'
+    assert agent.move_list == ['d8,h4']
+    assert engine.position_key == key
+
+
+def test_saves_an_attacked_queen():
+    engine = engine_after([('e2', 'e4'), ('d7', 'd5'), ('d1', 'h5'), ('g8', 'f6')])
+    agent = AlphaBetaAgent('white', 'white', time_limit=5.0, max_depth=3)
+    agent.attach(engine)
+    # The queen is attacked by the knight, so it has to move or be lost
+    move, promotion = agent.search()
+    assert move[0] == 'h5'
+    assert promotion is None
+    assert agent.nodes > 0
+
+
+def test_table_replaces_by_slot_instead_of_emptying():
+    table = TranspositionTable(4)
+    for key in range(4):
+        table.store(key, 1, key, AlphaBetaAgent.EXACT, ('e2', 'e4'), None)
+    table.store(6, 2, 60, AlphaBetaAgent.LOWER, ('d2', 'd4'), None)
+    assert len(table) == 4
+    assert table.get(2) is None
+    assert table.get(6) == (2, 60, AlphaBetaAgent.LOWER, ('d2', 'd4'), None)
+    assert table.get(1) == (1, 1, AlphaBetaAgent.EXACT, ('e2', 'e4'), None)
@@ -0,0 +1,46 @@
+from lib.archive import ArchiveWriter, GameArchive, convert_pgn, pack_move, unpack_move
+from lib.chess import ChessEngine
+from lib.pgn import read_games, san_to_move
+from lib.pieces import Piece
+
+
+def test_pack_move_round_trip():
+    for move, promotion, white in ((('e2', 'e4'), None, True), (('a7', 'a8'), Piece.WKNIGHT, True),
+                                   (('h2', 'h1'), Piece.BROOK, False), (('h8', 'a1'), None, False)):
+        code = pack_move(move, promotion)
+        assert 0 <= code < 1 << 16
+        assert unpack_move(code, white) == (move, promotion)
+
+
+def test_archive_round_trip(pgn_path, tmp_path):
+    archive_path = str(tmp_path / 'games.cga')
+    assert convert_pgn(pgn_path, archive_path) == (2, 1)
+
+    games = list(read_games(pgn_path))
+    with GameArchive(archive_path) as archive:
+        assert len(archive) == 2
+        for idx, game in enumerate(games[:2]):
+            header = archive.header(idx)
+            assert header.plies == len(game.moves)
+            assert header.result == game.result
+            assert header.fen == game.headers.get('FEN')
+
+            # Same moves as the PGN, and the same final position
+            engine = ChessEngine.from_fen(header.fen) if header.fen else ChessEngine()
+            for (move, promotion), san in zip(archive.moves(idx), game.moves):
+                assert san_to_move(engine, san) == (move, promotion)
+                engine.push(move, promotion)
+            assert archive.replay(idx).to_fen() == engine.to_fen()
+
+        assert archive.replay(0, plies=4).to_fen() == 'rnbqkbnr/ppp2ppp/3p4/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 0 3'
+
+
+def test_archive_writer_keeps_moves_as_given(tmp_path):
+    path = str(tmp_path / 'raw.cga')
+    moves = [(('e2', 'e4'), None), (('e7', 'e5'), None)]
+    with ArchiveWriter(path) as writer:
+        writer.add_game(moves, '1/2-1/2')
+        writer.add_game([], '*', '8/8/8/8/8/8/8/K6k w - - 0 1')
+    with GameArchive(path) as archive:
+        assert archive.moves(0) == moves
+        assert archive.header(1).plies == 0
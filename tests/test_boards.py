@@ -0,0 +1,105 @@
+from lib.bitboard import SQUARES
+from lib.agents import Player
+from lib.chess import ChessEngine, ChessGame
+from lib.compact import CompactBoard
+from lib.frontend import ChessBoard
+from lib.pieces import Piece
+import pytest
+import random
+import sys
+
+# Bytes a game on a CompactBoard may keep between moves
+GAME_SIZE_BUDGET = 512
+
+
+def legal_moves(engine, white):
+    found = []
+    for pos, _ in list(engine.game_state.pieces(white)):
+        for target in SQUARES:
+            consequences = engine.move_implications(pos, target, white)
+            if consequences:
+                found.append(((pos, target), consequences))
+    return found
+
+
+def apply(engine, consequences, white):
+    # The same order as ChessGame.move: captures, movements, promotions
+    for pos, target in consequences:
+        if pos is not None and target is None:
+            engine.remove_piece(pos)
+    for pos, target in consequences:
+        if pos is not None and target is not None:
+            engine.make_move(pos, target)
+    for pos, target in consequences:
+        if pos is None and target is not None:
+            engine.promote(target, Piece.WQUEEN if white else Piece.BQUEEN)
+
+
+def squares(board):
+    return [(board.piece_at(pos), board.has_moved(pos)) for pos in SQUARES]
+
+
+def test_backend_matches_dict_board(board_class):
+    rng = random.Random(3)
+    reference, engine = ChessEngine(ChessBoard()), ChessEngine(board_class())
+    white = True
+    for _ in range(40):
+        moves = legal_moves(reference, white)
+        assert legal_moves(engine, white) == moves
+        if not moves:
+            break
+        _, consequences = rng.choice(moves)
+        apply(reference, consequences, white)
+        apply(engine, consequences, white)
+        assert squares(engine.game_state) == squares(reference.game_state)
+        assert sorted(engine.game_state.pieces(white)) == sorted(reference.game_state.pieces(white))
+        white = not white
+
+
+@pytest.mark.parametrize('board_class', [ChessBoard, CompactBoard])
+def test_core_classes_have_no_instance_dict(board_class):
+    engine = ChessEngine(board_class())
+    assert not hasattr(engine, '__dict__')
+    assert not hasattr(engine.game_state, '__dict__')
+
+
+def deep_size(obj, seen):
+    # Counts the objects only this engine holds: classes, pieces, None,
+    # booleans and small ints are shared by every game
+    if id(obj) in seen or obj is None or isinstance(obj, (type, Piece, bool)):
+        return 0
+    if isinstance(obj, int) and -5 <= obj <= 256:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        return size + sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return size + sum(deep_size(item, seen) for item in obj)
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, '__slots__', ()):
+            if hasattr(obj, name):
+                size += deep_size(getattr(obj, name), seen)
+    return size
+
+
+def test_compact_game_fits_size_budget():
+    engine = ChessEngine(CompactBoard())
+    assert deep_size(engine, set()) <= GAME_SIZE_BUDGET
+    game = ChessGame(Player('White', 'white'), Player('Black', 'black'), engine=engine)
+    for move in (('e2', 'e4'), ('e7', 'e5'), ('g1', 'f3'), ('b8', 'c6'), ('f1', 'c4'), ('g8', 'f6')):
+        assert game.apply(move).legal
+        assert deep_size(engine, set()) <= GAME_SIZE_BUDGET
+
+
+def test_board_setter_keeps_has_moved_flags(board_class):
+    board = board_class()
+    board.move_piece('e2', 'e4')
+    board.move_piece('g1', 'f3')
+    start = board_class()
+    placement = {row: {col: start.piece_at(col + row) for col in start.cols} for row in start.rows}
+    board.board = placement
+    assert [board.has_moved(pos) for pos in SQUARES[:16]] == [pos in ('e2', 'g1') for pos in SQUARES[:16]]
+    assert board.has_moved('e4') and board.has_moved('f3')
+    assert sorted(board.pieces(True)) == sorted(start.pieces(True))
+    assert board.zobrist_key == start.zobrist_key
@@ -0,0 +1,63 @@
+from lib.agents import AlphaBetaAgent, Player
+from lib.archive import convert_pgn, pack_move
+from lib.book import BookAgent, OpeningBook, book_from_archive, write_book
+from lib.chess import ChessEngine
+import random
+
+
+def test_book_round_trip(pgn_path, tmp_path):
+    archive_path, book_path = str(tmp_path / 'games.cga'), str(tmp_path / 'games.book')
+    convert_pgn(pgn_path, archive_path)
+    # Only decided games count, and white won the only one
+    assert book_from_archive(archive_path, book_path, max_plies=6) == 3
+
+    with OpeningBook(book_path) as book:
+        engine = ChessEngine()
+        assert book.moves(engine) == [(('e2', 'e4'), None, 2)]
+        assert book.choose(engine, random.Random(1)) == (('e2', 'e4'), None)
+        engine.push(('e2', 'e4'))
+        # Moves of the losing side are left out
+        assert book.moves(engine) == []
+        engine.push(('e7', 'e5'))
+        assert book.choose(engine) == (('g1', 'f3'), None)
+        engine.push(('d2', 'd4'))
+        assert book.choose(engine) is None
+
+
+def test_book_weights_add_up(tmp_path):
+    path = str(tmp_path / 'weights.book')
+    key = ChessEngine().position_key
+    e4, d4 = pack_move(('e2', 'e4')), pack_move(('d2', 'd4'))
+    assert write_book(path, [(key, e4, 1), (key, d4, 2), (key, e4, 3), (1, d4, 0)]) == 2
+    with OpeningBook(path) as book:
+        assert book.lookup(key) == [(e4, 4), (d4, 2)]
+        assert book.lookup(key + 1) == []
+
+
+def test_book_agent_leaves_the_book(tmp_path):
+    path = str(tmp_path / 'one.book')
+    engine = ChessEngine()
+    write_book(path, [(engine.position_key, pack_move(('d2', 'd4')), 1)])
+    with OpeningBook(path) as book:
+        agent = BookAgent("Computer", "white", book, fallback=AlphaBetaAgent("Computer", "white", max_depth=1))
+        agent.attach(engine)
+        assert agent.specify_move() == 'd2,d4' and agent.in_book
+        engine.push(('d2', 'd4'))
+        engine.push(('d7', 'd5'))
+        agent.specify_move()
+        assert not agent.in_book
+        assert agent.move_list[0] == 'd2,d4' and len(agent.move_list) == 2
+
+
+def test_book_agent_closes_its_fallback(tmp_path):
+    class Fallback(Player):
+        closed = False
+
+        def close(self):
+            Fallback.closed = True
+
+    path = str(tmp_path / 'empty.book')
+    write_book(path, [])
+    with OpeningBook(path) as book:
+        BookAgent("Computer", "white", book, fallback=Fallback("Computer", "white")).close()
+    assert Fallback.closed
@@ -0,0 +1,42 @@
+from lib.cache import LRUCache
+from lib.chess import ChessEngine
+import pickle
+import pytest
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert (cache.hits, cache.misses, len(cache)) == (3, 1, 2)
+    assert cache.hit_rate == 0.75
+
+
+def test_lru_cache_pickles_empty():
+    cache = LRUCache(8)
+    cache.put('a', 1)
+    copy = pickle.loads(pickle.dumps(cache))
+    assert len(copy) == 0 and copy.max_entries == 8
+    with pytest.raises(ValueError):
+        LRUCache(0)
+
+
+def test_move_cache_counts_repeated_lookups():
+    engine = ChessEngine(cache_size=4)
+    assert engine.move_implications('e2', 'e4', True) == [('e2', 'e4')]
+    assert engine.move_implications('e2', 'e4', True) == [('e2', 'e4')]
+    assert engine.move_cache.hits == 1
+    assert ChessEngine(cache_size=0).move_cache is None
+
+
+def test_move_cache_hands_out_copies():
+    engine = ChessEngine(cache_size=4)
+    first = engine.move_implications('e2', 'e4', True)
+    first.append((None, None))
+    assert engine.move_implications('e2', 'e4', True) == [('e2', 'e4')]
+    assert engine.move_cache.hits == 1
+    assert ChessEngine().move_cache is None
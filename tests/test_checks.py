@@ -0,0 +1,68 @@
+from lib.bitboard import SQUARE_INDEX
+from lib.chess import ChessEngine
+from lib.pieces import Piece
+import random
+
+
+def mask(*squares):
+    return sum(1 << SQUARE_INDEX[pos] for pos in squares)
+
+
+def test_pinned_piece_keeps_to_its_ray(board_class):
+    engine = ChessEngine.from_fen('4k3/4r3/8/8/8/8/4R3/4K3 w - - 0 1', board_class())
+    checkers, _, pinned, _ = engine.king_lines(True)
+    assert checkers == 0
+    assert pinned == {SQUARE_INDEX['e2']: mask('e2', 'e3', 'e4', 'e5', 'e6', 'e7')}
+    rook_moves = {p2 for p1, p2 in engine.iter_legal_moves(True) if p1 == 'e2'}
+    assert rook_moves == {'e3', 'e4', 'e5', 'e6', 'e7'}
+
+
+def test_double_check_leaves_only_king_moves(board_class):
+    engine = ChessEngine.from_fen('4k3/8/8/8/8/5n2/3Q4/4K2r w - - 0 1', board_class())
+    checkers, _, _, _ = engine.king_lines(True)
+    assert checkers == mask('h1', 'f3')
+    assert {p1 for p1, _ in engine.iter_legal_moves(True)} == {'e1'}
+
+
+def test_single_check_must_capture_or_block(board_class):
+    engine = ChessEngine.from_fen('4k3/8/8/8/8/3Q4/8/4K2r w - - 0 1', board_class())
+    _, evasions, _, _ = engine.king_lines(True)
+    assert evasions == mask('f1', 'g1', 'h1')
+    assert {p2 for p1, p2 in engine.iter_legal_moves(True) if p1 == 'd3'} == {'f1'}
+
+
+def test_discovered_check_is_flagged(board_class):
+    engine = ChessEngine.from_fen('4k3/8/8/8/8/8/4B3/4R1K1 w - - 0 1', board_class())
+    assert (None, None) in engine.move_implications('e2', 'd3', True)
+    engine.push(('e2', 'd3'))
+    assert engine.in_check(False)
+
+
+def test_check_flag_matches_played_position(board_class):
+    rng = random.Random(11)
+    for _ in range(3):
+        engine = ChessEngine(board_class())
+        for _ in range(100):
+            white = engine.white_to_move
+            moves = list(engine.iter_legal_moves(white))
+            if not moves:
+                break
+            for p1, p2 in moves:
+                consequences = engine.move_implications(p1, p2, white)
+                flagged = (None, None) in consequences
+                promotes = any(item[0] is None and item[1] is not None for item in consequences)
+                engine.push((p1, p2))
+                # Promotions carry no flag, the piece is not known yet
+                assert flagged == (engine.in_check(not white) and not promotes), (engine.to_fen(), p1, p2)
+                engine.pop()
+            engine.push(rng.choice(moves))
+
+
+def test_promotions_carry_no_check_flag():
+    engine = ChessEngine.from_fen('7k/P7/8/8/8/8/8/K7 w - - 0 1')
+    assert (None, None) not in engine.move_implications('a7', 'a8', True)
+    engine.push(('a7', 'a8'), Piece.WKNIGHT)
+    assert not engine.in_check(False)
+    engine.pop()
+    engine.push(('a7', 'a8'), Piece.WROOK)
+    assert engine.in_check(False)
@@ -0,0 +1,39 @@
+from lib.chess import ChessEngine
+from lib.evaluation import evaluate
+import pytest
+
+POSITIONS = [
+    None,
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+    'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R b KQ - 1 8',
+]
+
+
+def engines():
+    return [ChessEngine.from_fen(fen) if fen else ChessEngine() for fen in POSITIONS]
+
+
+def test_evaluate_is_symmetric():
+    for engine in engines():
+        assert evaluate(engine, True) == -evaluate(engine, False)
+    assert evaluate(ChessEngine()) == 0
+
+
+def test_batch_matches_evaluate():
+    # Only the batch API needs numpy, see the "batch" extra
+    np = pytest.importorskip("numpy")
+    from lib.evaluation import evaluate_batch, stack_positions
+
+    positions = engines()
+    stacked = stack_positions(positions)
+    assert stacked.shape == (len(positions), 64) and stacked.dtype == np.int8
+
+    expected = [evaluate(engine, True) for engine in positions]
+    assert evaluate_batch(stacked, mobility_weight=0).tolist() == expected
+    to_move = [engine.white_to_move for engine in positions]
+    assert (evaluate_batch(positions, to_move, mobility_weight=0).tolist() ==
+            [evaluate(engine) for engine in positions])
+    # Positions are scored the same whichever chunk they land in
+    assert (evaluate_batch(stacked, chunk_size=3).tolist() ==
+            evaluate_batch(stacked).tolist())
@@ -0,0 +1,61 @@
+from lib.chess import ChessEngine, START_FEN
+from lib.pieces import Piece
+import pytest
+
+FENS = [
+    START_FEN,
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3',
+    'rnbqkbnr/pppp1ppp/8/8/3Pp3/8/PPP1PPPP/RNBQKBNR b Kq d3 0 4',
+    '8/P6k/8/8/8/8/6pK/8 w - - 12 60',
+]
+
+
+@pytest.mark.parametrize('fen', FENS)
+def test_fen_round_trip(board_class, fen):
+    engine = ChessEngine.from_fen(fen, board_class())
+    assert engine.to_fen() == fen
+    assert ChessEngine.from_fen(engine.to_fen()).position_key == engine.position_key
+
+
+def test_new_engine_matches_start_fen(board_class):
+    assert ChessEngine(board_class()).to_fen() == START_FEN
+    assert ChessEngine(board_class()).position_key == ChessEngine.from_fen(START_FEN).position_key
+
+
+@pytest.mark.parametrize('fen', ['', 'rnbqkbnr/pppppppp w KQkq - 0 1', START_FEN.replace(' w ', ' x '),
+                                 '8/8/8/8/8/8/8/8 w - - 0 1', START_FEN.replace('KQkq', 'KX')])
+def test_bad_fen_is_rejected(fen):
+    with pytest.raises(ValueError):
+        ChessEngine.from_fen(fen)
+
+
+def test_en_passant_and_castling():
+    engine = ChessEngine.from_fen('r3k2r/8/8/8/3p4/8/4P3/R3K2R w KQkq - 0 1')
+    engine.push(('e2', 'e4'))
+    assert engine.en_passant_square() == 'e3'
+    engine.push(('d4', 'e3'))
+    assert engine.game_state.piece_at('e4') == Piece.EMPTY
+    engine.push(('e1', 'g1'))
+    assert engine.game_state.piece_at('f1') == Piece.WROOK
+    assert engine.to_fen() == 'r3k2r/8/8/8/8/4p3/8/R4RK1 b kq - 1 2'
+
+
+def test_pop_restores_the_clocks():
+    engine = ChessEngine.from_fen(FENS[4])
+    engine.push(('a7', 'a8'), Piece.WQUEEN)
+    assert engine.to_fen() == 'Q7/7k/8/8/8/8/6pK/8 b - - 0 60'
+    engine.pop()
+    assert engine.to_fen() == FENS[4]
+
+
+def test_castling_rights_need_king_and_rook_at_home(board_class):
+    engine = ChessEngine.from_fen('4k3/8/8/8/8/8/8/4K3 w KQkq - 0 1', board_class())
+    assert engine.to_fen() == '4k3/8/8/8/8/8/8/4K3 w - - 0 1'
+    assert engine.move_implications('e1', 'g1', True) == []
+    assert {p2 for p1, p2 in engine.iter_legal_moves(True)} == {'d1', 'd2', 'e2', 'f2', 'f1'}
+
+    # Only the rights whose rook is still there survive
+    engine = ChessEngine.from_fen('r3k3/8/8/8/8/8/8/4K2R w KQkq - 0 1', board_class())
+    assert engine.to_fen() == 'r3k3/8/8/8/8/8/8/4K2R w Kq - 0 1'
+    assert engine.position_key == ChessEngine.from_fen(engine.to_fen()).position_key
@@ -0,0 +1,77 @@
+from lib.frontend import ChessBoard, ChessFECurses, ChessFEUnicode
+
+START = ("   _ _ _ _ _ _ _ _\n"
+         "8 |♖|♘|♗|♕|♔|♗|♘|♖|\n"
+         "7 |♙|♙|♙|♙|♙|♙|♙|♙|\n"
+         "6 |_|_|_|_|_|_|_|_|\n"
+         "5 |_|_|_|_|_|_|_|_|\n"
+         "4 |_|_|_|_|_|_|_|_|\n"
+         "3 |_|_|_|_|_|_|_|_|\n"
+         "2 |♟|♟|♟|♟|♟|♟|♟|♟|\n"
+         "1 |♜|♞|♝|♛|♚|♝|♞|♜|\n"
+         "   a b c d e f g h\n\n")
+
+AFTER_NF3 = ("   _ _ _ _ _ _ _ _\n"
+             "8 |♖|♘|♗|♕|♔|♗|♘|♖|\n"
+             "7 |♙|♙|♙|♙|♙|♙|♙|♙|\n"
+             "6 |_|_|_|_|_|_|_|_|\n"
+             "5 |_|_|_|_|_|_|_|_|\n"
+             "4 |_|_|_|_|_|_|_|_|\n"
+             "3 |_|_|_|_|_|♞|_|_|\n"
+             "2 |♟|♟|♟|♟|♟|♟|♟|♟|\n"
+             "1 |♜|♞|♝|♛|♚|♝|_|♜|\n"
+             "   a b c d e f g h\n\n")
+
+
+class StubWindow:
+    """Records what a curses frontend writes, in place of a terminal."""
+    def __init__(self):
+        self.writes = []
+
+    def addstr(self, row, col, text):
+        self.writes.append((row, col, text))
+
+    def erase(self):
+        self.writes.clear()
+
+    def refresh(self):
+        pass
+
+
+def test_render_start_position(board_class):
+    assert ChessFEUnicode(board_class()).render_state() == START
+
+
+def test_render_after_a_move(board_class):
+    board = board_class()
+    board.move_piece('g1', 'f3')
+    assert ChessFEUnicode(board).render_state() == AFTER_NF3
+
+
+def test_curses_draws_the_whole_board_once():
+    frontend = ChessFECurses(ChessBoard())
+    frontend._screen = StubWindow()
+    frontend.display_state()
+    assert frontend._screen.writes == [(row, 0, line) for row, line in enumerate(START.splitlines())]
+
+
+def test_curses_repaints_only_changed_squares():
+    board = ChessBoard()
+    frontend = ChessFECurses(board)
+    screen = frontend._screen = StubWindow()
+    frontend.display_state()
+
+    screen.writes.clear()
+    frontend.display_state()
+    assert screen.writes == []
+
+    # Squares are drawn on row 8 - rank, column 3 + 2 * file
+    board.move_piece('g1', 'f3')
+    frontend.display_state()
+    assert sorted(screen.writes) == [(6, 13, '♞'), (8, 15, '_')]
+
+    # A new board is drawn in full
+    screen.writes.clear()
+    frontend.state = ChessBoard()
+    frontend.display_state()
+    assert len(screen.writes) == len(START.splitlines())
@@ -0,0 +1,108 @@
+from lib.agents import Player
+from lib.chess import ChessEngine, ChessGame, MoveResult
+from lib.frontend import ChessFEHeadless
+from lib.pieces import Piece
+import pytest
+
+
+def new_game(fen=None):
+    engine = ChessEngine.from_fen(fen) if fen else ChessEngine()
+    return ChessGame(Player('White', 'white'), Player('Black', 'black'), frontend=ChessFEHeadless(), engine=engine)
+
+
+def test_apply_plays_moves():
+    game = new_game()
+    result = game.apply(('e2', 'e4'))
+    assert result == MoveResult(('e2', 'e4'), True, [], None, False, False, False, False)
+    assert not game.white_to_move
+    assert game.engine.game_state.piece_at('e4') == Piece.WPAWN
+
+
+def test_apply_refuses_illegal_moves():
+    game = new_game()
+    result = game.apply(('e2', 'e5'))
+    assert not result.legal and not result.game_over
+    assert game.white_to_move
+    assert game.engine.to_fen() == ChessEngine().to_fen()
+
+
+def test_apply_reports_captures():
+    game = new_game()
+    for move in (('e2', 'e4'), ('d7', 'd5')):
+        game.apply(move)
+    result = game.apply(('e4', 'd5'))
+    assert result.captures == [Piece.BPAWN]
+    assert game.captured_pieces == [Piece.BPAWN]
+
+
+def test_apply_reports_checkmate():
+    game = new_game()
+    for move in (('f2', 'f3'), ('e7', 'e5'), ('g2', 'g4')):
+        assert not game.apply(move).game_over
+    result = game.apply(('d8', 'h4'))
+    assert result.check and result.checkmate and result.game_over and not result.stalemate
+    assert game.game_over
+    with pytest.raises(RuntimeError):
+        game.apply(('a2', 'a3'))
+
+
+def test_apply_reports_stalemate():
+    game = new_game('k7/8/1Q6/8/8/8/8/7K w - - 0 1')
+    result = game.apply(('b6', 'c7'))
+    assert result.stalemate and result.game_over and not result.check
+
+
+def test_apply_promotions():
+    game = new_game('7k/P7/8/8/8/8/8/K7 w - - 0 1')
+    assert game.promotes(('a7', 'a8')) and not game.promotes(('a1', 'a2'))
+    result = game.apply(('a7', 'a8'), Piece.WKNIGHT)
+    assert result.promotion == Piece.WKNIGHT
+    assert game.engine.game_state.piece_at('a8') == Piece.WKNIGHT
+
+    # A queen unless told otherwise
+    game = new_game('7k/P7/8/8/8/8/8/K7 w - - 0 1')
+    result = game.apply(('a7', 'a8'))
+    assert result.promotion == Piece.WQUEEN and result.check
+
+
+class ScriptedPlayer(Player):
+    def __init__(self, name, color, moves):
+        super().__init__(name, color)
+        self.script = list(moves)
+
+    def specify_move(self):
+        move = self.script.pop(0)
+        self.move_list.append(move)
+        return move
+
+
+def test_move_plays_through_the_frontend():
+    white = ScriptedPlayer('White', 'white', ['f2,f3', 'e2,e5', 'g2,g4'])
+    black = ScriptedPlayer('Black', 'black', ['e7,e5', 'd8,h4'])
+    game = ChessGame(white, black, frontend=ChessFEHeadless())
+    outcomes = [game.move() for _ in range(4)]
+    # Invalid input is asked again, and checkmate reports the winner
+    assert outcomes == [(False, False, False, False), (False, True, False, False),
+                        (False, False, False, False), (True, False, False, False)]
+    assert white.script == [] and black.script == []
+
+
+def test_concede():
+    game = ChessGame(ScriptedPlayer('White', 'white', ['resign']), Player('Black', 'black'),
+                     frontend=ChessFEHeadless())
+    assert game.move() == (False, False, False, True)
+
+
+def test_apply_prints_nothing(capsys):
+    game = ChessGame(Player('White', 'white'), Player('Black', 'black'))
+    game.apply(('e2', 'e4'))
+    assert capsys.readouterr().out == ''
+
+
+def test_computer_players_are_not_human():
+    from lib.agents import AlphaBetaAgent
+    from lib.book import BookAgent
+    assert Player('White', 'white').is_human
+    agent = AlphaBetaAgent('Computer', 'black')
+    assert not agent.is_human
+    assert not BookAgent('Computer', 'black', book=None, fallback=agent).is_human
@@ -0,0 +1,137 @@
+from lib.bitboard import SQUARES
+from lib.chess import ChessEngine
+from lib.pieces import Piece
+import pytest
+import random
+
+FOOLS_MATE = [('f2', 'f3'), ('e7', 'e5'), ('g2', 'g4'), ('d8', 'h4')]
+# Sam Loyd's ten move stalemate
+LOYD_STALEMATE = [('e2', 'e3'), ('a7', 'a5'), ('d1', 'h5'), ('a8', 'a6'),
+                  ('h5', 'a5'), ('h7', 'h5'), ('h2', 'h4'), ('a6', 'h6'),
+                  ('a5', 'c7'), ('f7', 'f6'), ('c7', 'd7'), ('e8', 'f7'),
+                  ('d7', 'b7'), ('d8', 'd3'), ('b7', 'b8'), ('d3', 'h7'),
+                  ('b8', 'c8'), ('f7', 'g6'), ('c8', 'e6')]
+KIWIPETE = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1'
+
+
+def play(engine, moves, white=True):
+    for move in moves:
+        engine.push(move)
+        white = not white
+    return white
+
+
+def test_move_counts(board_class):
+    engine = ChessEngine(board_class())
+    assert len(list(engine.iter_legal_moves(True))) == 20
+    white = play(engine, [('e2', 'e4'), ('e7', 'e5')])
+    moves = set(engine.iter_legal_moves(white))
+    assert len(moves) == 29
+    assert ('e4', 'e5') not in moves
+    assert ('f1', 'a6') in moves
+
+
+def test_check_must_be_answered(board_class):
+    engine = ChessEngine(board_class())
+    white = play(engine, [('d2', 'd4'), ('e7', 'e5'), ('d4', 'e5'), ('f8', 'b4')])
+    moves = set(engine.iter_legal_moves(white))
+    assert ('c2', 'c3') in moves
+    # Only blocks on c3 or d2 and king moves off the diagonal are legal
+    assert all(p1 != 'e5' for p1, _ in moves)
+    assert ('e1', 'd2') not in moves
+
+
+def test_checkmate(board_class):
+    engine = ChessEngine(board_class())
+    white = play(engine, FOOLS_MATE)
+    assert engine.checkmate(white)
+    assert not engine.stalemate(white)
+
+
+def test_stalemate(board_class):
+    engine = ChessEngine(board_class())
+    white = play(engine, LOYD_STALEMATE)
+    assert engine.stalemate(white)
+    assert not engine.checkmate(white)
+    assert not engine.has_legal_move(white)
+
+
+def attacked(engine, by_white):
+    return [pos for pos in SQUARES if engine.square_is_attacked(pos, by_white)]
+
+
+def test_start_position_attacks(board_class):
+    engine = ChessEngine(board_class())
+    assert {col + '3' for col in 'abcdefgh'} <= set(attacked(engine, True))
+    assert 'a1' not in attacked(engine, True) and 'h1' not in attacked(engine, True)
+    assert not any(pos[1] in '45' for pos in attacked(engine, False) + attacked(engine, True))
+
+
+def test_attack_maps_match_a_fresh_engine(board_class):
+    rng = random.Random(9)
+    engine = ChessEngine(board_class())
+    white = True
+    for _ in range(60):
+        moves = list(engine.iter_legal_moves(white))
+        if not moves:
+            break
+        white = play(engine, [rng.choice(moves)], white)
+        rebuilt = ChessEngine(engine.game_state)
+        for by_white in (True, False):
+            assert attacked(engine, by_white) == attacked(rebuilt, by_white)
+
+
+def attack_state(engine):
+    return (list(engine._attack_table()), bytes(engine._attack_counts),
+            engine._attack_map(0), engine._attack_map(1))
+
+
+@pytest.mark.parametrize('fen', [None, KIWIPETE])
+def test_attack_table_updates_match_a_rebuild(board_class, fen):
+    for seed in range(4):
+        rng = random.Random(seed)
+        engine = ChessEngine(board_class()) if fen is None else ChessEngine.from_fen(fen, board_class())
+        table = engine._attack_table()
+        maps = engine._attack_maps
+        history = []
+        for _ in range(150):
+            codes = engine.legal_moves(engine.white_to_move)
+            if not codes:
+                break
+            history.append(attack_state(engine))
+            engine.push_move(rng.choice(codes))
+            # Updated in place rather than rebuilt
+            assert engine._attacks is table and engine._attack_maps is maps
+            assert engine._attacks_key == engine.game_state.zobrist_key
+            assert attack_state(engine) == attack_state(ChessEngine.from_fen(engine.to_fen(), board_class()))
+        while history:
+            engine.pop()
+            assert engine._attacks is table and engine._attack_maps is maps
+            assert attack_state(engine) == history.pop()
+
+
+def test_direct_changes_update_the_attack_table(board_class):
+    engine = ChessEngine(board_class())
+    table = engine._attack_table()
+    maps = engine._attack_maps
+    engine.make_move('e2', 'e4')
+    engine.remove_piece('d7')
+    engine.make_move('f1', 'b5')
+    engine.promote('a2', Piece.WQUEEN)
+    engine.make_hypothetical_move('d8', 'd2')
+    assert engine._attacks is table and engine._attack_maps is maps
+    assert attack_state(engine) == attack_state(ChessEngine(engine.game_state))
+
+
+def test_commit_keeps_the_attack_table_and_release_drops_it():
+    engine = ChessEngine()
+    table = engine._attack_table()
+    engine.push(('e2', 'e4'))
+    engine.commit()
+    assert engine._attacks is table
+    assert engine.square_is_attacked('f3', True)
+    engine.release()
+    assert engine._attacks is None and engine._attack_maps is None
+    # Rebuilt by the next threat query
+    assert engine.square_is_attacked('f3', True)
+    assert engine._attacks is not None
@@ -0,0 +1,84 @@
+from lib import moves
+from lib.bitboard import SQUARES, SQUARE_INDEX
+from lib.chess import ChessEngine
+from lib.moves import square_names, underpromotes
+from lib.pieces import Piece
+import random
+
+KIWIPETE = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1'
+FENS = [
+    KIWIPETE,
+    'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3',
+    'rnbqkbnr/pppp1ppp/8/8/3Pp3/8/PPP1PPPP/RNBQKBNR b Kq d3 0 4',
+    '8/P6k/8/8/8/8/6pK/8 w - - 12 60',
+]
+
+
+def snapshot(engine):
+    board = engine.game_state
+    squares = tuple((board.piece_at(pos), board.has_moved(pos)) for pos in SQUARES)
+    return engine.to_fen(), engine.position_key, squares
+
+
+def test_code_round_trip():
+    code = moves.encode(SQUARE_INDEX['e7'], SQUARE_INDEX['d8'], Piece.BKNIGHT, moves.CAPTURE)
+    assert moves.square_names(code) == ('e7', 'd8')
+    assert moves.promotion_piece(code, False) == Piece.BKNIGHT
+    assert moves.promotion_piece(code, True) == Piece.WKNIGHT
+    assert moves.word(code) == moves.from_squares(('e7', 'd8'), Piece.BKNIGHT) < 1 << 16
+    assert moves.to_string(code) == 'e7,d8k'
+    assert moves.to_string(moves.from_squares(('e2', 'e4'))) == 'e2,e4'
+
+
+def test_legal_moves_carry_flags(board_class):
+    codes = ChessEngine.from_fen(KIWIPETE, board_class()).legal_moves(True)
+    assert len(codes) == 48
+    assert sum(1 for code in codes if code & moves.CAPTURE) == 8
+    castles = sorted(moves.square_names(code) for code in codes if code & moves.CASTLE)
+    assert castles == [('e1', 'c1'), ('e1', 'g1')]
+    assert sum(1 for code in codes if code & moves.DOUBLE_STEP) == 2
+
+
+def test_push_move_plays_en_passant(board_class):
+    engine = ChessEngine.from_fen('rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3',
+                                  board_class())
+    passant = [code for code in engine.legal_moves(True) if code & moves.EN_PASSANT]
+    assert [moves.square_names(code) for code in passant] == [('e5', 'f6')]
+    engine.push_move(passant[0])
+    assert engine.game_state.piece_at('f5') == Piece.EMPTY
+    engine.pop()
+    assert engine.en_passant_square() == 'f6'
+
+
+def test_legal_moves_match_move_implications(board_class):
+    rng = random.Random(5)
+    for fen in FENS:
+        engine = ChessEngine.from_fen(fen, board_class())
+        for _ in range(6):
+            white = engine.white_to_move
+            codes = [code for code in engine.legal_moves(white) if not underpromotes(code)]
+            expected = {}
+            for p1, _ in engine.game_state.pieces(white):
+                for p2 in SQUARES:
+                    consequences = engine.move_implications(p1, p2, white)
+                    if consequences:
+                        expected[p1, p2] = engine.move_code(p1, p2, consequences)
+            assert {square_names(code): code for code in codes} == expected, engine.to_fen()
+            if not codes:
+                break
+
+            before = snapshot(engine)
+            for code in codes:
+                engine.push_move(code)
+                engine.pop()
+                assert snapshot(engine) == before
+            engine.push_move(rng.choice(codes))
+
+
+def test_move_codes_are_generated_lazily(board_class):
+    engine = ChessEngine.from_fen(KIWIPETE, board_class())
+    codes = engine.iter_move_codes(True)
+    first = next(codes)
+    assert [first] + list(codes) == engine.legal_moves(True)
+    assert engine.has_legal_move(True)
+    assert not ChessEngine.from_fen('k7/2Q5/8/8/8/8/8/7K b - - 0 1', board_class()).has_legal_move(False)
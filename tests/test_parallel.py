@@ -0,0 +1,47 @@
+from lib.agents import AlphaBetaAgent
+from lib.chess import ChessEngine
+from lib.parallel import ParallelAlphaBetaAgent, SharedTranspositionTable
+from lib.pieces import Piece
+import pytest
+
+
+@pytest.fixture
+def table():
+    table = SharedTranspositionTable(64)
+    yield table
+    table.close()
+
+
+def test_shared_table_round_trip(table):
+    key = (1 << 63) + 5
+    table.store(key, 7, -321, 2, ('e7', 'e8'), Piece.WKNIGHT)
+    assert table.get(key) == (7, -321, 2, ('e7', 'e8'), Piece.WKNIGHT)
+    # Another key landing in the same slot reads as a miss
+    assert table.get(key + 64) is None
+
+
+def test_shared_table_is_seen_by_other_handles(table):
+    other = SharedTranspositionTable(table.num_entries, name=table.name)
+    try:
+        table.store(12345, 3, 40, 0, ('g1', 'f3'), None)
+        assert other.get(12345) == (3, 40, 0, ('g1', 'f3'), None)
+        other.clear()
+        assert table.get(12345) is None
+    finally:
+        other.close()
+
+
+def test_parallel_agent_finds_mate_in_one():
+    engine = ChessEngine()
+    for move in (('f2', 'f3'), ('e7', 'e5'), ('g2', 'g4')):
+        engine.push(move)
+    agent = ParallelAlphaBetaAgent('black', 'black', time_limit=5.0, workers=2,
+                                   max_depth=2, table_size=1 << 12)
+    agent.attach(engine)
+    try:
+        assert agent.specify_move() == 'd8,h4'
+        assert agent.completed_depth >= 1
+        assert agent.score == AlphaBetaAgent.MATE_SCORE - 1
+    finally:
+        agent.close()
+    agent.close()
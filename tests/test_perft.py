@@ -0,0 +1,41 @@
+from lib.chess import ChessEngine, START_FEN
+import pytest
+
+KIWIPETE = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1'
+
+# Published node counts (chessprogramming.org/Perft_Results)
+PERFT_CASES = [
+    (START_FEN, 1, 20),
+    (START_FEN, 2, 400),
+    (START_FEN, 3, 8902),
+    (KIWIPETE, 2, 2039),
+    ('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', 4, 43238),
+    ('r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', 3, 9467),
+    ('rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', 3, 62379),
+]
+
+
+@pytest.mark.parametrize('fen, depth, expected', PERFT_CASES)
+def test_perft(board_class, fen, depth, expected):
+    engine = ChessEngine.from_fen(fen, board_class())
+    assert engine.perft(depth) == expected
+
+
+def test_perft_leaves_position_unchanged(board_class):
+    engine = ChessEngine.from_fen(KIWIPETE, board_class())
+    key = engine.position_key
+    engine.perft(2)
+    assert engine.to_fen() == KIWIPETE
+    assert engine.position_key == key
+
+
+def test_divide_adds_up_to_perft():
+    counts = ChessEngine().divide(3)
+    assert len(counts) == 20
+    assert sum(counts.values()) == 8902
+    assert counts['e2,e4'] == 600
+
+    counts = ChessEngine.from_fen(KIWIPETE).divide(2)
+    assert len(counts) == 48
+    assert sum(counts.values()) == 2039
+    assert counts['e1,g1'] == 43
@@ -0,0 +1,36 @@
+from lib.chess import ChessEngine
+from lib.pgn import AmbiguousMoveError, IllegalMoveError, read_games, san_to_move, validate_game
+import pytest
+
+
+def test_read_games(pgn_path):
+    games = list(read_games(pgn_path))
+    assert [game.headers['Event'] for game in games] == ['Opera', 'Promotion', 'Broken']
+    assert len(games[0].moves) == 33 and games[0].result == '1-0'
+    assert games[1].moves == ['a8=N', 'g1=R+', 'Kxg1', 'Kg6']
+
+    # Offsets find a game again
+    again = next(read_games(pgn_path, games[1].offset))
+    assert again == games[1]
+
+
+def test_validate_game(pgn_path):
+    reports = [validate_game(game) for game in read_games(pgn_path)]
+    assert [report.error for report in reports[:2]] == [None, None]
+    assert reports[0].plies == 33
+    assert reports[2].plies == 2 and 'Ke3' in reports[2].error
+
+
+def test_san_to_move():
+    engine = ChessEngine.from_fen('r3k2r/8/8/8/8/8/8/R3K1NR w KQkq - 0 1')
+    assert san_to_move(engine, 'O-O-O') == (('e1', 'c1'), None)
+    assert san_to_move(engine, 'Rab1') == (('a1', 'b1'), None)
+    with pytest.raises(IllegalMoveError):
+        san_to_move(engine, 'O-O')
+    with pytest.raises(IllegalMoveError):
+        san_to_move(engine, 'Nh4')
+
+    engine = ChessEngine.from_fen('4k3/8/8/8/R6R/8/8/4K3 w - - 0 1')
+    with pytest.raises(AmbiguousMoveError):
+        san_to_move(engine, 'Rd4')
+    assert san_to_move(engine, 'Rhd4') == (('h4', 'd4'), None)
@@ -0,0 +1,74 @@
+from lib.agents import AlphaBetaAgent
+from lib.chess import ChessEngine
+from lib.ponder import PonderingAgent
+
+
+def attached(agent, engine=None):
+    agent.attach(engine if engine is not None else ChessEngine())
+    return agent
+
+
+def test_exact_entry_is_played_without_searching():
+    agent = attached(PonderingAgent('white', 'white', time_limit=60.0, max_depth=2))
+    engine = agent._engine
+    # As left by pondering: an exact entry as deep as a full search gets
+    agent._table.store(engine.position_key, 2, 17, AlphaBetaAgent.EXACT, ('a2', 'a3'), None)
+    try:
+        assert agent.specify_move() == 'a2,a3'
+        assert agent.nodes == 0
+        assert (agent.reused_depth, agent.completed_depth, agent.score) == (2, 2, 17)
+    finally:
+        agent.close()
+
+
+def test_miss_falls_back_to_a_full_search():
+    plain = attached(AlphaBetaAgent('white', 'white', time_limit=60.0, max_depth=2))
+    expected = plain.search()
+    for entry in (None,
+                  # Not exact, so only its move is tried first
+                  (1, 0, AlphaBetaAgent.LOWER, ('a2', 'a3'), None),
+                  # Illegal here, as after a key collision
+                  (5, 0, AlphaBetaAgent.EXACT, ('e2', 'e5'), None)):
+        agent = attached(PonderingAgent('white', 'white', time_limit=60.0, max_depth=2))
+        if entry is not None:
+            agent._table.store(agent._engine.position_key, *entry)
+        move = agent.search()
+        assert agent.reused_depth == 0
+        assert agent.nodes > 0 and agent.completed_depth == 2
+        if entry is None:
+            assert move == expected and agent.score == plain.score
+
+
+def test_pondered_reply_resumes_below_its_entry():
+    engine = ChessEngine()
+    agent = attached(PonderingAgent('white', 'white', time_limit=60.0, max_depth=2), engine)
+    try:
+        move = agent.specify_move()
+        # The pondering search stops by itself at max_depth
+        agent._ponder_thread.join(60)
+        assert not agent.pondering
+
+        engine.push(tuple(move.split(',')))
+        predicted = agent._table.get(engine.position_key)
+        assert predicted is not None and predicted[0] == 2 and predicted[2] == AlphaBetaAgent.EXACT
+        engine.push(predicted[3])
+
+        entry = agent._table.get(engine.position_key)
+        assert entry is not None and entry[2] == AlphaBetaAgent.EXACT
+        agent.specify_move()
+        # Shallower than the last full search, so it resumed one ply below
+        assert agent.reused_depth == entry[0] == 1
+        assert agent.nodes > 0 and agent.completed_depth == 2
+    finally:
+        agent.close()
+
+
+def test_close_stops_and_joins_the_thread():
+    agent = attached(PonderingAgent('white', 'white', time_limit=0.05, max_depth=64))
+    agent.specify_move()
+    thread = agent._ponder_thread
+    assert agent.pondering
+    agent.close()
+    assert not thread.is_alive()
+    assert not agent.pondering
+    agent.close()
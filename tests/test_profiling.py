@@ -0,0 +1,109 @@
+from lib.agents import Player
+from lib.frontend import ChessFEHeadless
+from lib.profiling import (InstrumentedEngine, InstrumentedGame, LatencyHistogram,
+                           Profiler, _BUCKET_BOUNDS)
+import pstats
+
+
+class ScriptedPlayer(Player):
+    """A player that plays a fixed list of moves."""
+    __slots__ = ('_moves',)
+
+    def __init__(self, color, moves):
+        super().__init__(color, color)
+        self._moves = list(moves)
+
+    @property
+    def is_human(self):
+        return False
+
+    def specify_move(self):
+        return self._moves.pop(0)
+
+
+def new_game(profiler, white_moves=('e2,e4',), black_moves=('e7,e5',)):
+    return InstrumentedGame(ScriptedPlayer('white', white_moves), ScriptedPlayer('black', black_moves),
+                            frontend=ChessFEHeadless(), profiler=profiler)
+
+
+def test_engine_counts_calls():
+    profiler = Profiler()
+    engine = InstrumentedEngine(profiler=profiler)
+    codes = engine.legal_moves(True)
+    engine.push_move(codes[0])
+    engine.legal_moves(False)
+    engine.push(('e7', 'e5'))
+    engine.pop()
+
+    calls = profiler.calls
+    assert calls['legal_moves'].calls == 2
+    assert calls['push'].calls == 1
+    # push() plays its move with push_move()
+    assert calls['push_move'].calls == 2
+    assert calls['pop'].calls == 1
+    assert calls['move_implications'].calls == 1
+    assert calls['pawn_move_implications'].calls == 1
+    assert all(stats.total_time >= 0 for stats in calls.values())
+
+    profiler.reset()
+    assert profiler.calls == {}
+
+    assert not engine.checkmate(False)
+    assert not engine.move_jeopardizes_our_king(('e7', 'e5'), False)
+    engine.tile_is_threatened('e4')
+    calls = profiler.calls
+    assert calls['checkmate'].calls == 1
+    assert calls['move_jeopardizes_our_king'].calls == 1
+    assert calls['tile_is_threatened'].calls == 1
+    # checkmate() looks for a legal move first
+    assert calls['has_legal_move'].calls == 1
+
+
+def test_histogram_buckets():
+    histogram = LatencyHistogram()
+    for seconds in (_BUCKET_BOUNDS[0] / 2, _BUCKET_BOUNDS[0], _BUCKET_BOUNDS[1] * 1.5, 1000.0):
+        histogram.record(seconds)
+    # Bounds are inclusive, and anything past the last one is unbounded
+    assert histogram.buckets() == [(_BUCKET_BOUNDS[0], 2), (_BUCKET_BOUNDS[2], 1), (float('inf'), 1)]
+    assert histogram.count == 4
+    assert histogram.max == 1000.0
+
+
+def test_histogram_percentiles():
+    assert LatencyHistogram().percentile(0.99) == 0.0
+    assert LatencyHistogram().mean == 0.0
+
+    histogram = LatencyHistogram()
+    for seconds in (_BUCKET_BOUNDS[0], _BUCKET_BOUNDS[0], _BUCKET_BOUNDS[3], 1000.0):
+        histogram.record(seconds)
+    assert histogram.percentile(0.0) == _BUCKET_BOUNDS[0]
+    assert histogram.percentile(0.5) == _BUCKET_BOUNDS[0]
+    assert histogram.percentile(0.75) == _BUCKET_BOUNDS[3]
+    # The last bucket has no bound, so the maximum stands in for it
+    assert histogram.percentile(0.99) == 1000.0
+    assert histogram.percentile(1.0) == 1000.0
+
+
+def test_game_records_one_latency_per_turn():
+    profiler = Profiler()
+    game = new_game(profiler)
+    game.move()
+    assert profiler.histograms['white turn'].count == 1
+    assert 'black turn' not in profiler.histograms
+    game.move()
+    assert profiler.histograms['white turn'].count == 1
+    assert profiler.histograms['black turn'].count == 1
+    # The game's own engine reports to the same profiler
+    assert profiler.calls['move_implications'].calls > 0
+
+
+def test_cprofile_writes_stats(tmp_path):
+    path = str(tmp_path / 'turns.prof')
+    game = new_game(Profiler())
+    game.start_cprofile(path)
+    game.move()
+    game.stop_cprofile()
+    stats = pstats.Stats(path)
+    assert any(name == 'move_implications' for _, _, name in stats.stats)
+    # Stopping again does nothing
+    game.stop_cprofile()
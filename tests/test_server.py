@@ -0,0 +1,216 @@
+from lib.agents import Player
+from lib.chess import ChessEngine
+from lib.compact import CompactBoard
+from lib.pieces import Piece
+from lib.server import ChessServer, GameOutcome, GameSession, RemotePlayer
+import asyncio
+
+# How long a test waits for any one line before failing
+TIMEOUT = 10
+
+
+class ScriptedAgent(Player):
+    """A computer player that plays a fixed list of moves."""
+    __slots__ = ('_moves',)
+
+    def __init__(self, color, moves):
+        super().__init__('Computer', color)
+        self._moves = list(moves)
+
+    @property
+    def is_human(self):
+        return False
+
+    def specify_move(self):
+        return self._moves.pop(0)
+
+
+async def read_until(reader, text):
+    """Reads lines until one containing text, and returns them all."""
+    lines = []
+    while True:
+        line = await asyncio.wait_for(reader.readline(), TIMEOUT)
+        assert line, f"Connection closed before {text!r}, after {lines!r}"
+        lines.append(line.decode('utf-8').rstrip('\n'))
+        if text in lines[-1]:
+            return lines
+
+
+async def send(writer, line):
+    writer.write(line.encode('utf-8') + b'\n')
+    await writer.drain()
+
+
+async def remote_players():
+    """Two RemotePlayers on loopback connections, with the client end of
+    each connection."""
+    accepted = asyncio.Queue()
+
+    async def accept(reader, writer):
+        await accepted.put((reader, writer))
+
+    server = await asyncio.start_server(accept, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    players, clients = [], []
+    for name, color in (('White', 'white'), ('Black', 'black')):
+        clients.append(await asyncio.open_connection('127.0.0.1', port))
+        players.append(RemotePlayer(name, color, *await accepted.get()))
+    server.close()
+    await server.wait_closed()
+    return players, clients
+
+
+async def connect(server):
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    await read_until(reader, 'Welcome')
+    return reader, writer
+
+
+async def start_server(agent_factory=None):
+    server = ChessServer(agent_factory=agent_factory)
+    await server.start_tcp()
+    return server
+
+
+def test_session_defaults_to_a_compact_board():
+    async def scenario():
+        (white, black), clients = await remote_players()
+        default = GameSession(white, black)
+        engine = ChessEngine(cache_size=16)
+        given = GameSession(white, black, engine=engine)
+        for _, writer in clients:
+            writer.close()
+        return default.engine, given.engine, engine
+
+    default, given, engine = asyncio.run(scenario())
+    assert isinstance(default.game_state, CompactBoard)
+    assert given is engine
+
+
+def test_session_plays_moves_promotion_and_resignation():
+    async def scenario():
+        (white, black), ((white_in, white_out), (black_in, black_out)) = await remote_players()
+        engine = ChessEngine.from_fen('4k3/P7/8/8/8/8/8/4K3 w - - 0 1', cache_size=16)
+        game = asyncio.ensure_future(GameSession(white, black, engine=engine).play())
+
+        await read_until(white_in, "White, it's your move.")
+        await send(white_out, 'a7,b8')
+        await read_until(white_in, 'Move invalid')
+        await send(white_out, 'not a move')
+        await read_until(white_in, 'Move invalid')
+        await send(white_out, 'a7,a8')
+        await read_until(white_in, 'Promote to')
+        await send(white_out, 'r')
+
+        board = await read_until(black_in, "Black, it's your move.")
+        assert [line for line in board if line.startswith('8 |')][-1] == '8 |♜|_|_|_|♔|_|_|_|'
+        assert engine.game_state.piece_at('a8') == Piece.WROOK
+        await send(black_out, 'resign')
+        await read_until(white_in, 'Black resigns.')
+
+        outcome = await asyncio.wait_for(game, TIMEOUT)
+        for writer in (white_out, black_out):
+            writer.close()
+        return outcome
+
+    assert asyncio.run(scenario()) == GameOutcome('1-0', 'resignation', 1)
+
+
+def test_session_ends_in_checkmate():
+    async def scenario():
+        (white, black), ((white_in, white_out), (black_in, black_out)) = await remote_players()
+        engine = ChessEngine.from_fen('k7/8/1K6/8/8/8/8/7R w - - 0 1', cache_size=16)
+        game = asyncio.ensure_future(GameSession(white, black, engine=engine).play())
+        await read_until(white_in, "White, it's your move.")
+        await send(white_out, 'h1,h8')
+        await read_until(black_in, 'Checkmate! White wins.')
+        outcome = await asyncio.wait_for(game, TIMEOUT)
+        for writer in (white_out, black_out):
+            writer.close()
+        return outcome
+
+    assert asyncio.run(scenario()) == GameOutcome('1-0', 'checkmate', 1)
+
+
+def test_server_pairs_two_clients():
+    async def scenario():
+        server = await start_server()
+        first_in, first_out = await connect(server)
+        await send(first_out, 'play')
+        await read_until(first_in, 'Waiting for an opponent')
+        second_in, second_out = await connect(server)
+        await send(second_out, 'play')
+
+        await read_until(first_in, "Player 1, it's your move.")
+        await send(first_out, 'e2,e4')
+        await read_until(second_in, "Player 2, it's your move.")
+        await send(second_out, 'resign')
+        await read_until(first_in, 'Game over: 1-0 (resignation)')
+        await read_until(second_in, 'Game over: 1-0 (resignation)')
+        for writer in (first_out, second_out):
+            writer.close()
+        await server.close()
+        return server.outcomes
+
+    assert asyncio.run(scenario()) == [GameOutcome('1-0', 'resignation', 1)]
+
+
+def test_client_gone_while_waiting_is_not_paired():
+    async def scenario():
+        server = await start_server()
+        gone_in, gone_out = await connect(server)
+        await send(gone_out, 'play')
+        await read_until(gone_in, 'Waiting for an opponent')
+        gone_out.close()
+        await gone_out.wait_closed()
+
+        # The next client waits instead of joining the closed connection
+        first_in, first_out = await connect(server)
+        await send(first_out, 'play')
+        await read_until(first_in, 'Waiting for an opponent')
+        second_in, second_out = await connect(server)
+        await send(second_out, 'play')
+        await read_until(first_in, "Player 1, it's your move.")
+        await send(first_out, 'resign')
+        await read_until(second_in, 'Game over: 0-1 (resignation)')
+        for writer in (first_out, second_out):
+            writer.close()
+        await server.close()
+        return server.outcomes
+
+    assert asyncio.run(scenario()) == [GameOutcome('0-1', 'resignation', 0)]
+
+
+def test_unknown_commands_are_rejected():
+    async def scenario():
+        server = await start_server(lambda color: ScriptedAgent(color, ['e7,e5']))
+        reader, writer = await connect(server)
+        await send(writer, 'playground')
+        await read_until(reader, "Unknown command 'playground'")
+        await send(writer, 'play computer now')
+        await read_until(reader, "Unknown command 'play computer now'")
+        await send(writer, 'play computer')
+        await read_until(reader, "Player 1, it's your move.")
+        writer.close()
+        await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_play_computer():
+    async def scenario():
+        server = await start_server(lambda color: ScriptedAgent(color, ['e7,e5', 'd8,h4']))
+        reader, writer = await connect(server)
+        await send(writer, 'play computer')
+        for move in ('f2,f3', 'g2,g4'):
+            await read_until(reader, "Player 1, it's your move.")
+            await send(writer, move)
+        lines = await read_until(reader, 'Game over')
+        writer.close()
+        await server.close()
+        return lines, server.outcomes
+
+    lines, outcomes = asyncio.run(scenario())
+    assert 'Checkmate! Computer wins.' in lines
+    assert outcomes == [GameOutcome('0-1', 'checkmate', 4)]
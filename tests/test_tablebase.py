@@ -0,0 +1,89 @@
+from lib import tablebase
+from lib.agents import AlphaBetaAgent
+from lib.chess import ChessEngine
+from lib.pieces import Piece
+import random
+import pytest
+
+
+@pytest.fixture(scope='module')
+def table_dir(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('tablebases')
+    tablebase.write_table(tablebase.table_path(str(directory), 'KRK'), 'KRK', tablebase.solve('KRK'))
+    return str(directory)
+
+
+@pytest.fixture
+def krk(table_dir, monkeypatch):
+    # Tables are opened process wide, so give each test a clean set
+    monkeypatch.setattr(tablebase, '_tables', {})
+    assert tablebase.load(table_dir) == ['KRK']
+    yield
+    for table in tablebase._tables.values():
+        table.close()
+
+
+@pytest.mark.parametrize('fen, expected', [
+    ('k7/8/1K6/8/8/8/8/7R w - - 0 1', (tablebase.WIN, 1)),
+    ('k6R/8/1K6/8/8/8/8/8 b - - 0 1', (tablebase.LOSS, 0)),
+    ('k7/1R6/8/8/8/8/8/7K b - - 0 1', (tablebase.DRAW, 0)),
+    # Colors swapped: black has the rook
+    ('K7/8/1k6/8/8/8/8/7r b - - 0 1', (tablebase.WIN, 1)),
+    ('K6r/8/1k6/8/8/8/8/8 w - - 0 1', (tablebase.LOSS, 0)),
+])
+def test_probe(krk, fen, expected):
+    assert ChessEngine.from_fen(fen).probe_tablebase() == expected
+
+
+def test_probe_outside_tables(krk):
+    assert ChessEngine().probe_tablebase() is None
+    assert ChessEngine.from_fen('k7/8/1K6/8/8/8/8/7Q w - - 0 1').probe_tablebase() is None
+
+
+def test_probe_without_tables(monkeypatch):
+    monkeypatch.setattr(tablebase, '_tables', {})
+    assert ChessEngine.from_fen('k7/8/1K6/8/8/8/8/7R w - - 0 1').probe_tablebase() is None
+
+
+def test_results_follow_from_moves(krk):
+    """Every entry must agree with the entries one legal move away."""
+    rng = random.Random(3)
+    checked = 0
+    while checked < 40:
+        squares = rng.sample(range(64), 3)
+        pieces = dict(zip(squares, (Piece.WKING, Piece.BKING, Piece.WROOK)))
+        rows = []
+        for rank in range(7, -1, -1):
+            row = ''.join({Piece.WKING: 'K', Piece.BKING: 'k', Piece.WROOK: 'R'}.get(pieces.get(rank * 8 + f), '1')
+                          for f in range(8))
+            rows.append(row)
+        engine = ChessEngine.from_fen('/'.join(rows) + (' b' if rng.random() < 0.5 else ' w') + ' - - 0 1')
+        white = engine.white_to_move
+        if engine.in_check(not white):
+            continue
+        value = engine.probe_tablebase()
+        assert value is not None
+
+        children = []
+        for move in list(engine.iter_legal_moves(white)):
+            engine.push(move)
+            children.append(engine.probe_tablebase() or (tablebase.DRAW, 0))
+            engine.pop()
+
+        losses = [plies for result, plies in children if result == tablebase.LOSS]
+        if not children:
+            expected = (tablebase.LOSS, 0) if engine.in_check(white) else (tablebase.DRAW, 0)
+        elif losses:
+            expected = (tablebase.WIN, min(losses) + 1)
+        elif all(result == tablebase.WIN for result, _ in children):
+            expected = (tablebase.LOSS, max(plies for _, plies in children) + 1)
+        else:
+            expected = (tablebase.DRAW, 0)
+        assert value == expected, engine.to_fen()
+        checked += 1
+
+
+def test_agent_plays_tablebase_move(krk):
+    agent = AlphaBetaAgent('computer', 'white', time_limit=1.0)
+    agent.attach(ChessEngine.from_fen('k7/8/1K6/8/8/8/8/7R w - - 0 1'))
+    assert agent.specify_move() == 'h1,h8'
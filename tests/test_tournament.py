@@ -0,0 +1,39 @@
+from lib.tournament import AgentSpec, DRAW, elo_difference, play_game, random_opening, sprt_bounds, sprt_llr
+import threading
+
+
+def test_random_opening_is_seeded():
+    first, moves = random_opening(3, 6)
+    second, same_moves = random_opening(3, 6)
+    assert moves == same_moves and len(moves) == 6
+    assert first.position_key == second.position_key
+
+
+def test_play_game_adjudicates_the_move_limit():
+    agent = AgentSpec("A", options={'max_depth': 1})
+    record = play_game(agent, agent, opening_seed=1, opening_plies=4, max_plies=4)
+    assert record.result == DRAW and record.reason == "move limit"
+    assert record.plies == 4 and len(record.moves) == 8
+    assert record.moves[:4] == tuple(random_opening(1, 4)[1])
+
+
+def test_play_game_stops_when_asked():
+    stop = threading.Event()
+    stop.set()
+    agent = AgentSpec("A", options={'max_depth': 1})
+    record = play_game(agent, agent, opening_seed=1, opening_plies=4, stop=stop)
+    assert record.result == DRAW and record.reason == "aborted"
+    assert record.plies == 0 and len(record.moves) == 4
+
+
+def test_elo_difference():
+    assert elo_difference(10, 0, 10)[0] == 0.0
+    elo, margin = elo_difference(30, 0, 10)
+    assert round(elo) == 191 and margin > 0
+
+
+def test_sprt():
+    lower, upper = sprt_bounds(0.05, 0.05)
+    assert lower == -upper
+    assert sprt_llr(0, 10, 0, 0.0, 10.0) == 0.0
+    assert sprt_llr(60, 20, 20, 0.0, 10.0) > 0 > sprt_llr(20, 20, 60, 0.0, 10.0)
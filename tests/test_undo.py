@@ -0,0 +1,57 @@
+from lib.agents import Player
+from lib.bitboard import SQUARES
+from lib.chess import ChessEngine, ChessGame
+from lib.pieces import Piece
+import random
+import pytest
+
+
+def snapshot(engine):
+    board = engine.game_state
+    squares = tuple((board.piece_at(pos), board.has_moved(pos)) for pos in SQUARES)
+    return squares, engine.in_check(True), engine.in_check(False)
+
+
+def test_push_pop_restores_exact_position(board_class):
+    rng = random.Random(7)
+    engine = ChessEngine(board_class())
+    white = True
+    history = []
+    for _ in range(120):
+        moves = list(engine.iter_legal_moves(white))
+        if not moves:
+            break
+        history.append((snapshot(engine), moves))
+        promotion = rng.choice([None, Piece.WKNIGHT if white else Piece.BKNIGHT])
+        engine.push(rng.choice(moves), promotion)
+        white = not white
+
+    while history:
+        engine.pop()
+        white = not white
+        position, moves = history.pop()
+        assert snapshot(engine) == position
+        assert list(engine.iter_legal_moves(white)) == moves
+
+
+def test_pop_without_moves_raises():
+    with pytest.raises(IndexError):
+        ChessEngine().pop()
+
+
+def test_illegal_push_raises():
+    engine = ChessEngine()
+    before = snapshot(engine)
+    with pytest.raises(ValueError):
+        engine.push(('e2', 'e5'))
+    assert snapshot(engine) == before
+    with pytest.raises(IndexError):
+        engine.pop()
+
+
+def test_game_moves_leave_no_undo_entries():
+    game = ChessGame(Player('White', 'white'), Player('Black', 'black'))
+    for move in (('e2', 'e4'), ('e7', 'e5'), ('e1', 'e2')):
+        assert game.apply(move).legal
+    with pytest.raises(IndexError):
+        game.engine.pop()
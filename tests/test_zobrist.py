@@ -0,0 +1,68 @@
+from lib.chess import ChessEngine
+from lib.pieces import Piece
+from lib.zobrist import board_key
+import copy
+import random
+
+
+def play(engine, moves):
+    for move in moves:
+        engine.push(move)
+    return engine.position_key
+
+
+def test_position_key_follows_transpositions(board_class):
+    first = play(ChessEngine(board_class()), [('g1', 'f3'), ('g8', 'f6'), ('b1', 'c3')])
+    second = play(ChessEngine(board_class()), [('b1', 'c3'), ('g8', 'f6'), ('g1', 'f3')])
+    assert first == second
+
+
+def test_position_key_repeats_with_position(board_class):
+    engine = ChessEngine(board_class())
+    start = engine.position_key
+    keys = [play(engine, [move]) for move in [('g1', 'f3'), ('g8', 'f6'), ('f3', 'g1')]]
+    assert start not in keys
+    assert play(engine, [('f6', 'g8')]) == start
+
+
+def test_castling_rights_are_part_of_the_key(board_class):
+    opening = [('e2', 'e4'), ('e7', 'e5')]
+    kept = play(ChessEngine(board_class()), opening)
+    walked = play(ChessEngine(board_class()), opening + [('e1', 'e2'), ('e8', 'e7'),
+                                                          ('e2', 'e1'), ('e7', 'e8')])
+    assert kept != walked
+
+
+def test_key_is_the_same_on_every_backend(board_class):
+    rng = random.Random(4)
+    reference, engine = ChessEngine(), ChessEngine(board_class())
+    plies = 0
+    for _ in range(40):
+        moves = list(reference.iter_legal_moves(plies % 2 == 0))
+        if not moves:
+            break
+        move = rng.choice(moves)
+        assert play(engine, [move]) == play(reference, [move])
+        plies += 1
+    for _ in range(plies):
+        engine.pop()
+        reference.pop()
+        assert engine.position_key == reference.position_key
+    assert engine.position_key == ChessEngine().position_key
+
+
+def test_writes_through_the_board_view_keep_the_key(board_class):
+    board = board_class()
+    before = board.zobrist_key
+    board.board['4']['e'] = Piece.WQUEEN
+    assert board.piece_at('e4') == Piece.WQUEEN
+    assert board.zobrist_key != before
+    assert board.zobrist_key == board_key(board)
+
+
+def test_board_view_deep_copies_detach(board_class):
+    board = board_class()
+    placement = copy.deepcopy(board.board)
+    placement['2']['e'] = Piece.EMPTY
+    assert placement['1']['e'] == Piece.WKING
+    assert board.piece_at('e2') == Piece.WPAWN
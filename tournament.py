@@ -0,0 +1,41 @@
+from lib.agents import AlphaBetaAgent
+from lib.tournament import AgentSpec, Tournament
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a self-play match between two search settings.")
+    parser.add_argument("--games", type=int, default=1000, help="maximum number of games")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: all CPUs)")
+    parser.add_argument("--think-time", type=float, default=0.1, help="seconds per move for both agents")
+    parser.add_argument("--depth-a", type=int, default=64, help="maximum search depth of agent A")
+    parser.add_argument("--depth-b", type=int, default=64, help="maximum search depth of agent B")
+    parser.add_argument("--opening-plies", type=int, default=8, help="random half moves before each game")
+    parser.add_argument("--max-plies", type=int, default=300, help="half moves before a draw is adjudicated")
+    parser.add_argument("--elo0", type=float, default=0.0, help="SPRT null hypothesis Elo")
+    parser.add_argument("--elo1", type=float, default=10.0, help="SPRT alternative hypothesis Elo")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first opening")
+    args = parser.parse_args()
+
+    agent_a = AgentSpec("A", AlphaBetaAgent, {'time_limit': args.think_time, 'max_depth': args.depth_a})
+    agent_b = AgentSpec("B", AlphaBetaAgent, {'time_limit': args.think_time, 'max_depth': args.depth_b})
+    tournament = Tournament(agent_a, agent_b, games=args.games, workers=args.workers,
+                            opening_plies=args.opening_plies, max_plies=args.max_plies,
+                            elo0=args.elo0, elo1=args.elo1, seed=args.seed)
+
+    def progress(result):
+        print(f"\r{result.games} games  +{result.wins} ={result.draws} -{result.losses}  "
+              f"Elo {result.elo:+.1f} +/- {result.elo_margin:.1f}  LLR {result.llr:+.2f}", end="", flush=True)
+
+    result = tournament.run(progress)
+    print()
+    if result.decision == 'H1':
+        print(f"SPRT: A is stronger (H1, elo >= {args.elo1})")
+    elif result.decision == 'H0':
+        print(f"SPRT: A is not stronger (H0, elo <= {args.elo0})")
+    else:
+        print("SPRT: inconclusive")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+from lib.pgn import validate_file
+import argparse
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that every move of every game in a PGN file is legal.")
+    parser.add_argument("path", help="PGN file to validate")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: all CPUs)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    games = invalid = 0
+    for report in validate_file(args.path, workers=args.workers):
+        games += 1
+        if report.error is not None:
+            invalid += 1
+            print(f"offset {report.offset}: {report.error}")
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{games} games, {invalid} invalid, in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()